@@ -0,0 +1,402 @@
+"""Offline benchmarks for the packet and history hot paths.
+
+    python -m benchmarks.run --packets 100000 --history 50000 --output results.json
+    python -m benchmarks.run --baseline baseline.json        # compare, exit 1 on regression
+    python -m benchmarks.run --save-baseline baseline.json   # record a new baseline
+
+Synthetic inputs are generated once per (size, seed) under --data-dir and
+reused, so runs are reproducible and comparable. Benchmarks with a time
+budget (app start-up and rerun) also fail the run when they exceed it.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from benchmarks.synthetic import synthetic_history, synthetic_pcap
+
+Case = namedtuple("Case", "setup run items budget", defaults=(None,))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds. Cold start is a fresh interpreter rendering the default page once;
+# a rerun is one more script run of an already warm app.
+COLD_START_BUDGET = 3.0
+RERUN_BUDGET = 0.25
+# Modules the default page must not import; they belong to other pages or features.
+DEFERRED_MODULES = ("scapy", "reportlab", "speedtest_cli")
+# The default page starts the latency prober; give it no targets so the app benchmarks
+# stay offline.
+OFFLINE_ENV = {"NETMON_PROBE_TARGETS": ""}
+COLD_START_SCRIPT = f"""
+import json, sys
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("main.py", default_timeout=60)
+app.run()
+print(json.dumps({{
+    "errors": [str(element.value) for element in app.error] + [str(element.value) for element in app.exception],
+    "loaded": [name for name in {DEFERRED_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+class Context:
+    """Synthetic inputs and lazily built fixtures shared by the benchmarks."""
+
+    def __init__(self, data_dir, packets, history, seed):
+        os.makedirs(data_dir, exist_ok=True)
+        self.data_dir = data_dir
+        self.packets = packets
+        self.history = history
+        self.seed = seed
+        self.pcap = os.path.join(data_dir, f"synthetic-{packets}-{seed}.pcap")
+        self.history_csv = os.path.join(data_dir, f"history-{history}-{seed}.csv")
+        self.history_db = os.path.join(data_dir, f"history-{history}-{seed}.db")
+        self._worker = None
+        self._history = None
+
+    def path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def loaded_worker(self):
+        if self._worker is None:
+            from worker_packet_tracer import PacketWorker
+
+            synthetic_pcap(self.pcap, self.packets, self.seed)
+            self._worker = PacketWorker(max_packets=max(self.packets, 1))
+            self._worker.load_pcap(self.pcap)
+        return self._worker
+
+    def history_frame(self):
+        if self._history is None:
+            from history_store import HistoryCache, HistoryStore
+
+            synthetic_history(self.history_csv, self.history, self.seed)
+            cache = HistoryCache(HistoryStore(self.history_db, csv_path=None), csv_path=self.history_csv)
+            cache.refresh()
+            self._history = cache.frame
+        return self._history
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@benchmark("load_pcap")
+def bench_load_pcap(ctx):
+    from pcap_index import index_path
+    from worker_packet_tracer import PacketWorker
+
+    synthetic_pcap(ctx.pcap, ctx.packets, ctx.seed)
+
+    def setup():
+        _remove(index_path(ctx.pcap))
+        return PacketWorker(max_packets=max(ctx.packets, 1))
+
+    return Case(setup, lambda worker: worker.load_pcap(ctx.pcap), ctx.packets)
+
+
+@benchmark("load_pcap_indexed")
+def bench_load_pcap_indexed(ctx):
+    from worker_packet_tracer import PacketWorker
+
+    ctx.loaded_worker()  # builds the sidecar index
+    return Case(lambda: PacketWorker(max_packets=max(ctx.packets, 1)),
+                lambda worker: worker.load_pcap(ctx.pcap), ctx.packets)
+
+
+FILTERS = [
+    {"protocol": "TCP"},
+    {"protocol": "DNS"},
+    {"source_ip": "10.0.0.5"},
+    {"destination_ip": "10.0.0.0/25", "protocol": "UDP"},
+    {"protocol": "TLS", "source_ip": "10.0.0.0/28"},
+]
+
+
+@benchmark("apply_filters")
+def bench_apply_filters(ctx):
+    worker = ctx.loaded_worker()
+
+    def run(_):
+        for filters in FILTERS:
+            worker.apply_filters(**filters, limit=50)
+
+    # Time index lookups plus dissection of every page, not warm caches or scapy's first use.
+    run(None)
+    return Case(worker.dissection_cache.clear, run, len(FILTERS))
+
+
+@benchmark("update_protocol_statistics")
+def bench_update_protocol_statistics(ctx):
+    worker = ctx.loaded_worker()
+    return Case(lambda: None, lambda _: worker.update_protocol_statistics(), worker.packet_count())
+
+
+@benchmark("time_range_after_eviction")
+def bench_time_range_after_eviction(ctx):
+    from pcap_io import open_pcap_buffer, scan_pcap
+    from worker_packet_tracer import PacketWorker
+
+    synthetic_pcap(ctx.pcap, ctx.packets, ctx.seed)
+    # A store a quarter of the capture's size, fed directly so no file backs evicted packets.
+    worker = PacketWorker(max_packets=max(ctx.packets // 4, 1))
+    last_time = 0
+    with open_pcap_buffer(ctx.pcap) as buffer:
+        for frame in scan_pcap(buffer):
+            worker.store_frame(None, bytes(frame.data), frame.timestamp, frame.wirelen, frame.linktype)
+            last_time = max(last_time, frame.timestamp)
+            del frame
+    output = ctx.path("time-range.pcap")
+
+    def run(_):
+        # The whole capture, so every time bucket holding evicted ids is covered.
+        packet_ids = list(worker.time_slice(0, last_time))
+        if packet_ids and packet_ids[0] < worker.packets.first_id:
+            raise RuntimeError(f"time range returned evicted packet {packet_ids[0]}")
+        worker.save_pcap(output, start_time=0, end_time=last_time)
+
+    return Case(lambda: _remove(output), run, worker.packet_count())
+
+
+@benchmark("save_pcap")
+def bench_save_pcap(ctx):
+    worker = ctx.loaded_worker()
+    output = ctx.path("saved.pcap")
+    return Case(lambda: _remove(output), lambda _: worker.save_pcap(output), worker.packet_count())
+
+
+@benchmark("history_import")
+def bench_history_import(ctx):
+    from history_store import HistoryStore
+
+    synthetic_history(ctx.history_csv, ctx.history, ctx.seed)
+    database = ctx.path("import.db")
+
+    def setup():
+        _remove(database, database + "-wal", database + "-shm")
+
+    return Case(setup, lambda _: HistoryStore(database, csv_path=ctx.history_csv).close(), ctx.history)
+
+
+@benchmark("load_history")
+def bench_load_history(ctx):
+    from history_store import HistoryCache, HistoryStore
+
+    synthetic_history(ctx.history_csv, ctx.history, ctx.seed)
+    store = HistoryStore(ctx.history_db, csv_path=ctx.history_csv)
+
+    def run(_):
+        cache = HistoryCache(store, csv_path=ctx.history_csv)
+        cache.refresh()
+        cache.range()
+
+    return Case(lambda: None, run, ctx.history)
+
+
+@benchmark("load_history_cached")
+def bench_load_history_cached(ctx):
+    from history_store import HistoryCache, HistoryStore
+
+    ctx.history_frame()
+    cache = HistoryCache(HistoryStore(ctx.history_db, csv_path=None), csv_path=ctx.history_csv)
+    cache.refresh()
+
+    def run(_):
+        cache.refresh()
+        cache.range()
+
+    return Case(lambda: None, run, ctx.history)
+
+
+@benchmark("plot_graphs")
+def bench_plot_graphs(ctx):
+    from downsample import downsample_frame, resolution
+    from report_worker import SPEED_COLUMNS
+    from tab_history_window import CHART_WIDTH, plot_graphs
+
+    frame = ctx.history_frame()
+
+    def run(_):
+        max_points, _ = resolution(0, CHART_WIDTH)
+        plot_graphs(downsample_frame(frame, 'Date', SPEED_COLUMNS, max_points))
+
+    return Case(lambda: None, run, len(frame))
+
+
+@benchmark("create_pdf_report")
+def bench_create_pdf_report(ctx):
+    from report_worker import build_pdf
+
+    frame = ctx.history_frame()
+    return Case(lambda: None, lambda _: build_pdf(frame), len(frame))
+
+
+def _cold_start():
+    process = subprocess.run(
+        [sys.executable, "-c", COLD_START_SCRIPT], cwd=ROOT, capture_output=True, text=True, timeout=120,
+        env={**os.environ, **OFFLINE_ENV},
+    )
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    if report["errors"]:
+        raise RuntimeError(f"default page failed: {report['errors'][0]}")
+    if report["loaded"]:
+        raise RuntimeError(f"default page imported {', '.join(report['loaded'])}")
+
+
+@benchmark("app_cold_start")
+def bench_app_cold_start(ctx):
+    importlib.import_module("streamlit.testing.v1")  # skipped without streamlit
+
+    return Case(lambda: None, lambda _: _cold_start(), 1, COLD_START_BUDGET)
+
+
+@benchmark("app_rerun")
+def bench_app_rerun(ctx):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(OFFLINE_ENV)
+
+    def setup():
+        prober = sys.modules.get("latency_prober")
+        if prober is not None and prober.DEFAULT_TARGETS:
+            raise RuntimeError("latency_prober was imported before its targets could be disabled")
+        app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60)
+        app.run()
+        return app
+
+    return Case(setup, lambda app: app.run(), 1, RERUN_BUDGET)
+
+
+def measure(case, repeats):
+    """Return (best seconds over repeats, peak traced bytes of one extra traced run)."""
+    timings = []
+    for _ in range(repeats):
+        state = case.setup()
+        gc.collect()
+        start = time.perf_counter()
+        case.run(state)
+        timings.append(time.perf_counter() - start)
+    state = case.setup()
+    gc.collect()
+    tracemalloc.start()
+    case.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def run_benchmarks(ctx, names, repeats):
+    results = {}
+    for name in names:
+        try:
+            case = BENCHMARKS[name](ctx)
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name}"}
+            print(f"{name:28} skipped ({e.name} not installed)")
+            continue
+        try:
+            seconds, peak = measure(case, repeats)
+        except RuntimeError as e:
+            results[name] = {"failed": str(e)}
+            print(f"{name:28} FAILED: {e}")
+            continue
+        results[name] = {
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "items": case.items,
+            "items_per_second": case.items / seconds if seconds else None,
+        }
+        budget = ""
+        if case.budget is not None:
+            results[name]["budget_seconds"] = case.budget
+            results[name]["over_budget"] = seconds > case.budget
+            budget = f"  budget {case.budget * 1000:.0f} ms{'  OVER BUDGET' if seconds > case.budget else ''}"
+        print(f"{name:28} {seconds * 1000:10.1f} ms  {peak / 1e6:8.1f} MB peak  {case.items} items{budget}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print per-benchmark ratios against baseline; return the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if "seconds" not in result or not previous or "seconds" not in previous:
+            continue
+        time_ratio = result["seconds"] / previous["seconds"]
+        memory_ratio = result["peak_bytes"] / previous["peak_bytes"] if previous["peak_bytes"] else 1.0
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:28} time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the packet and history hot paths")
+    parser.add_argument("--packets", type=int, default=100000, help="packets in the synthetic capture")
+    parser.add_argument("--history", type=int, default=50000, help="rows of synthetic speed test history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="run only these")
+    parser.add_argument("--data-dir", default=".benchmark-data", help="where synthetic inputs are cached")
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown or memory growth before a regression is reported")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ctx = Context(args.data_dir, args.packets, args.history, args.seed)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "packets": args.packets,
+            "history": args.history,
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "created_at": time.time(),
+        },
+        "results": run_benchmarks(ctx, args.only or list(BENCHMARKS), args.repeats),
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+    failed = [
+        name for name, result in results["results"].items()
+        if "failed" in result or result.get("over_budget")
+    ]
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        failed += compare(results["results"], baseline, args.threshold)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
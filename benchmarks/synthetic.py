@@ -0,0 +1,112 @@
+import csv
+import datetime
+import os
+import random
+import struct
+
+from pcap_io import write_pcap
+
+HOSTS = 256
+ETHERTYPE_IPV4, ETHERTYPE_IPV6, ETHERTYPE_ARP = 0x0800, 0x86DD, 0x0806
+# (weight, kind, destination port)
+TRAFFIC_MIX = [
+    (30, "tcp", 443), (15, "tcp", 80), (10, "udp", 53), (10, "tcp6", 443), (8, "udp", 123),
+    (8, "tcp", 22), (6, "udp6", 53), (5, "icmp", 0), (4, "udp", 5353), (4, "arp", 0),
+]
+TEMPLATES = 4096
+
+
+def _ethernet(ethertype, rng):
+    return bytes(rng.getrandbits(8) for _ in range(12)) + struct.pack("!H", ethertype)
+
+
+def _ipv4(proto, src, dst, payload_length):
+    return struct.pack(
+        "!BBHHHBBH4s4s", 0x45, 0, 20 + payload_length, 0, 0x4000, 64, proto, 0,
+        bytes((10, 0, src >> 8, src & 0xFF)), bytes((10, 0, dst >> 8, dst & 0xFF)),
+    )
+
+
+def _ipv6(next_header, src, dst, payload_length):
+    prefix = bytes.fromhex("fd000000000000000000000000000000")[:14]
+    return struct.pack(
+        "!IHBB16s16s", 6 << 28, payload_length, next_header, 64,
+        prefix + struct.pack("!H", src), prefix + struct.pack("!H", dst),
+    )
+
+
+def _frame(rng):
+    kind, dport = rng.choices(
+        [(kind, port) for _, kind, port in TRAFFIC_MIX], weights=[w for w, _, _ in TRAFFIC_MIX]
+    )[0]
+    src, dst = rng.randrange(HOSTS), rng.randrange(HOSTS)
+    payload = bytes(rng.getrandbits(8) for _ in range(rng.choice((0, 40, 120, 512, 1200))))
+    if kind == "arp":
+        return _ethernet(ETHERTYPE_ARP, rng) + struct.pack("!HHBBH", 1, 0x0800, 6, 4, 1) + bytes(20)
+    if kind == "icmp":
+        body = struct.pack("!BBHHH", 8, 0, 0, rng.getrandbits(16), 1) + payload
+        return _ethernet(ETHERTYPE_IPV4, rng) + _ipv4(1, src, dst, len(body)) + body
+    sport = rng.randrange(1024, 65535)
+    if kind.startswith("tcp"):
+        body = struct.pack("!HHIIBBHHH", sport, dport, rng.getrandbits(32), 0, 0x50, 0x18, 65535, 0, 0) + payload
+        proto = 6
+    else:
+        body = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+        proto = 17
+    if kind.endswith("6"):
+        return _ethernet(ETHERTYPE_IPV6, rng) + _ipv6(proto, src, dst, len(body)) + body
+    return _ethernet(ETHERTYPE_IPV4, rng) + _ipv4(proto, src, dst, len(body)) + body
+
+
+def synthetic_frames(count, seed=0, start_time=1_700_000_000.0, rate=10000.0):
+    """Yield count (timestamp, data, wirelen) records of mixed Ethernet traffic.
+
+    Frames are drawn from a fixed pool of templates so that generating
+    millions of packets stays cheap; the same seed always yields the same
+    records.
+    """
+    rng = random.Random(seed)
+    templates = [_frame(rng) for _ in range(min(count, TEMPLATES))]
+    timestamp = start_time
+    for _ in range(count):
+        data = templates[rng.randrange(len(templates))]
+        timestamp += rng.expovariate(rate)
+        yield timestamp, data, len(data)
+
+
+def synthetic_pcap(path, count, seed=0):
+    """Write a synthetic capture to path unless an identical one is already there."""
+    if os.path.exists(path):
+        return path
+    partial = path + ".partial"
+    with open(partial, "wb") as file:
+        write_pcap(file, synthetic_frames(count, seed))
+    os.replace(partial, path)
+    return path
+
+
+def synthetic_history(path, count, seed=0, interval_minutes=5):
+    """Write count speed test results, one every interval_minutes, as a speed_test_history.csv.
+
+    Like synthetic_pcap, an existing file at path is kept; callers put the
+    size and seed in the file name.
+    """
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    date = datetime.datetime(2024, 1, 1)
+    step = datetime.timedelta(minutes=interval_minutes)
+    partial = path + ".partial"
+    with open(partial, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Download Speed (Mbps)', 'Upload Speed (Mbps)', 'Ping (ms)', 'Jitter (ms)', 'Server', 'ISP'])
+        for _ in range(count):
+            writer.writerow([
+                date.strftime("%Y-%m-%d %H:%M:%S"),
+                max(rng.gauss(300, 60), 1), max(rng.gauss(40, 10), 1),
+                max(rng.gauss(15, 5), 1), abs(rng.gauss(2, 1)),
+                f"Server {rng.randrange(5)}", "Example ISP",
+            ])
+            date += step
+    os.replace(partial, path)
+    return path
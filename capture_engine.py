@@ -0,0 +1,204 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from capture_filter import kernel_socket_stats
+from packet_decode import parse_headers
+from pcap_io import LINKTYPE_ETHERNET
+
+# Slots of the per-interface shared counter array.
+CAPTURED, CAPTURED_BYTES, BATCHES, QUEUE_DROPPED, KERNEL_DROPPED = range(5)
+
+
+class RawSniffer:
+    """Read raw frames from a (optionally BPF-filtered) L2 socket without dissecting them."""
+
+    def __init__(self, interface, capture_filter=None):
+        import scapy.all as scapy
+
+        self.scapy = scapy
+        self.interface = interface
+        self.sock = scapy.conf.L2listen(iface=interface, filter=capture_filter)
+        # Reading PACKET_STATISTICS resets it; start from zero.
+        kernel_socket_stats(self.sock)
+
+    def next_frame(self, wait=0.5):
+        """Return (data, timestamp, linktype), or None if nothing arrived within wait seconds."""
+        if not self.sock.select([self.sock], wait):
+            return None
+        layer, data, timestamp = self.sock.recv_raw()
+        if not data:
+            return None
+        linktype = self.scapy.conf.l2types.layer2num.get(layer, LINKTYPE_ETHERNET)
+        return data, timestamp or time.time(), linktype
+
+    def kernel_stats(self):
+        return kernel_socket_stats(self.sock)
+
+    def close(self):
+        self.sock.close()
+
+
+def capture_process(interface, capture_filter, frames, stop_event, counters, errors,
+                    timeout=None, batch_size=512, batch_interval=0.05):
+    """Sniff and header-decode one interface in its own process.
+
+    Frames go to the parent in batches of (timestamp, data, wirelen, linktype,
+    headers) tuples. When the parent falls behind and the queue is full, the
+    batch is dropped and counted rather than blocking the sniffer.
+    """
+    try:
+        sniffer = RawSniffer(interface, capture_filter)
+    except Exception as e:
+        errors.put((interface, f"Error: {e}"))
+        return
+    batch = []
+    deadline = time.time() + timeout if timeout else None
+    last_send = time.time()
+    next_stats = last_send + 1
+    try:
+        while not stop_event.is_set():
+            now = time.time()
+            if deadline and now >= deadline:
+                break
+            if now >= next_stats:
+                kernel = sniffer.kernel_stats()
+                if kernel:
+                    counters[KERNEL_DROPPED] += kernel[1]
+                next_stats = now + 1
+            frame = sniffer.next_frame(batch_interval)
+            if frame is not None:
+                data, timestamp, linktype = frame
+                batch.append((timestamp, data, len(data), linktype, tuple(parse_headers(data, linktype))))
+                counters[CAPTURED] += 1
+                counters[CAPTURED_BYTES] += len(data)
+            if batch and (len(batch) >= batch_size or time.time() - last_send >= batch_interval):
+                _send(frames, interface, batch, counters)
+                batch = []
+                last_send = time.time()
+        if batch:
+            _send(frames, interface, batch, counters)
+    except Exception as e:
+        errors.put((interface, f"Error: {e}"))
+    finally:
+        sniffer.close()
+
+
+def _send(frames, interface, batch, counters):
+    try:
+        frames.put_nowait((interface, batch))
+        counters[BATCHES] += 1
+    except queue.Full:
+        counters[QUEUE_DROPPED] += len(batch)
+
+
+class ProcessCaptureEngine:
+    """Capture each interface in a separate process and hand batches to on_batch.
+
+    on_batch(interface, frames) runs on a single drain thread in this process.
+    Each interface has shared counters for captured packets and bytes, batches
+    sent, batches dropped at the queue and kernel drops, from which stats()
+    derives per-interface throughput. Errors of failed capture processes are
+    passed to on_error while the others keep running.
+    """
+
+    def __init__(self, interfaces, on_batch, capture_filter=None, timeout=None,
+                 max_queued_batches=1024, on_error=None):
+        self.interfaces = list(interfaces)
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.capture_filter = capture_filter
+        self.timeout = timeout
+        # Spawn rather than fork: the parent runs Streamlit, scapy and capture threads,
+        # whose locks a forked child could inherit mid-use.
+        self.context = multiprocessing.get_context("spawn")
+        self.frames = self.context.Queue(max_queued_batches)
+        self.errors = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.counters = {
+            interface: self.context.Array("Q", 5, lock=False) for interface in self.interfaces
+        }
+        self.processes = []
+        self.drain_thread = None
+        self.started_at = None
+        self.last_rates = {interface: (time.time(), 0, 0) for interface in self.interfaces}
+
+    def start(self):
+        self.started_at = time.time()
+        for interface in self.interfaces:
+            process = self.context.Process(
+                target=capture_process,
+                args=(
+                    interface, self.capture_filter, self.frames, self.stop_event,
+                    self.counters[interface], self.errors, self.timeout,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        self.drain_thread = threading.Thread(target=self._drain, daemon=True)
+        self.drain_thread.start()
+
+    def _drain(self):
+        next_error_check = 0
+        while True:
+            # Report capture processes that failed while the others keep running.
+            if time.time() >= next_error_check:
+                self._report_errors()
+                next_error_check = time.time() + 0.2
+            try:
+                interface, batch = self.frames.get(timeout=0.2)
+            except queue.Empty:
+                if self.stop_event.is_set() or not any(p.is_alive() for p in self.processes):
+                    break
+                continue
+            self.on_batch(interface, batch)
+        self._report_errors()
+
+    def _report_errors(self):
+        while True:
+            try:
+                interface, message = self.errors.get_nowait()
+            except queue.Empty:
+                return
+            if self.on_error:
+                self.on_error(interface, message)
+
+    def stop(self, timeout=2):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self.drain_thread is not None:
+            self.drain_thread.join(timeout)
+
+    def is_running(self):
+        return any(process.is_alive() for process in self.processes)
+
+    def _is_alive(self, interface):
+        if interface not in self.interfaces[:len(self.processes)]:
+            return False
+        return self.processes[self.interfaces.index(interface)].is_alive()
+
+    def stats(self):
+        """Return per-interface counters and packet/bit rates since the previous call."""
+        result = {}
+        now = time.time()
+        for interface, counters in self.counters.items():
+            captured, captured_bytes = counters[CAPTURED], counters[CAPTURED_BYTES]
+            then, previous_packets, previous_bytes = self.last_rates[interface]
+            elapsed = max(now - then, 1e-6)
+            result[interface] = {
+                "captured": captured,
+                "bytes": captured_bytes,
+                "batches": counters[BATCHES],
+                "queue_dropped": counters[QUEUE_DROPPED],
+                "kernel_dropped": counters[KERNEL_DROPPED],
+                "packets_per_second": (captured - previous_packets) / elapsed,
+                "mbps": (captured_bytes - previous_bytes) * 8 / elapsed / 1e6,
+                "running": self._is_alive(interface),
+            }
+            self.last_rates[interface] = (now, captured, captured_bytes)
+        return result
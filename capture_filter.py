@@ -0,0 +1,95 @@
+import socket
+import struct
+
+from packet_decode import APPLICATION_PORTS, LINK_LAYER_NAMES
+
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+_TPACKET_STATS = struct.Struct("II")
+
+# Same vocabulary as packet_decode.protocol_tags, expressed as BPF primitives.
+PROTOCOL_FILTERS = {
+    "IP": "(ip or ip6)",
+    "IPV4": "ip",
+    "IPV6": "ip6",
+    "ARP": "arp",
+    "TCP": "tcp",
+    "UDP": "udp",
+    "SCTP": "sctp",
+    "ICMP": "icmp",
+    "ICMPV6": "icmp6",
+    "IGMP": "igmp",
+    "GRE": "(ip proto 47 or ip6 proto 47)",
+}
+# Link-layer names ("Ethernet", "Loopback", "Raw IP", ...) and their linktypes. A link
+# layer belongs to the interface, not the packet, so BPF cannot select it; captures
+# drop frames of other link types in Python instead (see link_layer_filter).
+LINK_LAYER_TYPES = {}
+for _linktype, _name in LINK_LAYER_NAMES.items():
+    LINK_LAYER_TYPES.setdefault(_name.upper(), set()).add(_linktype)
+
+
+def protocol_filter(protocol):
+    """Translate a protocol name (e.g. "tcp", "dns") into a BPF expression."""
+    name = protocol.strip().upper()
+    if name in LINK_LAYER_TYPES:
+        return ""
+    if name in PROTOCOL_FILTERS:
+        return PROTOCOL_FILTERS[name]
+    ports = sorted(port for port, app in APPLICATION_PORTS.items() if app == name)
+    if not ports:
+        raise ValueError(f"Unknown protocol for capture filter: {protocol}")
+    return "(" + " or ".join(f"port {port}" for port in ports) + ")"
+
+
+def link_layer_filter(protocol):
+    """Return the linktypes a link-layer protocol name stands for, or None for any other name."""
+    if not protocol:
+        return None
+    linktypes = LINK_LAYER_TYPES.get(protocol.strip().upper())
+    return frozenset(linktypes) if linktypes else None
+
+
+def address_filter(direction, address):
+    """Translate an address or CIDR network into a BPF host/net primitive."""
+    address = address.strip()
+    keyword = "net" if "/" in address else "host"
+    return f"{direction} {keyword} {address}"
+
+
+def build_bpf(protocol=None, source_ip=None, destination_ip=None, expression=None):
+    """Build a BPF program text from the apply_filters vocabulary.
+
+    An extra raw tcpdump-style expression can be ANDed in. Returns None
+    when nothing is filtered. Link-layer protocols add no clause; pass
+    link_layer_filter(protocol) to start_capture for those.
+    """
+    clauses = []
+    if protocol:
+        clauses.append(protocol_filter(protocol))
+    if source_ip:
+        clauses.append(address_filter("src", source_ip))
+    if destination_ip:
+        clauses.append(address_filter("dst", destination_ip))
+    if expression and expression.strip():
+        clauses.append(f"({expression.strip()})")
+    clauses = [clause for clause in clauses if clause]
+    return " and ".join(clauses) or None
+
+
+def kernel_socket_stats(sock):
+    """Read and reset (accepted, dropped) counters of a Linux packet socket.
+
+    Returns None where PACKET_STATISTICS is unavailable.
+    """
+    raw_socket = getattr(sock, "ins", sock)
+    if not hasattr(raw_socket, "getsockopt") or not hasattr(socket, "AF_PACKET"):
+        return None
+    try:
+        packets, drops = _TPACKET_STATS.unpack(
+            raw_socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, _TPACKET_STATS.size)
+        )
+    except OSError:
+        return None
+    # tp_packets counts every packet that passed the filter, including drops.
+    return packets - drops, drops
@@ -0,0 +1,317 @@
+"""Headless monitoring daemon.
+
+Runs speed tests, latency probing and packet captures on schedules without
+a browser attached, writing results to the history store. Progress is
+published to a status file that the Streamlit UI reads (never writes), so
+the UI can attach to a running daemon read-only.
+
+    python daemon.py --speedtest-interval 1800 --probe-interval 60 \\
+        --capture-interval 3600 --capture-duration 300 --capture-interface eth0 \\
+        --record-dir captures
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import signal
+import tempfile
+import threading
+import time
+
+import metrics
+
+STATUS_PATH = "monitor_status.json"
+
+log = logging.getLogger("netmon")
+
+
+class Job:
+    """A periodic action run on its own thread.
+
+    Every run is rescheduled interval seconds later, +/- jitter (a fraction of
+    the interval), so a fleet of daemons started together drifts apart. A
+    job that is still running when it comes due again is skipped rather
+    than started twice.
+    """
+
+    def __init__(self, name, interval, action, jitter=0.1):
+        self.name = name
+        self.interval = interval
+        self.action = action
+        self.jitter = jitter
+        self.thread = None
+        self.next_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_start = None
+        self.last_end = None
+        self.last_error = None
+
+    def schedule(self, now, first=False):
+        spread = self.interval * self.jitter
+        if first:
+            self.next_run = now + random.uniform(0, spread)
+        else:
+            self.next_run = now + self.interval + random.uniform(-spread, spread)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"job-{self.name}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.last_start = time.time()
+        try:
+            self.action()
+            self.last_error = None
+        except Exception as e:
+            metrics.THREAD_ERRORS.labels(f"job-{self.name}").inc()
+            self.failures += 1
+            self.last_error = str(e)
+            log.exception("Job %s failed", self.name)
+        finally:
+            self.runs += 1
+            self.last_end = time.time()
+
+    def status(self):
+        return {
+            "interval": self.interval,
+            "running": self.running(),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_start": self.last_start,
+            "last_end": self.last_end,
+            "last_error": self.last_error,
+            "next_run": self.next_run,
+        }
+
+
+class Scheduler:
+    """Run jobs when they come due and publish a status file every heartbeat seconds."""
+
+    def __init__(self, jobs, status_path=STATUS_PATH, heartbeat=5, extra_status=None):
+        self.jobs = list(jobs)
+        self.status_path = status_path
+        self.heartbeat = heartbeat
+        self.extra_status = extra_status
+        self.stop_event = threading.Event()
+        self.started_at = time.time()
+
+    def run(self):
+        now = time.time()
+        for job in self.jobs:
+            job.schedule(now, first=True)
+        next_status = now
+        while not self.stop_event.is_set():
+            now = time.time()
+            for job in self.jobs:
+                if now < job.next_run:
+                    continue
+                if job.running():
+                    job.skipped += 1
+                    log.warning("Skipping %s: previous run still in progress", job.name)
+                else:
+                    job.start()
+                job.schedule(now)
+            if now >= next_status:
+                self.write_status()
+                next_status = now + self.heartbeat
+            wake = min([job.next_run for job in self.jobs] + [next_status])
+            self.stop_event.wait(max(wake - time.time(), 0))
+        self.write_status()
+
+    def run_once(self):
+        """Run every job once, one after another, then return."""
+        for job in self.jobs:
+            job.run()
+        self.write_status()
+
+    def stop(self, timeout=30):
+        self.stop_event.set()
+        for job in self.jobs:
+            if job.running():
+                job.thread.join(timeout)
+
+    def status(self):
+        status = {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "running": not self.stop_event.is_set(),
+            "jobs": {job.name: job.status() for job in self.jobs},
+        }
+        if self.extra_status:
+            status.update(self.extra_status())
+        return status
+
+    def write_status(self):
+        if not self.status_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.status_path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as file:
+            json.dump(self.status(), file, default=str)
+        os.replace(file.name, self.status_path)
+
+
+def read_status(path=STATUS_PATH, stale_after=60):
+    """Return the daemon's last published status, or None if there is none.
+
+    status["stale"] is set when the daemon has not written for stale_after
+    seconds, i.e. it has most likely exited.
+    """
+    try:
+        with open(path) as file:
+            status = json.load(file)
+    except (OSError, ValueError):
+        return None
+    status["stale"] = time.time() - status.get("updated_at", 0) > stale_after
+    return status
+
+
+def speed_test_job(streams, duration):
+    def run():
+        from worker_speed_test import SpeedTestWorker
+
+        worker = SpeedTestWorker(streams=streams, duration=duration)
+        worker.start_test()
+        log.info(
+            "Speed test: %.1f/%.1f Mbps via %s", worker.download_speed, worker.upload_speed, worker.server_name
+        )
+    return run
+
+
+def latency_job(prober, store):
+    """Store each target's probes since the previous run as one latency window."""
+    last_run = [time.time()]
+
+    def run():
+        now = time.time()
+        since, last_run[0] = last_run[0], now
+        date = datetime.datetime.now()
+        for name in prober.summary():
+            window = [rtt for timestamp, rtt in prober.samples(name) if since <= timestamp < now]
+            if not window:
+                continue
+            replies = [rtt for rtt in window if rtt is not None]
+            store.add_latency(
+                date, name, len(window), len(window) - len(replies),
+                sum(replies) / len(replies) if replies else None,
+            )
+    return run
+
+
+def capture_job(interfaces, duration, capture_filter, record_dir, use_processes):
+    def run():
+        from worker_packet_tracer import PacketWorker
+
+        worker = PacketWorker()
+        worker.start_capture(
+            interfaces, capture_filter, timeout=duration, record_dir=record_dir,
+            keep_in_memory=not record_dir, use_processes=use_processes,
+        )
+        for thread in worker.capture_threads:
+            thread.join()
+        while worker.capture_engine is not None and worker.capture_engine.is_running():
+            time.sleep(1)
+        worker.stop_packet_capture()
+        worker.close_recordings()
+        log.info("Capture: %s", {
+            interface: stats["accepted"] for interface, stats in worker.get_capture_statistics().items()
+        })
+    return run
+
+
+def build_scheduler(args):
+    from history_store import shared_store
+    from latency_prober import LatencyProber, ProbeTarget
+    from rate_sampler import RECV_MBPS, SENT_MBPS, TOTAL, shared_sampler
+
+    store = shared_store()
+    sampler = shared_sampler()
+    jobs = []
+    prober = None
+    if args.speedtest_interval:
+        jobs.append(Job("speedtest", args.speedtest_interval,
+                        speed_test_job(args.streams, args.speedtest_duration), args.jitter))
+    if args.probe_interval:
+        prober = LatencyProber([ProbeTarget.parse(target) for target in args.probe_target])
+        prober.start()
+        jobs.append(Job("latency", args.probe_interval, latency_job(prober, store), args.jitter))
+    if args.capture_interval:
+        if not args.capture_interface:
+            raise SystemExit("--capture-interval needs at least one --capture-interface")
+        jobs.append(Job("capture", args.capture_interval, capture_job(
+            args.capture_interface, args.capture_duration, args.capture_filter,
+            args.record_dir, args.capture_processes,
+        ), args.jitter))
+
+    def extra_status():
+        rows = sampler.snapshot(TOTAL, seconds=5)
+        status = {"rates": None, "latency": prober.summary() if prober else None}
+        if len(rows):
+            status["rates"] = {"sent_mbps": rows[-1, SENT_MBPS], "recv_mbps": rows[-1, RECV_MBPS]}
+        return status
+
+    return Scheduler(jobs, args.status_file, extra_status=extra_status)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless network monitoring daemon")
+    parser.add_argument("--speedtest-interval", type=float, default=1800,
+                        help="seconds between speed tests (0 disables)")
+    parser.add_argument("--speedtest-duration", type=float, default=10, help="seconds per direction")
+    parser.add_argument("--streams", type=int, default=4, help="parallel HTTP streams per speed test")
+    parser.add_argument("--probe-interval", type=float, default=60,
+                        help="seconds between stored latency windows (0 disables)")
+    parser.add_argument("--probe-target", action="append", default=None,
+                        help="host:port or dns://host:port (repeatable)")
+    parser.add_argument("--capture-interval", type=float, default=0,
+                        help="seconds between captures (0 disables)")
+    parser.add_argument("--capture-duration", type=float, default=300, help="seconds per capture")
+    parser.add_argument("--capture-interface", action="append", default=[], help="interface to capture on")
+    parser.add_argument("--capture-filter", default=None, help="BPF expression")
+    parser.add_argument("--capture-processes", action="store_true", help="one process per interface")
+    parser.add_argument("--record-dir", default=None, help="write captures to rotating PCAP files here")
+    parser.add_argument("--jitter", type=float, default=0.1, help="random fraction of each interval")
+    parser.add_argument("--status-file", default=STATUS_PATH, help="status file read by the UI")
+    parser.add_argument("--once", action="store_true", help="run every job once and exit")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT (default $NETMON_METRICS_PORT)")
+    args = parser.parse_args(argv)
+    if args.probe_target is None:
+        from latency_prober import DEFAULT_TARGETS
+
+        args.probe_target = DEFAULT_TARGETS
+    return args
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    metrics.serve(args.metrics_port)
+    scheduler = build_scheduler(args)
+    if args.once:
+        if args.probe_interval:
+            # Give the prober one interval of samples to store.
+            time.sleep(2)
+        scheduler.run_once()
+        return
+
+    def shutdown(signum, frame):
+        log.info("Stopping on signal %s", signum)
+        scheduler.stop_event.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    scheduler.run()
+    scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
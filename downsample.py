@@ -0,0 +1,96 @@
+import numpy as np
+
+# Plotly draws about two distinguishable points per horizontal pixel.
+POINTS_PER_PIXEL = 2
+
+
+def resolution(visible_seconds, width, points_per_pixel=POINTS_PER_PIXEL):
+    """Return (max_points, seconds_per_point) for a chart width pixels wide showing visible_seconds."""
+    max_points = max(int(width * points_per_pixel), 3)
+    return max_points, max(visible_seconds, 0) / max_points
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def lttb(x, y, threshold):
+    """Return the indices of threshold points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket, which keeps peaks and the
+    overall shape. NaN values are never preferred but keep their slots.
+    """
+    x = _as_float(x)
+    y = _as_float(y)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2]) if bucket + 2 < len(edges) else slice(n - 1, n)
+        next_x = x[following].mean()
+        window = y[following]
+        window = window[~np.isnan(window)]
+        next_y = window.mean() if len(window) else y[previous]
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        area[np.isnan(area)] = -1
+        previous = start + int(area.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max(y, buckets):
+    """Return sorted indices of the minimum and maximum of each of buckets equal-count buckets.
+
+    Cheaper than LTTB and keeps every spike, which suits rate charts.
+    """
+    y = _as_float(y)
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    filled = np.where(np.isnan(y), np.inf, y)
+    low = [start + int(filled[start:end].argmin()) for start, end in zip(edges[:-1], edges[1:])]
+    filled = np.where(np.isnan(y), -np.inf, y)
+    high = [start + int(filled[start:end].argmax()) for start, end in zip(edges[:-1], edges[1:])]
+    return np.unique(np.concatenate((low, high)))
+
+
+def downsample_frame(df, x, columns, max_points, method="lttb"):
+    """Return the rows of df needed to draw columns against x with about max_points points per column.
+
+    Indices picked for each column are merged, so every series keeps its own
+    shape and all of them still share the same rows.
+    """
+    if len(df) <= max_points:
+        return df
+    xs = df[x].values
+    picked = [
+        lttb(xs, df[column].values, max_points) if method == "lttb" else min_max(df[column].values, max_points // 2)
+        for column in columns
+    ]
+    return df.iloc[np.unique(np.concatenate(picked))]
+
+
+def downsample_array(rows, x_column, columns, max_points, method="min_max"):
+    """Row-array counterpart of downsample_frame for NumPy sample buffers."""
+    if len(rows) <= max_points:
+        return rows
+    picked = [
+        lttb(rows[:, x_column], rows[:, column], max_points) if method == "lttb"
+        else min_max(rows[:, column], max_points // 2)
+        for column in columns
+    ]
+    return rows[np.unique(np.concatenate(picked))]
@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import math
+import threading
+from collections import OrderedDict
+
+from packet_decode import IP_PROTOCOL_NAMES, NO_ADDRESS, format_address, format_endpoint
+
+
+class Flow:
+    """Counters of one conversation (5-tuple, both directions)."""
+
+    __slots__ = (
+        "key", "packets", "bytes", "first_seen", "last_seen", "decayed_bytes", "decayed_packets",
+    )
+
+    def __init__(self, key, timestamp):
+        self.key = key
+        self.packets = 0
+        self.bytes = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.decayed_bytes = 0.0
+        self.decayed_packets = 0.0
+
+
+class FlowTable:
+    """Bounded, incrementally updated table of conversations.
+
+    Flows are kept in last-seen order, so idle-timeout and size-limit
+    eviction both pop from the front. Rates are exponentially decayed
+    over rate_window seconds. Top-K queries use lazily invalidated max-heaps
+    keyed by bytes and packets, so a query costs O(k log n) instead of a
+    sort of the whole table.
+    """
+
+    def __init__(self, max_flows=100000, idle_timeout=300, rate_window=10.0):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.flows = OrderedDict()
+            self.heaps = {"bytes": [], "packets": []}
+            self.sequence = itertools.count()
+            self.evicted_flows = 0
+            self.now = 0.0
+
+    def __len__(self):
+        return len(self.flows)
+
+    @staticmethod
+    def flow_key(headers):
+        """Return the direction-independent 5-tuple of a packet, or None if it is not IP."""
+        if headers.src == NO_ADDRESS:
+            return None
+        forward = (headers.src, headers.sport)
+        reverse = (headers.dst, headers.dport)
+        if reverse < forward:
+            forward, reverse = reverse, forward
+        return (headers.proto, forward[0], reverse[0], forward[1], reverse[1])
+
+    def update(self, headers, length, timestamp):
+        """Account one packet to its flow."""
+        key = self.flow_key(headers)
+        if key is None:
+            return
+        with self.lock:
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self.flows[key] = Flow(key, timestamp)
+            else:
+                self.flows.move_to_end(key)
+                decay = math.exp(-max(timestamp - flow.last_seen, 0.0) / self.rate_window)
+                flow.decayed_bytes *= decay
+                flow.decayed_packets *= decay
+            flow.packets += 1
+            flow.bytes += length
+            flow.decayed_bytes += length
+            flow.decayed_packets += 1
+            flow.last_seen = max(flow.last_seen, timestamp)
+            self.now = max(self.now, timestamp)
+
+            sequence = next(self.sequence)
+            heapq.heappush(self.heaps["bytes"], (-flow.bytes, sequence, key))
+            heapq.heappush(self.heaps["packets"], (-flow.packets, sequence, key))
+            self._evict()
+
+    def _evict(self):
+        cutoff = self.now - self.idle_timeout
+        while self.flows:
+            oldest = next(iter(self.flows.values()))
+            if len(self.flows) <= self.max_flows and oldest.last_seen >= cutoff:
+                break
+            del self.flows[oldest.key]
+            self.evicted_flows += 1
+        # Stale heap entries are skipped on query; rebuild before they dominate.
+        if len(self.heaps["bytes"]) > 4 * len(self.flows) + 1024:
+            self._rebuild_heaps()
+
+    def _rebuild_heaps(self):
+        for field, heap in self.heaps.items():
+            heap[:] = [
+                (-getattr(flow, field), next(self.sequence), key) for key, flow in self.flows.items()
+            ]
+            heapq.heapify(heap)
+
+    def expire(self, now=None):
+        """Evict flows idle for longer than idle_timeout."""
+        with self.lock:
+            if now is not None:
+                self.now = max(self.now, now)
+            self._evict()
+
+    def top(self, k=10, by="bytes"):
+        """Return the k largest flows by "bytes" or "packets", largest first."""
+        with self.lock:
+            heap = self.heaps[by]
+            found = []
+            while heap and len(found) < k:
+                entry = heapq.heappop(heap)
+                flow = self.flows.get(entry[2])
+                if flow is not None and getattr(flow, by) == -entry[0]:
+                    found.append(entry)
+            for entry in found:
+                heapq.heappush(heap, entry)
+            return [self._describe(self.flows[entry[2]]) for entry in found]
+
+    def _describe(self, flow):
+        proto, src, dst, sport, dport = flow.key
+        idle_decay = math.exp(-max(self.now - flow.last_seen, 0.0) / self.rate_window)
+        return {
+            "protocol": IP_PROTOCOL_NAMES.get(proto, f"proto {proto}"),
+            "endpoint_a": _endpoint(src, sport),
+            "endpoint_b": _endpoint(dst, dport),
+            "packets": flow.packets,
+            "bytes": flow.bytes,
+            "first_seen": flow.first_seen,
+            "last_seen": flow.last_seen,
+            "rate_mbps": flow.decayed_bytes * idle_decay * 8 / self.rate_window / 1e6,
+            "rate_pps": flow.decayed_packets * idle_decay / self.rate_window,
+        }
+
+
+def _endpoint(address, port):
+    address = format_address(address)
+    return format_endpoint(address, port) if port else address
@@ -0,0 +1,398 @@
+import calendar
+import csv
+import datetime
+import json
+import math
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from latency_stats import QUANTILES, QuantileSketch
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = [
+    "Date", "Download Speed (Mbps)", "Upload Speed (Mbps)", "Ping (ms)", "Jitter (ms)", "Server", "ISP",
+]
+# Numeric columns of the tests table, in COLUMNS order.
+METRICS = ["download", "upload", "ping", "jitter"]
+PERIODS = {"hour": 3600, "day": 86400}
+# Metrics whose rollups also keep a quantile sketch, for tail percentiles.
+SKETCH_METRICS = ["ping"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    date REAL NOT NULL,
+    download REAL, upload REAL, ping REAL, jitter REAL,
+    server TEXT, isp TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_date ON tests (date);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    bucket REAL NOT NULL,
+    tests INTEGER NOT NULL,
+    {", ".join(f"{m}_count INTEGER, {m}_sum REAL, {m}_min REAL, {m}_max REAL" for m in METRICS)},
+    PRIMARY KEY (period, bucket)
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    period TEXT NOT NULL,
+    bucket REAL NOT NULL,
+    metric TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (period, bucket, metric)
+);
+CREATE TABLE IF NOT EXISTS latency (
+    id INTEGER PRIMARY KEY,
+    date REAL NOT NULL,
+    target TEXT NOT NULL,
+    sent INTEGER NOT NULL,
+    lost INTEGER NOT NULL,
+    rtt REAL
+);
+CREATE INDEX IF NOT EXISTS latency_date ON latency (date);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+LATENCY_COLUMNS = ["Date", "Target", "Sent", "Lost", "RTT (ms)"]
+
+ROLLUP_UPSERT = f"""
+INSERT INTO rollups (period, bucket, tests, {", ".join(f"{m}_count, {m}_sum, {m}_min, {m}_max" for m in METRICS)})
+VALUES (?, ?, 1, {", ".join("?, ?, ?, ?" for _ in METRICS)})
+ON CONFLICT (period, bucket) DO UPDATE SET
+    tests = tests + 1,
+    {", ".join(
+        f"{m}_count = {m}_count + excluded.{m}_count, "
+        f"{m}_sum = coalesce({m}_sum, 0) + coalesce(excluded.{m}_sum, 0), "
+        f"{m}_min = coalesce(min({m}_min, excluded.{m}_min), {m}_min, excluded.{m}_min), "
+        f"{m}_max = coalesce(max({m}_max, excluded.{m}_max), {m}_max, excluded.{m}_max)"
+        for m in METRICS
+    )}
+"""
+
+
+def to_seconds(date):
+    """Convert a naive local datetime to seconds since 1970-01-01 in the same wall clock."""
+    return calendar.timegm(date.timetuple()) + date.microsecond / 1e6
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class HistoryStore:
+    """Speed test results in SQLite, indexed by time, with hourly and daily rollups.
+
+    Dates are stored as wall-clock seconds since the epoch, so buckets line up
+    with local hours and days and convert back to naive datetimes directly.
+    Rollups are updated in the same transaction as each insert, so the
+    History tab can chart any span from a bounded number of buckets. Ping
+    rollups also keep a mergeable quantile sketch per bucket, so p50/p95/p99
+    per hour or day cost no scan of the tests either.
+    """
+
+    def __init__(self, path="speed_test_history.db", csv_path="speed_test_history.csv"):
+        self.path = path
+        self.lock = threading.Lock()
+        # The monitoring daemon and the UI may write concurrently; wait for locks.
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self._backfill_sketches()
+        if csv_path and os.path.exists(csv_path):
+            self.import_csv(csv_path)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def add(self, date, download, upload, ping, jitter, server=None, isp=None):
+        """Store one test result; date is a naive local datetime."""
+        with self.lock, self.connection:
+            sketches = {}
+            self._insert(self.connection, to_seconds(date), download, upload, ping, jitter, server, isp, sketches)
+            self._save_sketches(self.connection, sketches)
+
+    def add_latency(self, date, target, sent, lost, rtt):
+        """Store one probing window of a latency target; rtt is its mean RTT in ms or None."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO latency (date, target, sent, lost, rtt) VALUES (?, ?, ?, ?, ?)",
+                (to_seconds(date), target, sent, lost, _number(rtt)),
+            )
+
+    def latency(self, start=None, end=None, target=None):
+        """Return the latency windows in [start, end), optionally of one target, oldest first."""
+        where, params = self._where(start, end)
+        if target is not None:
+            where += (" AND" if where else " WHERE") + " target = ?"
+            params.append(target)
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT date, target, sent, lost, rtt FROM latency{where} ORDER BY date", params
+            ).fetchall()
+        df = pd.DataFrame(rows, columns=LATENCY_COLUMNS)
+        df["Date"] = pd.to_datetime(df["Date"], unit="s")
+        return df
+
+    def _insert(self, cursor, seconds, download, upload, ping, jitter, server, isp, sketches):
+        """Insert a test and update its rollups; sketch updates are collected in sketches."""
+        values = [_number(download), _number(upload), _number(ping), _number(jitter)]
+        cursor.execute(
+            "INSERT INTO tests (date, download, upload, ping, jitter, server, isp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (seconds, *values, server, isp),
+        )
+        rollup = []
+        for value in values:
+            rollup += [int(value is not None), value, value, value]
+        for period, width in PERIODS.items():
+            bucket = seconds - seconds % width
+            cursor.execute(ROLLUP_UPSERT, (period, bucket, *rollup))
+            self._add_to_sketches(sketches, period, bucket, values)
+
+    @staticmethod
+    def _add_to_sketches(sketches, period, bucket, values):
+        for metric in SKETCH_METRICS:
+            value = values[METRICS.index(metric)]
+            if value is not None:
+                sketches.setdefault((period, bucket, metric), QuantileSketch()).add(value)
+
+    def _save_sketches(self, cursor, sketches):
+        """Merge {(period, bucket, metric): sketch} into the stored sketches."""
+        for (period, bucket, metric), sketch in sketches.items():
+            row = cursor.execute(
+                "SELECT sketch FROM sketches WHERE period = ? AND bucket = ? AND metric = ?",
+                (period, bucket, metric),
+            ).fetchone()
+            if row:
+                sketch = QuantileSketch.from_json(row[0]).merge(sketch)
+            cursor.execute(
+                "INSERT OR REPLACE INTO sketches (period, bucket, metric, sketch) VALUES (?, ?, ?, ?)",
+                (period, bucket, metric, sketch.to_json()),
+            )
+
+    def _backfill_sketches(self):
+        """Build the sketches of a database created before they existed."""
+        with self.lock, self.connection:
+            if self.connection.execute("SELECT 1 FROM sketches LIMIT 1").fetchone():
+                return
+            sketches = {}
+            for row in self.connection.execute(f"SELECT date, {', '.join(METRICS)} FROM tests"):
+                for period, width in PERIODS.items():
+                    self._add_to_sketches(sketches, period, row[0] - row[0] % width, row[1:])
+            self._save_sketches(self.connection, sketches)
+
+    def import_csv(self, csv_path):
+        """Import the rows appended to a speed_test_history.csv since the previous call.
+
+        The offset of the last complete line read is kept in meta together
+        with the file's size and mtime, so an unchanged file costs one stat
+        and a grown one is parsed from where the last import stopped. A file
+        that shrank was replaced; it is re-read from the start, skipping tests
+        no newer than the last one imported.
+        """
+        key = f"csv:{os.path.abspath(csv_path)}"
+        stat = os.stat(csv_path)
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            state = json.loads(row[0]) if row else {"offset": 0, "size": -1, "mtime": 0, "last_date": None}
+            if (state["size"], state["mtime"]) == (stat.st_size, stat.st_mtime_ns):
+                return 0
+            skip_until = None
+            if stat.st_size < state["offset"]:
+                state["offset"], skip_until = 0, state["last_date"]
+
+            with open(csv_path, "rb") as file:
+                header = next(csv.reader([file.readline().decode()]), [])
+                start = max(state["offset"], file.tell())
+                file.seek(start)
+                data = file.read()
+            complete = data.rfind(b"\n") + 1
+            imported = 0
+            sketches = {}
+            for values in csv.reader(data[:complete].decode().splitlines()):
+                row = dict(zip(header, values))
+                try:
+                    seconds = to_seconds(datetime.datetime.strptime(row["Date"], DATE_FORMAT))
+                except (KeyError, ValueError):
+                    continue
+                if skip_until is not None and seconds <= skip_until:
+                    continue
+                self._insert(
+                    self.connection, seconds,
+                    *(row.get(column) for column in COLUMNS[1:5]), row.get("Server"), row.get("ISP"),
+                    sketches,
+                )
+                state["last_date"] = max(seconds, state["last_date"] or seconds)
+                imported += 1
+
+            self._save_sketches(self.connection, sketches)
+            state["offset"] = start + complete
+            state["size"], state["mtime"] = stat.st_size, stat.st_mtime_ns
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(state))
+            )
+        return imported
+
+    def rows_after(self, last_id):
+        """Return (id, date, download, upload, ping, jitter, server, isp) rows with id > last_id."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT id, date, download, upload, ping, jitter, server, isp FROM tests WHERE id > ? ORDER BY id",
+                (last_id,),
+            ).fetchall()
+
+    def _where(self, start, end):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(to_seconds(start))
+        if end is not None:
+            clauses.append("date < ?")
+            params.append(to_seconds(end))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, start=None, end=None):
+        where, params = self._where(start, end)
+        with self.lock:
+            return self.connection.execute(f"SELECT count(*) FROM tests{where}", params).fetchone()[0]
+
+    def time_range(self):
+        """Return (first, last) test datetimes, or None if the store is empty."""
+        with self.lock:
+            first, last = self.connection.execute("SELECT min(date), max(date) FROM tests").fetchone()
+        if first is None:
+            return None
+        return pd.to_datetime(first, unit="s"), pd.to_datetime(last, unit="s")
+
+    def query(self, start=None, end=None, limit=None):
+        """Return the tests in [start, end) as a DataFrame with the CSV's columns, oldest first.
+
+        With limit, only the newest limit tests of the range are returned.
+        """
+        where, params = self._where(start, end)
+        sql = f"SELECT date, download, upload, ping, jitter, server, isp FROM tests{where} ORDER BY date"
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql} DESC LIMIT ?) ORDER BY date"
+            params.append(limit)
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df["Date"] = pd.to_datetime(df["Date"], unit="s")
+        return df
+
+    def rollups(self, period="hour", start=None, end=None):
+        """Return per-bucket test counts and average/min/max of each metric over [start, end).
+
+        Metrics in SKETCH_METRICS also get "P50 <column>", "P95 <column>" and
+        "P99 <column>" estimates.
+        """
+        where, params = self._where(start, end)
+        where = where.replace("date", "bucket") + (" AND" if where else " WHERE") + " period = ?"
+        metrics = ", ".join(
+            f"{m}_sum / nullif({m}_count, 0), {m}_min, {m}_max" for m in METRICS
+        )
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT bucket, tests, {metrics} FROM rollups{where} ORDER BY bucket", [*params, period]
+            ).fetchall()
+            sketch_rows = self.connection.execute(
+                f"SELECT bucket, metric, sketch FROM sketches{where}", [*params, period]
+            ).fetchall()
+        columns = ["Date", "Tests"]
+        for column in COLUMNS[1:5]:
+            columns += [column, f"Min {column}", f"Max {column}"]
+        df = pd.DataFrame(rows, columns=columns)
+        quantiles = {
+            (bucket, metric): QuantileSketch.from_json(sketch).quantiles()
+            for bucket, metric, sketch in sketch_rows
+        }
+        for metric in SKETCH_METRICS:
+            column = COLUMNS[1 + METRICS.index(metric)]
+            values = [quantiles.get((bucket, metric), [None] * len(QUANTILES)) for bucket in df["Date"]]
+            for i, q in enumerate(QUANTILES):
+                df[f"P{round(q * 100)} {column}"] = pd.Series([row[i] for row in values], dtype="float64")
+        df["Date"] = pd.to_datetime(df["Date"], unit="s")
+        return df
+
+
+class HistoryCache:
+    """Typed, in-memory copy of the tests table that is extended incrementally.
+
+    refresh() first imports whatever was appended to the CSV (a stat when it
+    is unchanged), then fetches only rows with an id above the last one seen,
+    so reruns never re-parse or re-convert rows already held. The frame is
+    kept sorted by date so ranges are binary searches. version changes
+    whenever rows are added, so derived results can be cached against it.
+    """
+
+    def __init__(self, store, csv_path="speed_test_history.csv"):
+        self.store = store
+        self.csv_path = csv_path
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.version = 0
+        self.frame = self._frame([])
+
+    @staticmethod
+    def _frame(rows):
+        df = pd.DataFrame([row[1:] for row in rows], columns=COLUMNS)
+        df["Date"] = pd.to_datetime(df["Date"].astype("float64"), unit="s")
+        for column in COLUMNS[1:5]:
+            df[column] = df[column].astype("float64")
+        return df
+
+    def refresh(self):
+        """Pull new tests into the cache; returns the number added."""
+        with self.lock:
+            if self.csv_path and os.path.exists(self.csv_path):
+                self.store.import_csv(self.csv_path)
+            rows = self.store.rows_after(self.last_id)
+            if not rows:
+                return 0
+            self.last_id = rows[-1][0]
+            new = self._frame(rows)
+            frame = pd.concat([self.frame, new], ignore_index=True) if len(self.frame) else new
+            if not frame["Date"].is_monotonic_increasing:
+                frame = frame.sort_values("Date", kind="stable", ignore_index=True)
+            self.frame = frame
+            self.version += 1
+            return len(rows)
+
+    def range(self, start=None, end=None):
+        """Return the cached tests in [start, end), oldest first. Treat the result as read-only."""
+        frame = self.frame
+        dates = frame["Date"].values
+        low = dates.searchsorted(pd.Timestamp(start).to_datetime64()) if start is not None else 0
+        high = dates.searchsorted(pd.Timestamp(end).to_datetime64()) if end is not None else len(frame)
+        return frame.iloc[low:high]
+
+
+_shared_store = None
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_store():
+    """Return the process-wide history store, opening it (and importing the CSV) on first use."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = HistoryStore()
+        return _shared_store
+
+
+def shared_history():
+    """Return the process-wide history cache, refreshed with any tests added since the last call."""
+    global _shared_cache
+    store = shared_store()
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = HistoryCache(store)
+        cache = _shared_cache
+    cache.refresh()
+    return cache
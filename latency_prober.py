@@ -0,0 +1,262 @@
+import asyncio
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+from latency_stats import LatencyStats
+
+# NETMON_PROBE_TARGETS (comma separated, empty for none) replaces the public resolvers.
+DEFAULT_TARGETS = [
+    target.strip()
+    for target in os.environ.get("NETMON_PROBE_TARGETS", "8.8.8.8:53, 1.1.1.1:53").split(",")
+    if target.strip()
+]
+
+
+class ProbeTarget:
+    """One latency target: TCP connect time, or a UDP DNS query round trip."""
+
+    def __init__(self, host, port=53, protocol="tcp", interval=1.0, timeout=1.0, name=None):
+        if protocol not in ("tcp", "dns"):
+            raise ValueError(f"Unknown probe protocol: {protocol}")
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.interval = interval
+        self.timeout = timeout
+        self.name = name or f"{protocol}://{host}:{port}"
+
+    @classmethod
+    def parse(cls, text, **options):
+        """Build a target from "host:port", "dns://host:port" or "[v6]:port"."""
+        protocol = "tcp"
+        if "://" in text:
+            protocol, text = text.split("://", 1)
+        host, _, port = text.rpartition(":")
+        if not host or "]" in port:
+            host, port = text, "53"
+        return cls(host.strip("[]"), int(port), protocol, **options)
+
+
+class TargetStats(LatencyStats):
+    """Loss, jitter and RTT percentiles since start, plus recent (time, rtt_ms) samples, of one target."""
+
+    def __init__(self, history=600):
+        super().__init__()
+        self.samples = deque(maxlen=history)
+
+    def record(self, rtt):
+        self.add(rtt)
+        self.samples.append((time.time(), rtt))
+
+
+async def tcp_connect_rtt(host, port, timeout=1.0):
+    """Return the TCP handshake time to host:port in ms, or None on failure."""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return rtt
+
+
+class _DnsReply(asyncio.DatagramProtocol):
+    def __init__(self, query_id):
+        self.query_id = query_id
+        self.answered = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 2 and struct.unpack_from("!H", data)[0] == self.query_id and not self.answered.done():
+            self.answered.set_result(time.perf_counter())
+
+    def error_received(self, exc):
+        if not self.answered.done():
+            self.answered.set_exception(exc)
+
+
+def _dns_query(query_id, name="example.com"):
+    question = b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\0"
+    return struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0) + question + struct.pack("!HH", 1, 1)
+
+
+async def dns_query_rtt(host, port=53, timeout=1.0, name="example.com"):
+    """Return the round trip of an A query to a DNS server in ms, or None on failure."""
+    loop = asyncio.get_running_loop()
+    query_id = random.getrandbits(16)
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _DnsReply(query_id), remote_addr=(host, port)
+        )
+    except OSError:
+        return None
+    try:
+        start = time.perf_counter()
+        transport.sendto(_dns_query(query_id, name))
+        answered_at = await asyncio.wait_for(protocol.answered, timeout)
+        return (answered_at - start) * 1000
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        transport.close()
+
+
+async def probe(target):
+    """Probe a target once and return its RTT in ms, or None if it was lost."""
+    if target.protocol == "dns":
+        return await dns_query_rtt(target.host, target.port, target.timeout)
+    return await tcp_connect_rtt(target.host, target.port, target.timeout)
+
+
+async def probe_series(target, count=2, spacing=0.1):
+    """Probe one target count times, spacing seconds apart; returns RTTs (None = lost)."""
+    rtts = []
+    for attempt in range(count):
+        if attempt:
+            await asyncio.sleep(spacing)
+        rtts.append(await probe(target))
+    return rtts
+
+
+class LatencyProber:
+    """Probe many targets concurrently, each on its own schedule, from a background event loop.
+
+    Every target runs as a task that probes, records the result and sleeps
+    until its next due time; first probes are spread over one interval so
+    hundreds of targets do not fire at once. A semaphore caps the number of
+    sockets open at the same time.
+    """
+
+    def __init__(self, targets=(), max_concurrency=256, history=600):
+        self.max_concurrency = max_concurrency
+        self.history = history
+        self.targets = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.tasks = {}
+        self.semaphore = None
+        self.set_targets(targets)
+
+    def set_targets(self, targets):
+        """Replace the target list; stats of targets that remain are kept."""
+        targets = {target.name: target for target in targets}
+        with self.lock:
+            self.targets = targets
+            for name in targets:
+                self.stats.setdefault(name, TargetStats(self.history))
+            for name in list(self.stats):
+                if name not in targets:
+                    del self.stats[name]
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._sync_tasks)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._sync_tasks()
+        self.loop.run_forever()
+
+    def _sync_tasks(self):
+        for name, task in list(self.tasks.items()):
+            if name not in self.targets or task.done():
+                task.cancel()
+                del self.tasks[name]
+        for name, target in self.targets.items():
+            if name not in self.tasks:
+                self.tasks[name] = self.loop.create_task(self._schedule(target))
+
+    async def _schedule(self, target):
+        next_due = time.monotonic() + random.uniform(0, target.interval)
+        while True:
+            await asyncio.sleep(max(next_due - time.monotonic(), 0))
+            next_due += target.interval
+            async with self.semaphore:
+                rtt = await probe(target)
+            with self.lock:
+                stats = self.stats.get(target.name)
+                if stats is not None:
+                    stats.record(rtt)
+            if next_due < time.monotonic():
+                # Fell behind; resynchronise instead of bursting.
+                next_due = time.monotonic()
+
+    async def _cancel_tasks(self):
+        tasks = list(self.tasks.values())
+        self.tasks = {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        loop = self.loop
+        asyncio.run_coroutine_threadsafe(self._cancel_tasks(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        self.thread.join(timeout=2)
+        loop.close()
+        self.loop = None
+        self.thread = None
+
+    def summary(self):
+        """Return {target name: counters and RTT summary}."""
+        with self.lock:
+            return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def samples(self, name, seconds=None):
+        """Return recent (time, rtt_ms) samples of one target; rtt is None for losses."""
+        with self.lock:
+            stats = self.stats.get(name)
+            samples = list(stats.samples) if stats else []
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [sample for sample in samples if sample[0] >= cutoff]
+        return samples
+
+
+def measure(targets, count=1, spacing=0.1):
+    """Synchronously probe targets concurrently; returns {name: [rtt_ms or None, ...]}."""
+    async def run():
+        results = await asyncio.gather(*(probe_series(t, count, spacing) for t in targets))
+        return {target.name: rtts for target, rtts in zip(targets, results)}
+
+    return asyncio.run(run())
+
+
+_shared_prober = None
+_shared_lock = threading.Lock()
+
+
+def shared_prober(targets=None):
+    """Return the process-wide prober, starting it on first use.
+
+    targets (strings such as "8.8.8.8:53" or "dns://1.1.1.1") replace the
+    current target list when given.
+    """
+    global _shared_prober
+    with _shared_lock:
+        if _shared_prober is None:
+            _shared_prober = LatencyProber([ProbeTarget.parse(t) for t in DEFAULT_TARGETS])
+        if targets is not None:
+            parsed = [ProbeTarget.parse(t) for t in targets]
+            if sorted(t.name for t in parsed) != sorted(_shared_prober.targets):
+                _shared_prober.set_targets(parsed)
+        _shared_prober.start()
+        return _shared_prober
@@ -0,0 +1,184 @@
+"""Constant-memory streaming latency statistics.
+
+QuantileSketch estimates quantiles within a relative error (1% by
+default) from logarithmically sized buckets, like DDSketch: memory depends
+on the range of values seen, not their number, and two sketches merge by
+adding their bucket counts, so per-window or per-thread sketches can be
+combined into hourly and daily ones. LatencyStats adds loss accounting and
+RFC 3550 interarrival jitter on top.
+"""
+import json
+import math
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with a relative accuracy guarantee for positive values."""
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        """Add value (count times). Values <= 0 are counted as zero."""
+        if value is None or value != value:
+            return
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse(self):
+        # Fold the lowest buckets together: only the low tail loses accuracy.
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins + 1
+        folded = sum(self.bins.pop(index) for index in indexes[:excess])
+        target = indexes[excess]
+        self.bins[target] = self.bins.get(target, 0) + folded
+
+    def merge(self, other):
+        """Add every value of other into this sketch; both must share an accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Return the estimated q-quantile (0 <= q <= 1), or None if empty."""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs=QUANTILES):
+        return [self.quantile(q) for q in qs]
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_json(self):
+        return json.dumps({
+            "accuracy": self.relative_accuracy,
+            "bins": self.bins,
+            "zero": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        sketch = cls(state["accuracy"])
+        sketch.bins = {int(index): count for index, count in state["bins"].items()}
+        sketch.zero_count = state["zero"]
+        sketch.count = state["count"]
+        sketch.sum = state["sum"]
+        if sketch.count:
+            sketch.min, sketch.max = state["min"], state["max"]
+        return sketch
+
+
+class LatencyStats:
+    """Loss, RFC 3550 jitter and an RTT quantile sketch of one stream of probes.
+
+    add() takes an RTT in ms, or None for a lost probe. Jitter is the
+    interarrival jitter of RFC 3550 section 6.4.1, applied to consecutive
+    RTTs: J += (|D| - J) / 16. It starts from the first difference rather
+    than zero so that short series (a speed test's handful of pings) are
+    not biased low.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.sent = 0
+        self.last_rtt = None
+        self.previous_rtt = None
+        self.jitter = None
+
+    @property
+    def received(self):
+        return self.sketch.count
+
+    @property
+    def lost(self):
+        return self.sent - self.received
+
+    @property
+    def loss_rate(self):
+        return self.lost / self.sent if self.sent else 0.0
+
+    def add(self, rtt):
+        self.sent += 1
+        self.last_rtt = rtt
+        if rtt is None:
+            return
+        self.sketch.add(rtt)
+        if self.previous_rtt is not None:
+            difference = abs(rtt - self.previous_rtt)
+            if self.jitter is None:
+                self.jitter = difference
+            else:
+                self.jitter += (difference - self.jitter) / 16
+        self.previous_rtt = rtt
+
+    def merge(self, other):
+        """Combine another stream's counts and quantiles; jitter keeps the larger estimate."""
+        self.sketch.merge(other.sketch)
+        self.sent += other.sent
+        if other.jitter is not None:
+            self.jitter = other.jitter if self.jitter is None else max(self.jitter, other.jitter)
+        return self
+
+    def summary(self):
+        p50, p95, p99 = self.sketch.quantiles()
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "lost": self.lost,
+            "loss_rate": self.loss_rate,
+            "last_rtt": self.last_rtt,
+            "mean_rtt": self.sketch.mean,
+            "jitter": self.jitter,
+            "p50_rtt": p50,
+            "p95_rtt": p95,
+            "p99_rtt": p99,
+        }
@@ -1,35 +1,54 @@
+import datetime
+import importlib
 import streamlit as st
-from tab_realtime_monitoring import show_realtime_monitoring
-from tab_speed_test import speedtest
-from tab_packet_tracer import packet_tracer_tab
-from tab_history_window import history_tab
+import metrics
+from daemon import read_status
 
 st.set_page_config(page_title="Advanced Network Monitor", layout="wide")
 
+# Page -> (metrics label, module, render function). A page's module, and with it
+# scapy, plotly or reportlab, is only imported once the page is first opened.
+PAGES = {
+    "Real-Time Monitoring": ("realtime", "tab_realtime_monitoring", "show_realtime_monitoring"),
+    "Speed Test": ("speedtest", "tab_speed_test", "speedtest"),
+    "History": ("history", "tab_history_window", "history_tab"),
+    "Packet Capture": ("packets", "tab_packet_tracer", "packet_tracer_tab"),
+}
+
+TAB_SECONDS = metrics.histogram("netmon_tab_render_seconds", "Time to render one tab per rerun", ["tab"])
+TAB_ERRORS = metrics.counter("netmon_tab_errors_total", "Exceptions raised while rendering a tab", ["tab"])
+metrics_server = metrics.serve()
+
 st.title("Network Monitoring Tool")
 
-tabs = st.tabs(["Real-Time Monitoring", "Speed Test", "History", "Packet Capture"])
-
-with tabs[0]:
-    try:
-        show_realtime_monitoring()
-    except Exception as e:
-        st.error(f"An error occurred in Real-Time Monitoring: {str(e)}")
-
-with tabs[1]:
-    try:
-        speedtest()
-    except Exception as e:
-        st.error(f"An error occurred in Speed Test: {str(e)}")
-
-with tabs[2]:
-    try:
-        history_tab()
-    except Exception as e:
-        st.error(f"An error occurred in History: {str(e)}")
-
-with tabs[3]:
-    try:
-        packet_tracer_tab()
-    except Exception as e:
-        st.error(f"An error occurred in Packet Capture: {str(e)}")
\ No newline at end of file
+page = st.sidebar.radio("Page", list(PAGES), key="page")
+label, module_name, function_name = PAGES[page]
+
+daemon_status = read_status()
+if daemon_status:
+    with st.sidebar:
+        st.subheader("Monitoring daemon")
+        updated = datetime.datetime.fromtimestamp(daemon_status["updated_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        if daemon_status["stale"]:
+            st.warning(f"Not running (last update {updated})")
+        else:
+            st.success(f"Running, pid {daemon_status['pid']} (updated {updated})")
+        for name, job in daemon_status["jobs"].items():
+            last = datetime.datetime.fromtimestamp(job["last_end"]).strftime("%H:%M:%S") if job["last_end"] else "never"
+            st.caption(f"{name}: {job['runs']} runs, {job['failures']} failed, {job['skipped']} skipped, last {last}")
+            if job["last_error"]:
+                st.caption(f"{name} error: {job['last_error']}")
+
+if metrics.ENABLED:
+    with st.sidebar.expander("Diagnostics"):
+        if metrics_server is not None:
+            st.caption(f"Prometheus endpoint: http://127.0.0.1:{metrics_server.server_port}/metrics")
+        st.dataframe(metrics.REGISTRY.snapshot(), hide_index=True, use_container_width=True)
+
+try:
+    with TAB_SECONDS.labels(label).time():
+        render = getattr(importlib.import_module(module_name), function_name)
+        render()
+except Exception as e:
+    TAB_ERRORS.labels(label).inc()
+    st.error(f"An error occurred in {page}: {str(e)}")
@@ -0,0 +1,353 @@
+"""In-process counters, gauges and latency histograms.
+
+Metrics are declared once at import time and updated from the hot paths:
+
+    FRAMES = metrics.counter("netmon_frames_captured_total", "Frames captured", ["interface"])
+    FRAMES.labels("eth0").inc()
+
+    with metrics.histogram("netmon_filter_seconds", "Packet filter time").time():
+        ...
+
+Set NETMON_METRICS=0 to disable instrumentation: every metric is then the
+same no-op object, so an update costs one method call. Set
+NETMON_METRICS_PORT (or call serve()) to expose everything in the
+Prometheus text format on http://127.0.0.1:<port>/metrics.
+"""
+import bisect
+import http.server
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("NETMON_METRICS", "1").lower() not in ("0", "false", "no", "off")
+# Seconds, from 100 us (one dissection) to 30 s (a history tab rerun on a slow disk).
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def sample(self):
+        return {"value": self.value}
+
+
+class GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from function() whenever the gauge is collected."""
+        self.function = function
+
+    def sample(self):
+        if self.function is not None:
+            try:
+                self.value = self.function()
+            except Exception:
+                pass
+        return {"value": self.value}
+
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[position] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimate the q-quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[position - 1] if position else 0.0
+                if position == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[position] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def sample(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        return {"count": count, "sum": total, "buckets": counts}
+
+
+class Metric:
+    """A named metric family with one value per combination of label values."""
+
+    def __init__(self, kind, name, help, labelnames, factory):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the value for these label values; keep it around in hot loops."""
+        key = tuple(str(value) for value in values)
+        value = self.values.get(key)
+        if value is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                value = self.values.setdefault(key, self.factory())
+        return value
+
+    # Shortcuts for metrics without labels.
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class _NullMetric:
+    """Stands in for every metric when instrumentation is disabled."""
+
+    def labels(self, *values):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, function):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Registry:
+    """All metrics of the process, rendered together for the endpoint and the diagnostics panel."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, kind, name, help, labelnames, factory):
+        if not self.enabled:
+            return NULL_METRIC
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(kind, name, help, labelnames, factory)
+            elif metric.kind != kind or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register("counter", name, help, labelnames, CounterValue)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register("gauge", name, help, labelnames, GaugeValue)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        buckets = tuple(sorted(buckets))
+        return self._register("histogram", name, help, labelnames, lambda: HistogramValue(buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in metric.items():
+                sample = value.sample()
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {sample['value']}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float("inf"),), sample["buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{metric.name}_bucket{_format_labels(metric.labelnames, key, [('le', le)])} {cumulative}"
+                    )
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {sample['sum']}")
+                lines.append(f"{metric.name}_count{labels} {sample['count']}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Return one row per metric value, with count, mean and p50/p95 for histograms."""
+        rows = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            for key, value in metric.items():
+                row = {
+                    "Metric": metric.name,
+                    "Labels": ", ".join(f"{name}={label}" for name, label in zip(metric.labelnames, key)),
+                }
+                sample = value.sample()
+                if metric.kind == "histogram":
+                    count = sample["count"]
+                    row.update({
+                        "Value": count,
+                        "Mean (ms)": sample["sum"] / count * 1000 if count else None,
+                        "p50 (ms)": _milliseconds(value.quantile(0.5)),
+                        "p95 (ms)": _milliseconds(value.quantile(0.95)),
+                    })
+                else:
+                    row["Value"] = sample["value"]
+                rows.append(row)
+        return rows
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+REGISTRY = Registry(ENABLED)
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.counter(name, help, labelnames)
+
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY.gauge(name, help, labelnames)
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.histogram(name, help, labelnames, buckets)
+
+
+THREAD_ERRORS = counter("netmon_thread_errors_total", "Exceptions that ended a background thread or job", ["thread"])
+CHART_SECONDS = histogram("netmon_chart_render_seconds", "Time to build and send one chart", ["chart"])
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port=None, host="127.0.0.1"):
+    """Start the /metrics endpoint on a daemon thread once per process and return its server.
+
+    port defaults to NETMON_METRICS_PORT; returns None when neither is set or
+    metrics are disabled.
+    """
+    global _server
+    if port is None:
+        port = os.environ.get("NETMON_METRICS_PORT")
+    if not ENABLED or port in (None, ""):
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = http.server.ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -0,0 +1,212 @@
+import socket
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+
+from pcap_io import LINKTYPE_ETHERNET
+
+LINKTYPE_NULL = 0
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+LINK_LAYER_NAMES = {
+    LINKTYPE_NULL: "Loopback",
+    LINKTYPE_ETHERNET: "Ethernet",
+    LINKTYPE_RAW: "Raw IP",
+    LINKTYPE_LINUX_SLL: "cooked linux",
+    LINKTYPE_IPV4: "Raw IP",
+    LINKTYPE_IPV6: "Raw IP",
+    LINKTYPE_LINUX_SLL2: "cooked linux v2",
+}
+ETHERTYPE_NAMES = {ETHERTYPE_IPV4: "IPv4", ETHERTYPE_ARP: "ARP", ETHERTYPE_IPV6: "IPv6"}
+IP_PROTOCOL_NAMES = {1: "ICMP", 2: "IGMP", 6: "TCP", 17: "UDP", 47: "GRE", 58: "ICMPv6", 132: "SCTP"}
+PORT_PROTOCOLS = (6, 17, 132)
+APPLICATION_PORTS = {
+    20: "FTP", 21: "FTP", 22: "SSH", 23: "TELNET", 25: "SMTP", 53: "DNS", 67: "DHCP",
+    68: "DHCP", 80: "HTTP", 110: "POP3", 123: "NTP", 143: "IMAP", 161: "SNMP",
+    443: "TLS", 445: "SMB", 993: "IMAPS", 3389: "RDP", 5353: "MDNS", 8080: "HTTP",
+}
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+# Addresses are kept as 16 raw bytes; IPv4 uses the IPv4-mapped IPv6 form.
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+NO_ADDRESS = b"\x00" * 16
+
+PacketHeaders = namedtuple("PacketHeaders", ["ethertype", "proto", "src", "dst", "sport", "dport"])
+EMPTY_HEADERS = PacketHeaders(0, 0, NO_ADDRESS, NO_ADDRESS, 0, 0)
+
+_ETHERTYPE = struct.Struct("!H")
+_PORTS = struct.Struct("!HH")
+
+
+def _network_layer(data, linktype):
+    """Return (ethertype, offset of the network header) for a link-layer frame."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return 0, len(data)
+        ethertype, offset = _ETHERTYPE.unpack_from(data, 12)[0], 14
+        while ethertype in VLAN_ETHERTYPES and len(data) >= offset + 4:
+            ethertype = _ETHERTYPE.unpack_from(data, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == LINKTYPE_LINUX_SLL and len(data) >= 16:
+        return _ETHERTYPE.unpack_from(data, 14)[0], 16
+    if linktype == LINKTYPE_LINUX_SLL2 and len(data) >= 20:
+        return _ETHERTYPE.unpack_from(data, 0)[0], 20
+    if linktype == LINKTYPE_NULL and len(data) >= 4:
+        family = data[0] or data[3]
+        return (ETHERTYPE_IPV4 if family == socket.AF_INET else ETHERTYPE_IPV6), 4
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6) and data:
+        return (ETHERTYPE_IPV6 if data[0] >> 4 == 6 else ETHERTYPE_IPV4), 0
+    return 0, len(data)
+
+
+def parse_headers(data, linktype=LINKTYPE_ETHERNET):
+    """Pre-parse ethertype, IP protocol, addresses and ports without scapy.
+
+    Returns a PacketHeaders tuple; fields that are absent or truncated are zero.
+    """
+    ethertype, offset = _network_layer(data, linktype)
+    proto, src, dst, payload = 0, NO_ADDRESS, NO_ADDRESS, None
+
+    if ethertype == ETHERTYPE_IPV4 and len(data) >= offset + 20:
+        header_length = (data[offset] & 0x0F) * 4
+        proto = data[offset + 9]
+        src = IPV4_MAPPED_PREFIX + bytes(data[offset + 12:offset + 16])
+        dst = IPV4_MAPPED_PREFIX + bytes(data[offset + 16:offset + 20])
+        fragment_offset = _ETHERTYPE.unpack_from(data, offset + 6)[0] & 0x1FFF
+        if fragment_offset == 0:
+            payload = offset + header_length
+    elif ethertype == ETHERTYPE_IPV6 and len(data) >= offset + 40:
+        proto = data[offset + 6]
+        src = bytes(data[offset + 8:offset + 24])
+        dst = bytes(data[offset + 24:offset + 40])
+        payload = offset + 40
+        while proto in IPV6_EXTENSION_HEADERS and len(data) >= payload + 8:
+            proto, payload = data[payload], payload + (data[payload + 1] + 1) * 8
+        if proto == 44 and len(data) >= payload + 8:
+            proto, payload = data[payload], payload + 8
+
+    sport = dport = 0
+    if payload is not None and proto in PORT_PROTOCOLS and len(data) >= payload + 4:
+        sport, dport = _PORTS.unpack_from(data, payload)
+    return PacketHeaders(ethertype, proto, src, dst, sport, dport)
+
+
+def format_address(packed):
+    """Return the text form of a 16-byte packed address, or "" if unset."""
+    if packed == NO_ADDRESS or not packed:
+        return ""
+    if packed.startswith(IPV4_MAPPED_PREFIX):
+        return socket.inet_ntop(socket.AF_INET, packed[12:])
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+
+def format_endpoint(address, port):
+    """Return "address:port", with IPv6 addresses in brackets: "[fd00::1]:53"."""
+    return f"[{address}]:{port}" if ":" in address else f"{address}:{port}"
+
+
+def pack_address(address):
+    """Return the 16-byte packed form of an IPv4 or IPv6 address string."""
+    try:
+        return IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, address)
+    except OSError:
+        return socket.inet_pton(socket.AF_INET6, address)
+
+
+def network_protocol_name(headers):
+    """Return the network-layer name of a packet, e.g. "IPv4" or "ARP"."""
+    if not headers.ethertype:
+        return ""
+    return ETHERTYPE_NAMES.get(headers.ethertype, f"0x{headers.ethertype:04x}")
+
+
+def transport_protocol_name(headers):
+    """Return the transport protocol name of a packet, e.g. "TCP"."""
+    if not headers.proto:
+        return ""
+    return IP_PROTOCOL_NAMES.get(headers.proto, f"proto {headers.proto}")
+
+
+def application_protocol_name(headers):
+    """Guess the application protocol from well-known ports, e.g. "DNS"."""
+    if not headers.proto:
+        return ""
+    return APPLICATION_PORTS.get(headers.dport) or APPLICATION_PORTS.get(headers.sport, "")
+
+
+def protocol_tags(headers, linktype=LINKTYPE_ETHERNET):
+    """Return the upper-case protocol names a packet matches, e.g. {"IP", "TCP", "TLS"}."""
+    tags = {LINK_LAYER_NAMES.get(linktype, "").upper()}
+    network = network_protocol_name(headers).upper()
+    if network:
+        tags.add(network)
+        if network in ("IPV4", "IPV6"):
+            tags.add("IP")
+    tags.add(transport_protocol_name(headers).upper())
+    tags.add(application_protocol_name(headers))
+    tags.discard("")
+    return tags
+
+
+def summarize(headers, linktype=LINKTYPE_ETHERNET):
+    """Build a one-line scapy-like summary from pre-parsed header fields."""
+    layers = [LINK_LAYER_NAMES.get(linktype, f"linktype {linktype}")]
+    network = network_protocol_name(headers)
+    if network:
+        layers.append(network)
+    transport = transport_protocol_name(headers)
+    if transport:
+        layers.append(transport)
+    summary = " / ".join(layers)
+
+    src, dst = format_address(headers.src), format_address(headers.dst)
+    if src or dst:
+        if headers.sport or headers.dport:
+            summary += f" {format_endpoint(src, headers.sport)} > {format_endpoint(dst, headers.dport)}"
+        else:
+            summary += f" {src} > {dst}"
+    return summary
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache."""
+
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader(key) on a miss."""
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+        value = loader(key)
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
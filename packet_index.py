@@ -0,0 +1,284 @@
+import ipaddress
+import itertools
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+from packet_decode import IPV4_MAPPED_PREFIX, NO_ADDRESS, pack_address, protocol_tags
+
+INDEXED_FIELDS = ("protocol", "interface", "src", "dst", "sport", "dport", "time")
+ADDRESS_FIELDS = ("src", "dst")
+PORT_FIELDS = ("sport", "dport")
+
+
+class Field:
+    """Match packets whose field equals value.
+
+    Fields are those in INDEXED_FIELDS plus "address" (src or dst) and
+    "port" (sport or dport). Protocol names are matched case-insensitively.
+    """
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Range:
+    """Match packets whose port or time field lies in [low, high]."""
+
+    def __init__(self, name, low=None, high=None):
+        self.name = name
+        self.low = low
+        self.high = high
+
+
+class Cidr:
+    """Match packets whose src, dst or address lies in a network, e.g. "10.0.0.0/8"."""
+
+    def __init__(self, name, network):
+        self.name = name
+        self.network = ipaddress.ip_network(network, strict=False)
+
+
+class And:
+    def __init__(self, *terms):
+        self.terms = terms
+
+
+class Or:
+    def __init__(self, *terms):
+        self.terms = terms
+
+
+class Not:
+    def __init__(self, term):
+        self.term = term
+
+
+def _expand(term):
+    """Rewrite the "address" and "port" shorthands into Or terms over real fields."""
+    name = getattr(term, "name", None)
+    if name == "address":
+        fields = ADDRESS_FIELDS
+    elif name == "port":
+        fields = PORT_FIELDS
+    else:
+        return term
+    copies = []
+    for field in fields:
+        copy = object.__new__(type(term))
+        copy.__dict__.update(term.__dict__, name=field)
+        copies.append(copy)
+    return Or(*copies)
+
+
+def _intersect(smallest, others):
+    """Intersect sorted id sequences by probing the smallest one into the rest."""
+    result = []
+    for packet_id in smallest:
+        for ids in others:
+            position = bisect_left(ids, packet_id)
+            if position == len(ids) or ids[position] != packet_id:
+                break
+        else:
+            result.append(packet_id)
+    return result
+
+
+def _contains(ids, packet_id):
+    position = bisect_left(ids, packet_id)
+    return position < len(ids) and ids[position] == packet_id
+
+
+class PacketIndex:
+    """Posting-list indexes over a PacketStore, maintained as packets arrive.
+
+    Each indexed field maps a key to a sorted array of packet ids. Ids the
+    store has evicted are pruned lazily when a posting list is read, and
+    in bulk every prune_interval evictions, except those retain() keeps.
+    """
+
+    def __init__(self, store, time_bucket=1.0, prune_interval=65536):
+        self.store = store
+        self.time_bucket = time_bucket
+        self.prune_interval = prune_interval
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.postings = {field: {} for field in INDEXED_FIELDS}
+            self.pruned_id = self.store.first_id
+            self.retained = None
+
+    def retain(self, timestamps):
+        """Keep ids below len(timestamps) after the store evicts them.
+
+        For packets of a loaded file, which can still be read from it;
+        timestamps[packet_id] is their time. The sequence may keep growing.
+        """
+        with self.lock:
+            self.retained = timestamps
+
+    def _retained_count(self):
+        return len(self.retained) if self.retained is not None else 0
+
+    def _live_ids(self):
+        """Return every id a query can match, in order."""
+        retained = min(self._retained_count(), self.store.first_id)
+        return itertools.chain(range(retained), range(self.store.first_id, self.store.next_id))
+
+    def add(self, packet_id, interface, linktype, timestamp, headers):
+        """Index one stored packet."""
+        keys = [("interface", interface), ("time", int(timestamp // self.time_bucket))]
+        keys.extend(("protocol", tag) for tag in protocol_tags(headers, linktype))
+        if headers.src != NO_ADDRESS:
+            keys.append(("src", headers.src))
+            keys.append(("dst", headers.dst))
+        if headers.sport or headers.dport:
+            keys.append(("sport", headers.sport))
+            keys.append(("dport", headers.dport))
+
+        with self.lock:
+            for field, key in keys:
+                ids = self.postings[field].get(key)
+                if ids is None:
+                    self.postings[field][key] = array("Q", [packet_id])
+                elif ids[-1] < packet_id:
+                    ids.append(packet_id)
+                else:
+                    insort(ids, packet_id)
+            if self.store.first_id - self.pruned_id >= self.prune_interval:
+                self._prune_all()
+
+    def _prune(self, ids):
+        first_id = self.store.first_id
+        if ids and ids[0] < first_id:
+            retained = self._retained_count()
+            start = bisect_left(ids, retained) if retained else 0
+            end = bisect_left(ids, first_id, start)
+            if start < end:
+                del ids[start:end]
+        return ids
+
+    def _prune_all(self):
+        for postings in self.postings.values():
+            for key in list(postings):
+                if not self._prune(postings[key]):
+                    del postings[key]
+        self.pruned_id = self.store.first_id
+
+    def _posting(self, field, key):
+        if field not in self.postings:
+            raise ValueError(f"Unknown query field: {field}")
+        ids = self.postings[field].get(key)
+        return self._prune(ids) if ids is not None else array("Q")
+
+    def _union(self, lists):
+        lists = [ids for ids in lists if ids]
+        if len(lists) == 1:
+            return lists[0]
+        merged = set()
+        for ids in lists:
+            merged.update(ids)
+        return sorted(merged)
+
+    def _evaluate(self, term):
+        term = _expand(term)
+        if isinstance(term, Field):
+            return self._posting(term.name, self._key(term.name, term.value))
+        if isinstance(term, Range):
+            return self._evaluate_range(term)
+        if isinstance(term, Cidr):
+            return self._union(
+                ids for key, ids in list(self.postings[term.name].items())
+                if self._in_network(key, term.network) and self._prune(ids)
+            )
+        if isinstance(term, Or):
+            return self._union(self._evaluate(child) for child in term.terms)
+        if isinstance(term, And):
+            positive = [child for child in term.terms if not isinstance(child, Not)]
+            negative = [self._evaluate(child.term) for child in term.terms if isinstance(child, Not)]
+            if positive:
+                lists = sorted((self._evaluate(child) for child in positive), key=len)
+                candidates = _intersect(lists[0], lists[1:])
+            else:
+                candidates = self._live_ids()
+            return [
+                packet_id for packet_id in candidates
+                if not any(_contains(ids, packet_id) for ids in negative)
+            ]
+        if isinstance(term, Not):
+            excluded = self._evaluate(term.term)
+            return [
+                packet_id for packet_id in self._live_ids()
+                if not _contains(excluded, packet_id)
+            ]
+        raise ValueError(f"Unsupported query term: {term!r}")
+
+    def _key(self, field, value):
+        if field in ADDRESS_FIELDS:
+            return pack_address(value)
+        if field == "protocol":
+            return value.upper()
+        if field == "time":
+            return int(value // self.time_bucket)
+        return value
+
+    def _in_network(self, packed, network):
+        if network.version == 4:
+            if not packed.startswith(IPV4_MAPPED_PREFIX):
+                return False
+            address = int.from_bytes(packed[12:], "big")
+        else:
+            address = int.from_bytes(packed, "big")
+        return address & int(network.netmask) == int(network.network_address)
+
+    def _evaluate_range(self, term):
+        low = float("-inf") if term.low is None else term.low
+        high = float("inf") if term.high is None else term.high
+        if term.name in PORT_FIELDS:
+            return self._union(
+                ids for key, ids in list(self.postings[term.name].items())
+                if low <= key <= high and self._prune(ids)
+            )
+        if term.name != "time":
+            raise ValueError(f"Range queries are not supported on {term.name}")
+
+        buckets = self.postings["time"]
+        low_bucket = None if term.low is None else int(low // self.time_bucket)
+        high_bucket = None if term.high is None else int(high // self.time_bucket)
+        matched = []
+        for bucket, ids in list(buckets.items()):
+            if (low_bucket is not None and bucket < low_bucket) or (
+                high_bucket is not None and bucket > high_bucket
+            ):
+                continue
+            ids = self._prune(ids)
+            if bucket in (low_bucket, high_bucket):
+                # Boundary buckets hold packets on both sides of the limit.
+                ids = [packet_id for packet_id in ids if low <= self._timestamp(packet_id) <= high]
+            matched.append(ids)
+        return self._union(matched)
+
+    def _timestamp(self, packet_id):
+        if packet_id < min(self._retained_count(), self.store.first_id):
+            return self.retained[packet_id]
+        try:
+            return self.store.get(packet_id, data=False).timestamp
+        except IndexError:
+            return float("nan")
+
+    def query(self, term, offset=0, limit=None, reverse=False):
+        """Return (total matches, page of packet ids) for a query term."""
+        with self.lock:
+            ids = self._evaluate(term)
+            total = len(ids)
+            if reverse:
+                end = total - offset
+                start = 0 if limit is None else max(end - limit, 0)
+                page = list(ids[start:max(end, 0)])[::-1]
+            else:
+                end = total if limit is None else offset + limit
+                page = list(ids[offset:end])
+        return total, page
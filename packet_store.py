@@ -0,0 +1,328 @@
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from operator import attrgetter
+
+from packet_decode import EMPTY_HEADERS, PacketHeaders
+from pcap_io import LINKTYPE_ETHERNET, open_pcap_buffer
+
+PacketRecord = namedtuple(
+    "PacketRecord", ["id", "interface", "linktype", "timestamp", "wirelen", "headers", "data"]
+)
+
+# Bytes of column storage used per packet on top of the frame itself:
+# offset (8) + wire length (4) + timestamp (8) + interface id (2)
+# + pre-parsed headers: ethertype (2), proto (1), ports (4), addresses (32).
+PER_PACKET_OVERHEAD = 61
+
+
+class _Segment:
+    """A run of consecutive packets stored column-wise in compact arrays."""
+
+    __slots__ = (
+        "first_id", "data", "offsets", "wirelens", "timestamps", "iface_ids",
+        "ethertypes", "protos", "sports", "dports", "addresses", "path",
+    )
+
+    def __init__(self, first_id):
+        self.first_id = first_id
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.wirelens = array("I")
+        self.timestamps = array("d")
+        self.iface_ids = array("H")
+        self.ethertypes = array("H")
+        self.protos = array("B")
+        self.sports = array("H")
+        self.dports = array("H")
+        self.addresses = bytearray()
+        self.path = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, data, timestamp, wirelen, iface_id, headers):
+        self.data += data
+        self.offsets.append(len(self.data))
+        self.wirelens.append(wirelen)
+        self.iface_ids.append(iface_id)
+        self.ethertypes.append(headers.ethertype)
+        self.protos.append(headers.proto)
+        self.sports.append(headers.sport)
+        self.dports.append(headers.dport)
+        self.addresses += headers.src
+        self.addresses += headers.dst
+        # Timestamps go last: len() only covers fully written rows.
+        self.timestamps.append(timestamp)
+
+    def headers(self, index):
+        address = index * 32
+        return PacketHeaders(
+            self.ethertypes[index],
+            self.protos[index],
+            bytes(self.addresses[address:address + 16]),
+            bytes(self.addresses[address + 16:address + 32]),
+            self.sports[index],
+            self.dports[index],
+        )
+
+    def pin(self):
+        """Return the frame bytes' current home: the in-memory buffer or an open spill file.
+
+        Take it under the store lock; it stays readable by frame() after the
+        segment is spilled or its file deleted. Close it if it is a file.
+        """
+        if self.path is None:
+            return self.data
+        return open(self.path, "rb")
+
+    def frame(self, index, source):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if isinstance(source, bytearray):
+            return bytes(source[start:end])
+        source.seek(start)
+        return source.read(end - start)
+
+    def frame_bytes(self):
+        return self.offsets[len(self)]
+
+    def spill(self, path):
+        """Move the frame bytes to disk, keeping only the index columns in memory."""
+        with open(path, "wb") as f:
+            f.write(self.data)
+        self.data = None
+        self.path = path
+
+    def resident_size(self):
+        size = sum(
+            sys.getsizeof(column)
+            for column in (
+                self.offsets, self.wirelens, self.timestamps, self.iface_ids,
+                self.ethertypes, self.protos, self.sports, self.dports, self.addresses,
+            )
+        )
+        if self.data is not None:
+            size += sys.getsizeof(self.data)
+        return size
+
+
+class PacketStore:
+    """Bounded ring of raw packets kept in array-backed segments.
+
+    Packets get monotonically increasing ids. When either budget is
+    exceeded the oldest segment is evicted: dropped outright
+    (``eviction="oldest"``) or written to ``spill_dir`` and read back
+    from disk on demand (``eviction="spill"``). Spilled segments count
+    against ``max_spill_bytes`` and are deleted oldest-first beyond it.
+    """
+
+    def __init__(self, max_packets=500000, max_bytes=256 * 1024 * 1024,
+                 segment_packets=4096, eviction="oldest", spill_dir=None,
+                 max_spill_bytes=4 * 1024 * 1024 * 1024):
+        if eviction not in ("oldest", "spill"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.segment_packets = segment_packets
+        self.eviction = eviction
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.lock = threading.Lock()
+        self.interfaces = []
+        self.interface_ids = {}
+        self.clear()
+
+    def clear(self, start_id=0):
+        """Drop every packet (including spilled ones) and restart ids at start_id."""
+        with self.lock:
+            for segment in getattr(self, "spilled", []):
+                self._remove_spill_file(segment)
+            self.segments = []
+            self.spilled = []
+            self.first_id = start_id
+            self.next_id = start_id
+            self.memory_bytes = 0
+            self.spill_bytes = 0
+            self.evicted_packets = 0
+
+    def __len__(self):
+        return self.next_id - self.first_id
+
+    def interface_id(self, interface, linktype=LINKTYPE_ETHERNET):
+        """Return the compact id for an (interface, linktype) pair, registering it if new."""
+        key = (interface, linktype)
+        iface_id = self.interface_ids.get(key)
+        if iface_id is None:
+            with self.lock:
+                iface_id = self.interface_ids.get(key)
+                if iface_id is None:
+                    iface_id = len(self.interfaces)
+                    self.interfaces.append(key)
+                    self.interface_ids[key] = iface_id
+        return iface_id
+
+    def append(self, interface, data, timestamp, wirelen=None, linktype=LINKTYPE_ETHERNET,
+               headers=EMPTY_HEADERS):
+        """Store one raw frame with its pre-parsed headers and return its packet id."""
+        iface_id = self.interface_id(interface, linktype)
+        with self.lock:
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or len(segment) >= self.segment_packets:
+                segment = _Segment(self.next_id)
+                self.segments.append(segment)
+            segment.append(data, timestamp, wirelen or len(data), iface_id, headers)
+            packet_id = self.next_id
+            self.next_id += 1
+            self.memory_bytes += len(data) + PER_PACKET_OVERHEAD
+            self._enforce_budget()
+            return packet_id
+
+    def _enforce_budget(self):
+        while self.segments and (
+            self.next_id - self.segments[0].first_id > self.max_packets
+            or self.memory_bytes > self.max_bytes
+        ):
+            segment = self.segments.pop(0)
+            self.memory_bytes -= segment.frame_bytes() + PER_PACKET_OVERHEAD * len(segment)
+            if self.eviction == "spill":
+                self._spill(segment)
+            else:
+                self.evicted_packets += len(segment)
+                self.first_id = segment.first_id + len(segment)
+
+    def _spill(self, segment):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="packet-store-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        segment.spill(os.path.join(self.spill_dir, f"segment-{segment.first_id}.bin"))
+        self.spilled.append(segment)
+        self.spill_bytes += segment.frame_bytes()
+        while self.spilled and self.spill_bytes > self.max_spill_bytes:
+            oldest = self.spilled.pop(0)
+            self.spill_bytes -= oldest.frame_bytes()
+            self._remove_spill_file(oldest)
+            self.evicted_packets += len(oldest)
+            self.first_id = oldest.first_id + len(oldest)
+
+    def _remove_spill_file(self, segment):
+        try:
+            os.remove(segment.path)
+        except OSError:
+            pass
+
+    def _locate(self, packet_id):
+        if not self.first_id <= packet_id < self.next_id:
+            raise IndexError(f"Packet {packet_id} is not in the store.")
+        if self.segments and packet_id >= self.segments[0].first_id:
+            segments = self.segments
+        else:
+            segments = self.spilled
+        segment = segments[bisect_right(segments, packet_id, key=attrgetter("first_id")) - 1]
+        return segment, packet_id - segment.first_id
+
+    def _record(self, segment, index, source=None):
+        # Index columns are never freed, only the frame bytes move: pass a pinned source for them.
+        interface, linktype = self.interfaces[segment.iface_ids[index]]
+        return PacketRecord(
+            segment.first_id + index,
+            interface,
+            linktype,
+            segment.timestamps[index],
+            segment.wirelens[index],
+            segment.headers(index),
+            segment.frame(index, source) if source is not None else None,
+        )
+
+    def _pin(self, segment, data):
+        try:
+            return segment.pin() if data else None
+        except OSError:
+            raise IndexError(f"Spilled packets {segment.first_id}+ are no longer on disk.")
+
+    def get(self, packet_id, data=True):
+        """Return the PacketRecord for a packet id.
+
+        With data=False the frame bytes are not copied (or read back from disk).
+        """
+        with self.lock:
+            segment, index = self._locate(packet_id)
+            source = self._pin(segment, data)
+        try:
+            return self._record(segment, index, source)
+        finally:
+            if source is not None and not isinstance(source, bytearray):
+                source.close()
+
+    def records(self, start_id=None, stop_id=None, data=True):
+        """Iterate PacketRecords in id order, oldest first."""
+        with self.lock:
+            segments = self.spilled + self.segments
+            start_id = self.first_id if start_id is None else max(start_id, self.first_id)
+            stop_id = self.next_id if stop_id is None else min(stop_id, self.next_id)
+        for segment in segments:
+            first = max(start_id, segment.first_id) - segment.first_id
+            last = min(stop_id, segment.first_id + len(segment)) - segment.first_id
+            if first >= last:
+                continue
+            with self.lock:
+                try:
+                    source = self._pin(segment, data)
+                except IndexError:
+                    # Deleted to stay under max_spill_bytes since the snapshot.
+                    continue
+            try:
+                for index in range(first, last):
+                    yield self._record(segment, index, source)
+            finally:
+                if source is not None and not isinstance(source, bytearray):
+                    source.close()
+
+    def frame_buffers(self):
+        """Yield (first id, buffer, offsets) per segment, oldest first, for bulk scans of frame bytes.
+
+        Packet first_id + i is buffer[offsets[i]:offsets[i + 1]]. Spilled
+        segments are memory-mapped from disk and the segment still being
+        filled is copied, so captures can keep appending meanwhile. Each
+        buffer is only valid until the next one is requested.
+        """
+        with self.lock:
+            snapshot = []
+            for segment in self.spilled + self.segments:
+                count = len(segment)
+                data = segment.data if segment.path is None else None
+                if segment is (self.segments[-1] if self.segments else None):
+                    data = bytes(data)
+                snapshot.append((segment.first_id, data, segment.path, segment.offsets[:count + 1]))
+        for first_id, data, path, offsets in snapshot:
+            if data is not None:
+                yield first_id, data, offsets
+                continue
+            try:
+                with open_pcap_buffer(path) as buffer:
+                    yield first_id, buffer, offsets
+            except OSError:
+                # Deleted to stay under max_spill_bytes since the snapshot.
+                continue
+
+    def resident_size(self):
+        """Return the number of bytes the store currently holds in memory."""
+        with self.lock:
+            segments = self.spilled + self.segments
+        return sys.getsizeof(self) + sum(segment.resident_size() for segment in segments)
+
+    def stats(self):
+        """Return packet counts and memory/disk usage of the store."""
+        return {
+            "packets": len(self),
+            "first_id": self.first_id,
+            "next_id": self.next_id,
+            "evicted_packets": self.evicted_packets,
+            "resident_bytes": self.resident_size(),
+            "spilled_bytes": self.spill_bytes,
+            "max_packets": self.max_packets,
+            "max_bytes": self.max_bytes,
+        }
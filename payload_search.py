@@ -0,0 +1,289 @@
+"""Multi-pattern payload search over captured frames and PCAP files.
+
+    python payload_search.py capture.pcap -p example.com -p hex:16030100 --ignore-case
+
+Each buffer (a memory-mapped PCAP file, or a segment of the packet store)
+is first scanned with one compiled regular expression of all patterns,
+which runs in C over the whole buffer without touching Python per packet.
+Only the records it hits are then matched exactly, with an Aho-Corasick
+automaton (or bytes.find() for a handful of patterns), which reports every
+occurrence of every pattern, overlapping ones included. Large files are
+split into byte ranges searched by a pool of processes shared by all
+searches; matches stream back in packet order.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+from bisect import bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pcap_index import PcapIndex
+from pcap_io import open_pcap_buffer
+
+# packet_id is the PacketWorker id (the record number for PCAP files);
+# offset is where the pattern starts in the frame, link-layer header included.
+Match = namedtuple("Match", ["packet_id", "offset", "pattern"])
+
+CHUNK_BYTES = 32 * 1024 * 1024
+# Up to this many patterns, a frame is verified with one bytes.find() loop per
+# pattern, which runs in C; beyond it the single-pass automaton wins.
+FIND_PATTERNS = 8
+
+
+def parse_pattern(text):
+    """Return the bytes of a pattern given as text, or as hex digits after "hex:"."""
+    if text.lower().startswith("hex:"):
+        return bytes.fromhex(text[4:])
+    return text.encode()
+
+
+class AhoCorasick:
+    """Automaton finding all occurrences of many byte patterns in one pass."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for number, pattern in enumerate(self.patterns):
+            state = 0
+            for byte in pattern:
+                next_state = self.goto[state].get(byte)
+                if next_state is None:
+                    next_state = self.goto[state][byte] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (number,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and byte not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(byte, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def finditer(self, data):
+        """Yield (start offset, pattern number) for every occurrence, by end offset."""
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        state = 0
+        for position, byte in enumerate(data):
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            for number in output[state]:
+                yield position - len(patterns[number]) + 1, number
+
+
+class PayloadMatcher:
+    """Regular-expression prefilter in front of an Aho-Corasick automaton."""
+
+    def __init__(self, patterns, ignore_case=False):
+        patterns = [pattern for pattern in dict.fromkeys(patterns) if pattern]
+        if not patterns:
+            raise ValueError("No search patterns given.")
+        self.patterns = patterns
+        self.ignore_case = ignore_case
+        # Longest first, so the prefilter prefers the longer of two overlapping patterns.
+        alternatives = b"|".join(re.escape(pattern) for pattern in sorted(patterns, key=len, reverse=True))
+        self.prefilter = re.compile(alternatives, re.IGNORECASE if ignore_case else 0)
+        self.automaton = AhoCorasick(pattern.lower() if ignore_case else pattern for pattern in patterns)
+
+    def search(self, data):
+        """Return [(offset, pattern)] of every occurrence in one frame, by offset."""
+        if not self.prefilter.search(data):
+            return []
+        data = bytes(data).lower() if self.ignore_case else bytes(data)
+        if len(self.patterns) > FIND_PATTERNS:
+            found = self.automaton.finditer(data)
+        else:
+            found = self._find_each(data)
+        return sorted((offset, self.patterns[number]) for offset, number in found)
+
+    def _find_each(self, data):
+        for number, pattern in enumerate(self.automaton.patterns):
+            offset = data.find(pattern)
+            while offset != -1:
+                yield offset, number
+                offset = data.find(pattern, offset + 1)
+
+    def scan(self, buffer, starts, lengths, first, stop, first_id=0):
+        """Return the Matches in records first..stop-1 of buffer.
+
+        Record i is buffer[starts[i]:starts[i] + lengths[i]], with starts
+        ascending. The prefilter runs once over the whole span; any record a
+        prefilter hit starts in or reaches into is then searched on its own,
+        so hits straddling records are neither reported nor able to hide one.
+        """
+        if first >= stop:
+            return []
+        candidates = set()
+        end = starts[stop - 1] + lengths[stop - 1]
+        for found in self.prefilter.finditer(buffer, starts[first], end):
+            begin = bisect_right(starts, found.start(), first, stop) - 1
+            last = bisect_right(starts, found.end() - 1, first, stop) - 1
+            candidates.update(range(max(begin, first), last + 1))
+        matches = []
+        for record in sorted(candidates):
+            start = starts[record]
+            for offset, pattern in self.search(buffer[start:start + lengths[record]]):
+                matches.append(Match(first_id + record, offset, pattern))
+        return matches
+
+
+def search_store(store, matcher):
+    """Yield the Matches in a PacketStore's frames, oldest packet first."""
+    for first_id, buffer, offsets in store.frame_buffers():
+        lengths = [end - start for start, end in zip(offsets, offsets[1:])]
+        yield from matcher.scan(buffer, offsets, lengths, 0, len(lengths), first_id)
+
+
+def _search_pcap_range(pcap_path, first, stop, patterns, ignore_case):
+    index = PcapIndex.open(pcap_path)
+    try:
+        with open_pcap_buffer(pcap_path) as buffer:
+            return PayloadMatcher(patterns, ignore_case).scan(
+                buffer, index.data_offsets, index.caplens, first, stop
+            )
+    finally:
+        index.close()
+
+
+def _chunks(index, first, stop, chunk_bytes):
+    """Split records first..stop-1 into (first, stop) ranges of about chunk_bytes of file each."""
+    offsets = index.data_offsets
+    ranges = []
+    while first < stop:
+        end = bisect_right(offsets, offsets[first] + chunk_bytes, first + 1, stop)
+        ranges.append((first, end))
+        first = end
+    return ranges
+
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def shared_executor():
+    """Return the process pool for searching files, started on first use with one process per core."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            # Spawn rather than fork: callers run capture and UI threads whose locks
+            # a forked child could inherit mid-use.
+            _shared_executor = ProcessPoolExecutor(
+                os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _shared_executor
+
+
+def _discard_executor(executor):
+    """Drop a pool whose processes died, so the next search starts a new one."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is executor:
+            _shared_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def search_pcap(pcap_path, patterns, ignore_case=False, first=0, stop=None, workers=None,
+                chunk_bytes=CHUNK_BYTES, index=None):
+    """Yield the Matches in records first..stop-1 of a PCAP/PCAPNG file, in record order.
+
+    The file's sidecar index (see pcap_index) is built and saved if needed.
+    Files spanning more than one chunk are searched in the shared process
+    pool (see shared_executor), each process mapping the file itself, with
+    up to workers chunks (default: one per core) in flight at a time.
+    """
+    own_index = index is None
+    if own_index:
+        index = PcapIndex.open_or_build(pcap_path)
+    try:
+        stop = len(index) if stop is None else min(stop, len(index))
+        ranges = _chunks(index, first, stop, chunk_bytes)
+        workers = min(workers or os.cpu_count() or 1, len(ranges))
+        if workers > 1:
+            # Worker processes re-open the saved index; search here if it could not be saved.
+            saved = PcapIndex.open(pcap_path)
+            if saved is None:
+                workers = 1
+            else:
+                saved.close()
+        matcher = PayloadMatcher(patterns, ignore_case)
+        if workers <= 1:
+            with open_pcap_buffer(pcap_path) as buffer:
+                for range_first, range_stop in ranges:
+                    yield from matcher.scan(buffer, index.data_offsets, index.caplens, range_first, range_stop)
+            return
+        executor = shared_executor()
+        pending = deque()
+        ranges = iter(ranges)
+        try:
+            while True:
+                for range_first, range_stop in ranges:
+                    pending.append(executor.submit(
+                        _search_pcap_range, os.fspath(pcap_path), range_first, range_stop,
+                        matcher.patterns, ignore_case,
+                    ))
+                    if len(pending) >= workers:
+                        break
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            raise
+        finally:
+            # A caller that stops early leaves the pool to other searches.
+            for future in pending:
+                future.cancel()
+    finally:
+        if own_index:
+            index.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search PCAP payloads for byte patterns")
+    parser.add_argument("pcap", nargs="+", help="PCAP or PCAPNG files")
+    parser.add_argument("-p", "--pattern", action="append", required=True,
+                        help="text, or hex:<digits> for bytes (repeatable)")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="ASCII case-insensitive")
+    parser.add_argument("--workers", type=int, default=None, help="processes per file (default: cores)")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many matches")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per match")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Report each pattern as it was given, so hex patterns print as hex.
+    patterns = {parse_pattern(pattern): pattern for pattern in args.pattern}
+    found = 0
+    for path in args.pcap:
+        for match in search_pcap(path, list(patterns), args.ignore_case, workers=args.workers):
+            pattern = patterns[match.pattern]
+            if args.json:
+                print(json.dumps({"file": path, "packet": match.packet_id, "offset": match.offset,
+                                  "pattern": pattern}))
+            else:
+                print(f"{path}\t{match.packet_id}\t{match.offset}\t{pattern}")
+            found += 1
+            if args.limit is not None and found >= args.limit:
+                return 0
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
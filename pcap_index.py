@@ -0,0 +1,176 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from pcap_io import open_pcap_buffer, scan_pcap
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"PCAPIDX1"
+# magic, byte order, timestamps sorted, record count, source size, source mtime (ns)
+_HEADER = struct.Struct("<8sBBxxxxxxQQq")
+_HEADER_SIZE = 64
+# Per-record columns in file order; every section stays 8-byte aligned.
+_COLUMNS = (
+    ("data_offsets", "Q"), ("timestamps", "d"), ("caplens", "I"), ("wirelens", "I"), ("linktypes", "H"),
+)
+_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+
+def index_path(pcap_path):
+    """Return the sidecar index path for a PCAP file."""
+    return os.fspath(pcap_path) + INDEX_SUFFIX
+
+
+class PcapIndex:
+    """Offset/timestamp index of a PCAP or PCAPNG file, persisted next to it.
+
+    Each record keeps where its frame bytes start, its captured and wire
+    length, timestamp and linktype, so packet N (or a time range) is a seek
+    instead of a parse. A saved index is memory-mapped when opened, so
+    opening a known file does not read the index into memory.
+    """
+
+    def __init__(self, pcap_path):
+        self.pcap_path = os.fspath(pcap_path)
+        self.data_offsets = array("Q")
+        self.timestamps = array("d")
+        self.caplens = array("I")
+        self.wirelens = array("I")
+        self.linktypes = array("H")
+        self.sorted = True
+        self.lock = threading.Lock()
+        self.file = None
+        self.mapped = None
+        self.view = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def add(self, frame):
+        """Append a pcap_io.PcapFrame while the source is being scanned."""
+        if self.timestamps and frame.timestamp < self.timestamps[-1]:
+            self.sorted = False
+        self.data_offsets.append(frame.data_offset)
+        self.timestamps.append(frame.timestamp)
+        self.caplens.append(len(frame.data))
+        self.wirelens.append(frame.wirelen)
+        self.linktypes.append(frame.linktype)
+
+    @classmethod
+    def build(cls, pcap_path):
+        """Scan a PCAP file and return its index (not yet saved)."""
+        index = cls(pcap_path)
+        with open_pcap_buffer(pcap_path) as buffer:
+            for frame in scan_pcap(buffer):
+                index.add(frame)
+                del frame
+        return index
+
+    @classmethod
+    def open(cls, pcap_path):
+        """Return the saved index of a PCAP file, or None if missing or stale."""
+        path = index_path(pcap_path)
+        try:
+            source = os.stat(pcap_path)
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mapped) < _HEADER_SIZE:
+            mapped.close()
+            return None
+        magic, byte_order, is_sorted, count, size, mtime = _HEADER.unpack_from(mapped, 0)
+        if (
+            magic != INDEX_MAGIC or byte_order != _BYTE_ORDER
+            or size != source.st_size or mtime != source.st_mtime_ns
+        ):
+            mapped.close()
+            return None
+
+        index = cls(pcap_path)
+        index.mapped = mapped
+        index.sorted = bool(is_sorted)
+        index.view = memoryview(mapped)
+        offset = _HEADER_SIZE
+        for name, typecode in _COLUMNS:
+            width = struct.calcsize(typecode) * count
+            setattr(index, name, index.view[offset:offset + width].cast(typecode))
+            offset += (width + 7) & ~7
+        return index
+
+    @classmethod
+    def open_or_build(cls, pcap_path):
+        """Open the saved index of a PCAP file, building and saving it if needed."""
+        index = cls.open(pcap_path)
+        if index is None:
+            index = cls.build(pcap_path)
+            index.save()
+        return index
+
+    def save(self):
+        """Write the index next to its PCAP file. Returns False if that is not possible."""
+        path = index_path(self.pcap_path)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            source = os.stat(self.pcap_path)
+            with open(temporary, "wb") as f:
+                header = _HEADER.pack(
+                    INDEX_MAGIC, _BYTE_ORDER, self.sorted, len(self), source.st_size, source.st_mtime_ns
+                )
+                f.write(header.ljust(_HEADER_SIZE, b"\0"))
+                for name, _ in _COLUMNS:
+                    column = getattr(self, name)
+                    data = column.tobytes()
+                    f.write(data + b"\0" * (-len(data) % 8))
+            os.replace(temporary, path)
+            return True
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return False
+
+    def read(self, number):
+        """Return (timestamp, data, wirelen, linktype) of record number by seeking to it."""
+        if not 0 <= number < len(self):
+            raise IndexError(f"Record {number} is not in {self.pcap_path}.")
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.pcap_path, "rb")
+            self.file.seek(self.data_offsets[number])
+            data = self.file.read(self.caplens[number])
+        return self.timestamps[number], data, self.wirelens[number], self.linktypes[number]
+
+    def time_range(self, start_time=None, end_time=None):
+        """Return the record numbers with start_time <= timestamp <= end_time.
+
+        Uses binary search when timestamps are ordered, as they normally are.
+        """
+        if self.sorted:
+            first = 0 if start_time is None else bisect_left(self.timestamps, start_time)
+            last = len(self) if end_time is None else bisect_right(self.timestamps, end_time)
+            return range(first, max(first, last))
+        return [
+            number for number, timestamp in enumerate(self.timestamps)
+            if (start_time is None or timestamp >= start_time)
+            and (end_time is None or timestamp <= end_time)
+        ]
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if self.mapped is not None:
+            for name, typecode in _COLUMNS:
+                getattr(self, name).release()
+                setattr(self, name, array(typecode))
+            self.view.release()
+            self.view = None
+            self.mapped.close()
+            self.mapped = None
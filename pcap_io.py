@@ -0,0 +1,278 @@
+import contextlib
+import io
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+LINKTYPE_ETHERNET = 1
+PCAP_MAGIC = 0xA1B2C3D4
+
+_GLOBAL_HEADER = struct.Struct("<IHHiIII")
+_RECORD_HEADER = struct.Struct("<IIII")
+
+
+def pcap_global_header(linktype=LINKTYPE_ETHERNET, snaplen=65535):
+    """Return a classic little-endian, microsecond PCAP file header."""
+    return _GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, snaplen, linktype)
+
+
+def pcap_record(timestamp, data, wirelen=None):
+    """Return one PCAP record (header plus frame bytes)."""
+    seconds = int(timestamp)
+    micros = int(round((timestamp - seconds) * 1e6))
+    if micros >= 1000000:
+        seconds += 1
+        micros -= 1000000
+    return _RECORD_HEADER.pack(seconds, micros, len(data), wirelen or len(data)) + data
+
+
+def write_pcap(file_obj, records, linktype=LINKTYPE_ETHERNET, batch_size=1024):
+    """Write (timestamp, data, wirelen) tuples to an open binary file in batches."""
+    file_obj.write(pcap_global_header(linktype))
+    count = 0
+    batch = []
+    for timestamp, data, wirelen in records:
+        batch.append(pcap_record(timestamp, data, wirelen))
+        if len(batch) >= batch_size:
+            file_obj.write(b"".join(batch))
+            count += len(batch)
+            batch = []
+    if batch:
+        file_obj.write(b"".join(batch))
+        count += len(batch)
+    return count
+
+
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_OBSOLETE_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IF_TSRESOL = 9
+
+_PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+
+PcapFrame = namedtuple(
+    "PcapFrame", ["offset", "data_offset", "timestamp", "data", "wirelen", "linktype"]
+)
+
+
+def scan_pcap(buffer):
+    """Yield a PcapFrame for every frame of a PCAP or PCAPNG buffer.
+
+    The buffer may be bytes, a memoryview or an mmap; frame data are
+    zero-copy memoryview slices of it; offset is where the record starts and
+    data_offset where its frame bytes start.
+    """
+    view = memoryview(buffer)
+    magic = bytes(view[:4])
+    if magic in _PCAP_MAGICS:
+        return _scan_classic(view, magic)
+    if len(magic) == 4 and struct.unpack("<I", magic)[0] == PCAPNG_SECTION_HEADER:
+        return _scan_pcapng(view)
+    raise ValueError("Not a PCAP or PCAPNG file.")
+
+
+def _scan_classic(view, magic):
+    endian, resolution = _PCAP_MAGICS[magic]
+    if len(view) < 24:
+        raise ValueError("Truncated PCAP header.")
+    linktype = struct.unpack_from(endian + "I", view, 20)[0] & 0x0FFFFFFF
+    record_header = struct.Struct(endian + "IIII")
+    offset, size = 24, len(view)
+    while offset + 16 <= size:
+        seconds, fraction, caplen, wirelen = record_header.unpack_from(view, offset)
+        end = offset + 16 + caplen
+        if end > size:
+            return
+        yield PcapFrame(
+            offset, offset + 16, seconds + fraction * resolution, view[offset + 16:end], wirelen, linktype
+        )
+        offset = end
+
+
+def _pcapng_tsresol(options, endian):
+    """Return the timestamp resolution (seconds per tick) from IDB options."""
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "HH", options, offset)
+        if code == 0:
+            break
+        if code == PCAPNG_IF_TSRESOL and length >= 1:
+            value = options[offset + 4]
+            base = 2 if value & 0x80 else 10
+            return float(base) ** -(value & 0x7F)
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def _scan_pcapng(view):
+    endian = "<"
+    interfaces = []
+    offset, size = 0, len(view)
+    while offset + 12 <= size:
+        if struct.unpack_from("<I", view, offset)[0] == PCAPNG_SECTION_HEADER:
+            byte_order = struct.unpack_from("<I", view, offset + 8)[0]
+            endian = "<" if byte_order == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        kind, length = struct.unpack_from(endian + "II", view, offset)
+        if length < 12 or offset + length > size:
+            return
+        body = view[offset + 8:offset + length - 4]
+
+        if kind == PCAPNG_INTERFACE_DESCRIPTION:
+            linktype = struct.unpack_from(endian + "H", body, 0)[0]
+            interfaces.append((linktype, _pcapng_tsresol(body[8:], endian)))
+        elif kind in (PCAPNG_ENHANCED_PACKET, PCAPNG_OBSOLETE_PACKET):
+            if kind == PCAPNG_ENHANCED_PACKET:
+                interface, high, low, caplen, wirelen = struct.unpack_from(endian + "IIIII", body, 0)
+            else:
+                interface, _, high, low, caplen, wirelen = struct.unpack_from(endian + "HHIIII", body, 0)
+            if interface < len(interfaces):
+                linktype, resolution = interfaces[interface]
+            else:
+                linktype, resolution = LINKTYPE_ETHERNET, 1e-6
+            yield PcapFrame(
+                offset, offset + 28, ((high << 32) | low) * resolution,
+                body[20:20 + caplen], wirelen, linktype,
+            )
+        elif kind == PCAPNG_SIMPLE_PACKET:
+            wirelen = struct.unpack_from(endian + "I", body, 0)[0]
+            linktype = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+            yield PcapFrame(
+                offset, offset + 12, 0.0, body[4:4 + min(wirelen, len(body) - 4)], wirelen, linktype
+            )
+        offset += length
+
+
+@contextlib.contextmanager
+def open_pcap_buffer(source):
+    """Map a PCAP source into memory without reading it.
+
+    source may be a path, a real file object (memory-mapped) or an in-memory
+    file such as BytesIO or a Streamlit upload (its buffer is used as is).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            with open_pcap_buffer(f) as buffer:
+                yield buffer
+        return
+    if hasattr(source, "getbuffer"):
+        yield source.getbuffer()
+        return
+    try:
+        fileno = source.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        yield source.read()
+        return
+    if os.fstat(fileno).st_size == 0:
+        yield b""
+        return
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        yield mapped
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # A caller still holds a frame slice; the map is released with it.
+            pass
+
+
+class RotatingPcapWriter:
+    """Append frames to a series of PCAP files, rotating by size or age.
+
+    Frames are buffered and written in batches; write() is safe to call
+    from several capture threads. With max_files set, the oldest files of
+    the series are deleted once more than max_files exist.
+    """
+
+    def __init__(self, directory, prefix="capture", linktype=LINKTYPE_ETHERNET,
+                 max_bytes=100 * 1024 * 1024, max_seconds=3600, max_files=None,
+                 batch_size=256, flush_interval=1.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.linktype = linktype
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_files = max_files
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.batch = []
+        self.batch_bytes = 0
+        self.file = None
+        self.file_bytes = 0
+        self.opened_at = 0
+        self.last_flush = time.time()
+        self.sequence = 0
+        self.files = []
+        self.packets_written = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, timestamp, data, wirelen=None):
+        """Queue one frame, flushing the batch when it is full or old enough."""
+        record = pcap_record(timestamp, bytes(data), wirelen)
+        with self.lock:
+            self.batch.append(record)
+            self.batch_bytes += len(record)
+            if len(self.batch) >= self.batch_size or time.time() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.time()
+        if not self.batch:
+            return
+        if (
+            self.file is None
+            or self.file_bytes + self.batch_bytes > self.max_bytes
+            or (self.max_seconds and self.last_flush - self.opened_at >= self.max_seconds)
+        ):
+            self._rotate()
+        self.file.write(b"".join(self.batch))
+        self.file.flush()
+        self.file_bytes += self.batch_bytes
+        self.bytes_written += self.batch_bytes
+        self.packets_written += len(self.batch)
+        self.batch = []
+        self.batch_bytes = 0
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.sequence += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{self.sequence:04d}.pcap")
+        self.file = open(path, "wb", buffering=1024 * 1024)
+        header = pcap_global_header(self.linktype)
+        self.file.write(header)
+        self.file_bytes = len(header)
+        self.opened_at = time.time()
+        self.files.append(path)
+        while self.max_files and len(self.files) > self.max_files:
+            try:
+                os.remove(self.files.pop(0))
+            except OSError:
+                pass
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,178 @@
+import threading
+
+from packet_decode import (
+    LINK_LAYER_NAMES,
+    application_protocol_name,
+    network_protocol_name,
+    transport_protocol_name,
+)
+from pcap_io import LINKTYPE_ETHERNET
+
+PACKETS, BYTES = range(2)
+
+
+def protocol_path(headers, linktype=LINKTYPE_ETHERNET):
+    """Return the protocol stack of a packet, outermost first, e.g. ("Ethernet", "IPv4", "TCP", "TLS")."""
+    path = [LINK_LAYER_NAMES.get(linktype, f"linktype {linktype}")]
+    for name in (network_protocol_name(headers), transport_protocol_name(headers),
+                 application_protocol_name(headers)):
+        if not name:
+            break
+        path.append(name)
+    return tuple(path)
+
+
+class _Shard:
+    """Counters written by a single thread, so updates need no lock."""
+
+    def __init__(self):
+        # path -> [packets, bytes] since the last clear, and per time bucket.
+        self.totals = {}
+        self.buckets = {}
+        self.newest = None
+
+
+class ProtocolStats:
+    """Packet and byte counts per protocol-hierarchy node, kept in fixed time buckets.
+
+    add() costs a couple of dict lookups per packet: only the packet's full
+    path (Ethernet / IPv4 / TCP / TLS) is counted, into a shard owned by the
+    calling thread, and parent nodes are summed up when queried. Readers
+    merge the shards by copying their dicts, which is atomic under the GIL,
+    so capture threads never wait on a lock. Buckets older than retention
+    seconds before the newest packet are discarded; all-time totals are
+    kept separately.
+    """
+
+    def __init__(self, bucket_seconds=10, retention=3600):
+        self.bucket_seconds = bucket_seconds
+        self.keep_buckets = max(int(retention // bucket_seconds), 1)
+        self.paths = {}
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # New shards for every thread; updates racing with clear() land in the discarded ones.
+        with self.lock:
+            self.shards = []
+            self.local = threading.local()
+
+    def _shard(self):
+        local = self.local
+        shard = getattr(local, "shard", None)
+        if shard is None:
+            shard = local.shard = _Shard()
+            with self.lock:
+                if local is self.local:
+                    self.shards.append(shard)
+        return shard
+
+    def add(self, headers, length, timestamp, linktype=LINKTYPE_ETHERNET):
+        """Count one packet of length bytes seen at timestamp."""
+        key = (linktype, headers.ethertype, headers.proto, application_protocol_name(headers))
+        path = self.paths.get(key)
+        if path is None:
+            path = protocol_path(headers, linktype)
+            if len(self.paths) < 65536:
+                self.paths[key] = path
+        shard = self._shard()
+        counts = shard.totals.get(path)
+        if counts is None:
+            counts = shard.totals[path] = [0, 0]
+        counts[PACKETS] += 1
+        counts[BYTES] += length
+
+        bucket = int(timestamp // self.bucket_seconds)
+        if shard.newest is None or bucket > shard.newest:
+            shard.newest = bucket
+            for old in [old for old in shard.buckets if old <= bucket - self.keep_buckets]:
+                del shard.buckets[old]
+        elif bucket <= shard.newest - self.keep_buckets:
+            return
+        paths = shard.buckets.get(bucket)
+        if paths is None:
+            paths = shard.buckets[bucket] = {}
+        counts = paths.get(path)
+        if counts is None:
+            counts = paths[path] = [0, 0]
+        counts[PACKETS] += 1
+        counts[BYTES] += length
+
+    def newest_time(self):
+        """Return the start of the newest bucket, or None before the first packet."""
+        newest = [shard.newest for shard in list(self.shards) if shard.newest is not None]
+        return max(newest) * self.bucket_seconds if newest else None
+
+    def _window(self, seconds, now):
+        """Return (first bucket, last bucket) of the last seconds before now (default: newest packet)."""
+        if now is None:
+            now = self.newest_time()
+            if now is None:
+                return None
+        last = int(now // self.bucket_seconds)
+        return last - max(int(-(-seconds // self.bucket_seconds)), 1) + 1, last
+
+    def _leaves(self, seconds=None, now=None):
+        merged = {}
+        if seconds is None:
+            sources = [shard.totals.copy() for shard in list(self.shards)]
+        else:
+            window = self._window(seconds, now)
+            if window is None:
+                return merged
+            sources = [
+                paths.copy()
+                for shard in list(self.shards)
+                for bucket, paths in shard.buckets.copy().items()
+                if window[0] <= bucket <= window[1]
+            ]
+        for paths in sources:
+            for path, counts in paths.items():
+                total = merged.setdefault(path, [0, 0])
+                total[PACKETS] += counts[PACKETS]
+                total[BYTES] += counts[BYTES]
+        return merged
+
+    def totals(self, seconds=None, now=None):
+        """Return {path: (packets, bytes)} for every node of the hierarchy.
+
+        With seconds set, only the last seconds before now (by default the
+        newest packet's time) are counted; otherwise everything since clear().
+        """
+        nodes = {}
+        for path, counts in self._leaves(seconds, now).items():
+            for depth in range(1, len(path) + 1):
+                node = nodes.setdefault(path[:depth], [0, 0])
+                node[PACKETS] += counts[PACKETS]
+                node[BYTES] += counts[BYTES]
+        return {path: tuple(counts) for path, counts in nodes.items()}
+
+    def top(self, k=10, depth=None, seconds=None, by=PACKETS):
+        """Return the k largest nodes as (path, packets, bytes), optionally only those depth levels deep."""
+        nodes = [
+            (path, packets, size)
+            for path, (packets, size) in self.totals(seconds).items()
+            if depth is None or len(path) == depth
+        ]
+        nodes.sort(key=lambda node: node[1 + by], reverse=True)
+        return nodes[:k]
+
+    def series(self, seconds, depth=3, now=None):
+        """Return (bucket start times, {path: packets per bucket}) for the nodes depth levels deep.
+
+        Paths shorter than depth (ARP, say) are reported as themselves.
+        """
+        window = self._window(seconds, now)
+        if window is None:
+            return [], {}
+        first, last = window
+        series = {}
+        for shard in list(self.shards):
+            for bucket, paths in shard.buckets.copy().items():
+                if not first <= bucket <= last:
+                    continue
+                for path, counts in paths.copy().items():
+                    row = series.setdefault(path[:depth], [0] * (last - first + 1))
+                    row[bucket - first] += counts[PACKETS]
+        times = [bucket * self.bucket_seconds for bucket in range(first, last + 1)]
+        return times, series
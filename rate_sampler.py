@@ -0,0 +1,148 @@
+import threading
+import time
+
+import numpy as np
+import psutil
+
+TOTAL = "All interfaces"
+# Columns of every sample row.
+TIME, SENT_MBPS, RECV_MBPS, SENT_PPS, RECV_PPS = range(5)
+
+
+class RingBuffer:
+    """Fixed-size ring of float64 rows backed by a preallocated NumPy array."""
+
+    def __init__(self, capacity, columns):
+        self.data = np.zeros((capacity, columns))
+        self.capacity = capacity
+        self.count = 0
+        self.position = 0
+
+    def append(self, row):
+        self.data[self.position] = row
+        self.position = (self.position + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def snapshot(self):
+        """Return a copy of the stored rows, oldest first."""
+        if self.count < self.capacity:
+            return self.data[:self.count].copy()
+        return np.concatenate((self.data[self.position:], self.data[:self.position]))
+
+
+class RateSampler:
+    """Sample per-interface throughput from psutil counter deltas on a background thread.
+
+    Every interval seconds one row (time, sent/received Mbps, sent/received
+    packets per second) is appended per interface, plus an aggregate row
+    under TOTAL, into fixed-size ring buffers. Readers only take snapshots.
+    """
+
+    def __init__(self, interval=0.25, history_seconds=600):
+        self.interval = interval
+        self.capacity = int(history_seconds / interval)
+        self.buffers = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.previous = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval * 4)
+
+    def run(self):
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            self.sample()
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                # Fell behind (e.g. host suspended); resynchronise instead of bursting.
+                next_sample = time.monotonic()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def sample(self):
+        """Take one counter reading and append rates computed against the previous one."""
+        now = time.time()
+        counters = psutil.net_io_counters(pernic=True)
+        previous, self.previous = self.previous, (now, counters)
+        if previous is None:
+            return
+        then, old_counters = previous
+        elapsed = now - then
+        if elapsed <= 0:
+            return
+
+        total = np.zeros(5)
+        total[TIME] = now
+        with self.lock:
+            for interface, current in counters.items():
+                old = old_counters.get(interface)
+                if old is None:
+                    continue
+                deltas = (
+                    current.bytes_sent - old.bytes_sent,
+                    current.bytes_recv - old.bytes_recv,
+                    current.packets_sent - old.packets_sent,
+                    current.packets_recv - old.packets_recv,
+                )
+                if min(deltas) < 0:
+                    # Counter wrapped or the interface was reset.
+                    continue
+                row = (
+                    now,
+                    deltas[0] * 8 / elapsed / 1e6,
+                    deltas[1] * 8 / elapsed / 1e6,
+                    deltas[2] / elapsed,
+                    deltas[3] / elapsed,
+                )
+                self._buffer(interface).append(row)
+                total[1:] += row[1:]
+            self._buffer(TOTAL).append(total)
+
+    def _buffer(self, interface):
+        buffer = self.buffers.get(interface)
+        if buffer is None:
+            buffer = self.buffers[interface] = RingBuffer(self.capacity, 5)
+        return buffer
+
+    def interfaces(self):
+        with self.lock:
+            return [TOTAL] + sorted(name for name in self.buffers if name != TOTAL)
+
+    def snapshot(self, interface=TOTAL, seconds=None):
+        """Return the samples of one interface as an (n, 5) array, oldest first."""
+        with self.lock:
+            buffer = self.buffers.get(interface)
+            rows = buffer.snapshot() if buffer is not None else np.zeros((0, 5))
+        if seconds is not None and len(rows):
+            rows = rows[rows[:, TIME] >= rows[-1, TIME] - seconds]
+        return rows
+
+
+_shared_sampler = None
+_shared_lock = threading.Lock()
+
+
+def shared_sampler():
+    """Return the process-wide sampler, starting it on first use.
+
+    Every browser session reads from this one sampler instead of polling
+    psutil itself.
+    """
+    global _shared_sampler
+    with _shared_lock:
+        if _shared_sampler is None:
+            _shared_sampler = RateSampler()
+        _shared_sampler.start()
+        return _shared_sampler
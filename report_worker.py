@@ -0,0 +1,175 @@
+import datetime
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+
+from downsample import downsample_frame, resolution
+
+METRIC_COLUMNS = ['Download Speed (Mbps)', 'Upload Speed (Mbps)', 'Ping (ms)', 'Jitter (ms)']
+SPEED_COLUMNS = METRIC_COLUMNS[:2]
+CHART_WIDTH = 500
+CHART_HEIGHT = 300
+PERCENTILES = (5, 50, 95, 99)
+
+
+def summarize(df):
+    """Return {column: {"mean", "max", "min", "p5", "p50", "p95", "p99"}} of the metric columns, ignoring missing values.
+
+    The columns are reduced together as one (rows, metrics) array instead of
+    one pandas pass per statistic and column.
+    """
+    values = df[METRIC_COLUMNS].to_numpy(dtype=np.float64, na_value=np.nan)
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(present, values, 0).sum(axis=0) / counts
+    maxima = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+    minima = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+    with warnings.catch_warnings():
+        # All-NaN columns (no test measured jitter, say) just give NaN percentiles.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        percentiles = np.nanpercentile(values, PERCENTILES, axis=0) if len(values) else (
+            np.full((len(PERCENTILES), len(METRIC_COLUMNS)), np.nan)
+        )
+    return {
+        column: {
+            "mean": means[i],
+            "max": maxima[i] if counts[i] else np.nan,
+            "min": minima[i] if counts[i] else np.nan,
+            **{f"p{p}": percentiles[j][i] for j, p in enumerate(PERCENTILES)},
+        }
+        for i, column in enumerate(METRIC_COLUMNS)
+    }
+
+
+def speed_chart(df, width=CHART_WIDTH, height=CHART_HEIGHT):
+    """Draw download and upload speed over time as a vector reportlab drawing."""
+    from reportlab.graphics.charts.legends import LineLegend
+    from reportlab.graphics.charts.lineplots import LinePlot
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.lib import colors
+
+    max_points, _ = resolution(0, width)
+    df = downsample_frame(df, 'Date', SPEED_COLUMNS, max_points)
+    seconds = df['Date'].to_numpy().astype("datetime64[s]").astype(np.int64)
+
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 15, "Download vs Upload Speed Over Time",
+                       textAnchor="middle", fontName="Helvetica-Bold", fontSize=12))
+    plot = LinePlot()
+    plot.x, plot.y = 50, 50
+    plot.width, plot.height = width - 70, height - 100
+    plot.data = []
+    for column in SPEED_COLUMNS:
+        values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep = ~np.isnan(values)
+        plot.data.append(list(zip(seconds[keep].tolist(), values[keep].tolist())) or [(0, 0)])
+    plot.lines[0].strokeColor = colors.green
+    plot.lines[1].strokeColor = colors.blue
+    plot.xValueAxis.labelTextFormat = (
+        lambda value: datetime.datetime.fromtimestamp(value, datetime.timezone.utc).strftime("%m-%d %H:%M")
+    )
+    plot.xValueAxis.labels.fontSize = 7
+    plot.yValueAxis.valueMin = 0
+    drawing.add(plot)
+
+    legend = LineLegend()
+    legend.x, legend.y = 60, 25
+    legend.columnMaximum = 1
+    legend.colorNamePairs = [(colors.green, SPEED_COLUMNS[0]), (colors.blue, SPEED_COLUMNS[1])]
+    drawing.add(legend)
+    return drawing
+
+
+def build_pdf(df, generated_at=None):
+    """Return the speed test analysis report for df as PDF bytes."""
+    # reportlab is only imported once a report is actually built.
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    generated_at = generated_at or datetime.datetime.now()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    styles = getSampleStyleSheet()
+    title_style = styles['Title']
+    title_style.fontName = 'Helvetica-Bold'
+    title_style.fontSize = 18
+    title_style.textColor = colors.darkblue
+
+    normal_style = styles['Normal']
+    normal_style.fontName = 'Helvetica'
+    normal_style.fontSize = 12
+
+    elements.append(Paragraph("Speed Test Analysis Report", title_style))
+    elements.append(Paragraph(f"<b>Date of report:</b> {generated_at.strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
+
+    stats = summarize(df)
+    download, upload = stats['Download Speed (Mbps)'], stats['Upload Speed (Mbps)']
+    ping, jitter = stats['Ping (ms)'], stats['Jitter (ms)']
+    analysis = f"""
+    <b>Average Download Speed:</b> {download['mean']:.2f} Mbps<br/>
+    <b>Average Upload Speed:</b> {upload['mean']:.2f} Mbps<br/>
+    <b>Average Ping:</b> {stats['Ping (ms)']['mean']:.2f} ms<br/>
+    <b>Average Jitter:</b> {stats['Jitter (ms)']['mean']:.2f} ms<br/>
+    <b>Max Download Speed:</b> {download['max']:.2f} Mbps<br/>
+    <b>Max Upload Speed:</b> {upload['max']:.2f} Mbps<br/>
+    <b>Min Download Speed:</b> {download['min']:.2f} Mbps<br/>
+    <b>Min Upload Speed:</b> {upload['min']:.2f} Mbps<br/>
+    <b>Ping p50 / p95 / p99:</b> {ping['p50']:.2f} / {ping['p95']:.2f} / {ping['p99']:.2f} ms<br/>
+    <b>Jitter p50 / p95 / p99:</b> {jitter['p50']:.2f} / {jitter['p95']:.2f} / {jitter['p99']:.2f} ms<br/>
+    <b>Download Speed p5 / p50:</b> {download['p5']:.2f} / {download['p50']:.2f} Mbps<br/>
+    """
+    elements.append(Paragraph(analysis, normal_style))
+    elements.append(Spacer(1, 12))
+    elements.append(speed_chart(df))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+class ReportWorker:
+    """Build PDF reports on a background thread and cache them by data version.
+
+    submit() returns a Future immediately; the same key returns the same
+    Future, finished or not, so a repeated request costs nothing and two
+    users asking for the same report share one build. Failed builds are
+    dropped from the cache so they can be retried.
+    """
+
+    def __init__(self, max_workers=1, cache_size=8):
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="report")
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, df):
+        with self.lock:
+            future = self.cache.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.cache.move_to_end(key)
+                return future
+            future = self.cache[key] = self.executor.submit(build_pdf, df)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return future
+
+
+_shared_worker = None
+_shared_lock = threading.Lock()
+
+
+def shared_report_worker():
+    """Return the process-wide report worker."""
+    global _shared_worker
+    with _shared_lock:
+        if _shared_worker is None:
+            _shared_worker = ReportWorker()
+        return _shared_worker
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from latency_prober import ProbeTarget, measure
+
+SERVER_FIELDS = ("id", "name", "country", "sponsor", "url", "host", "d")
+
+
+class ServerCatalog:
+    """Persistent cache of speed test servers ranked by measured latency.
+
+    Discovery (speedtest_cli config and server list) runs only when the
+    cache is missing or older than ttl; ranking (a concurrent TCP connect to
+    every candidate) is redone in the background once it is older than
+    rank_ttl, while callers keep using the previous ranking. A pinned server
+    is returned without any network access at all.
+    """
+
+    def __init__(self, path="speedtest_servers.json", ttl=7 * 86400, rank_ttl=3600, candidates=10):
+        self.path = path
+        self.ttl = ttl
+        self.rank_ttl = rank_ttl
+        self.candidates = candidates
+        self.lock = threading.Lock()
+        self.background = None
+        self.state = {"fetched_at": 0, "ranked_at": 0, "client": {}, "servers": [], "pinned": None}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                self.state.update(json.load(file))
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self.lock:
+            data = json.dumps(self.state, indent=1)
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as file:
+            file.write(data)
+        os.replace(file.name, self.path)
+
+    @property
+    def isp(self):
+        return self.state["client"].get("isp")
+
+    def servers(self):
+        """Return the cached servers, lowest latency first."""
+        with self.lock:
+            return list(self.state["servers"])
+
+    def pinned(self):
+        pinned = self.state["pinned"]
+        return next((server for server in self.servers() if server["id"] == pinned), None)
+
+    def pin(self, server_id):
+        """Always test against server_id (None to go back to automatic selection)."""
+        with self.lock:
+            self.state["pinned"] = server_id
+        self.save()
+
+    def discover(self):
+        """Fetch the client config and the closest servers, then rank them."""
+        import speedtest_cli
+
+        speedtest = speedtest_cli.Speedtest()
+        closest = speedtest.get_closest_servers(limit=self.candidates)
+        with self.lock:
+            self.state["client"] = {key: speedtest.config["client"].get(key) for key in ("isp", "ip", "country")}
+            self.state["servers"] = [{key: server.get(key) for key in SERVER_FIELDS} for server in closest]
+            self.state["fetched_at"] = time.time()
+        self.rank()
+
+    def rank(self):
+        """Measure the TCP connect time to every cached server and sort by it."""
+        servers = self.servers()
+        targets = [ProbeTarget.parse(server["host"], name=server["id"]) for server in servers]
+        rtts = measure(targets, count=3, spacing=0.05) if targets else {}
+        for server in servers:
+            replies = [rtt for rtt in rtts.get(server["id"], []) if rtt is not None]
+            server["latency"] = min(replies) if replies else None
+        servers.sort(key=lambda server: (server["latency"] is None, server["latency"] or 0))
+        with self.lock:
+            self.state["servers"] = servers
+            self.state["ranked_at"] = time.time()
+        self.save()
+
+    def _in_background(self, target):
+        if self.background is not None and self.background.is_alive():
+            return
+        self.background = threading.Thread(target=target, daemon=True)
+        self.background.start()
+
+    def best(self):
+        """Return the server to test against, discovering servers only if there are none cached."""
+        pinned = self.pinned()
+        if pinned is not None:
+            return pinned
+        now = time.time()
+        if not self.state["servers"]:
+            self.discover()
+        elif now - self.state["fetched_at"] > self.ttl:
+            self._in_background(self.discover)
+        elif now - self.state["ranked_at"] > self.rank_ttl:
+            self._in_background(self.rank)
+        servers = self.servers()
+        if not servers:
+            raise RuntimeError("No speed test servers available")
+        return servers[0]
+
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+def shared_catalog():
+    """Return the process-wide server catalog."""
+    global _shared_catalog
+    with _shared_lock:
+        if _shared_catalog is None:
+            _shared_catalog = ServerCatalog()
+        return _shared_catalog
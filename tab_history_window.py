@@ -1,28 +1,50 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
 import datetime
+import time
+import metrics
+from downsample import downsample_frame, resolution
+from history_store import DATE_FORMAT, shared_history, shared_store
+from report_worker import SPEED_COLUMNS, build_pdf, shared_report_worker
 
-def load_history(csv_file="speed_test_history.csv"):
-    if os.path.exists(csv_file):
-        return pd.read_csv(csv_file)
-    else:
-        st.warning("No history file found.")
-        return pd.DataFrame()
+HISTORY_RANGES = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "Last year": 365, "All": None}
+MAX_TABLE_ROWS = 1000
+CHART_WIDTH = 1000
+
+def load_history(start=None, end=None):
+    return shared_history().range(start, end)
+
+def load_chart_data(start=None, end=None, width=CHART_WIDTH):
+    """Return at most about two points per pixel of the tests in [start, end).
+
+    When one point would cover an hour or a day anyway, the chart is drawn
+    from the hourly or daily rollups instead of the raw tests.
+    """
+    tests = load_history(start, end)
+    if tests.empty:
+        return tests
+    first = start or tests['Date'].iloc[0]
+    last = end or tests['Date'].iloc[-1]
+    max_points, seconds_per_point = resolution((last - first).total_seconds(), width)
+    data = tests
+    if len(tests) > max_points and seconds_per_point >= 3600:
+        data = shared_store().rollups("day" if seconds_per_point >= 86400 else "hour", start, end)
+    return downsample_frame(data, 'Date', SPEED_COLUMNS, max_points)
 
 def plot_graphs(df):
-    df['Date'] = pd.to_datetime(df['Date'])
+    with metrics.CHART_SECONDS.labels("history").time():
+        _plot_graphs(df)
+
+def _plot_graphs(df):
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df = df.assign(Date=pd.to_datetime(df['Date']))
 
     fig = px.line(
         df,
         x='Date',
-        y=['Download Speed (Mbps)', 'Upload Speed (Mbps)'],
+        y=SPEED_COLUMNS,
         labels={'value': 'Speed (Mbps)', 'Date': 'Date'},
         title='Download vs Upload Speed Over Time',
         color='variable',
@@ -39,73 +61,93 @@ def plot_graphs(df):
 
     st.plotly_chart(fig, use_container_width=True)
 
-def create_pdf_report(df):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Title']
-    title_style.fontName = 'Helvetica-Bold'
-    title_style.fontSize = 18
-    title_style.textColor = colors.darkblue
-
-    normal_style = styles['Normal']
-    normal_style.fontName = 'Helvetica'
-    normal_style.fontSize = 12
-
-    title = Paragraph("Speed Test Analysis Report", title_style)
-    elements.append(title)
-
-    intro = Paragraph(f"<b>Date of report:</b> {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style)
-    elements.append(intro)
-
-    analysis = f"""
-    <b>Average Download Speed:</b> {df['Download Speed (Mbps)'].mean():.2f} Mbps<br/>
-    <b>Average Upload Speed:</b> {df['Upload Speed (Mbps)'].mean():.2f} Mbps<br/>
-    <b>Average Ping:</b> {df['Ping (ms)'].mean():.2f} ms<br/>
-    <b>Average Jitter:</b> {df['Jitter (ms)'].mean():.2f} ms<br/>
-    <b>Max Download Speed:</b> {df['Download Speed (Mbps)'].max():.2f} Mbps<br/>
-    <b>Max Upload Speed:</b> {df['Upload Speed (Mbps)'].max():.2f} Mbps<br/>
-    <b>Min Download Speed:</b> {df['Download Speed (Mbps)'].min():.2f} Mbps<br/>
-    <b>Min Upload Speed:</b> {df['Upload Speed (Mbps)'].min():.2f} Mbps<br/>
-    """
-    elements.append(Paragraph(analysis, normal_style))
-    elements.append(Spacer(1, 12))
+def latency_chart_data(latency, width=CHART_WIDTH):
+    """Return latency windows downsampled per target, with a "Loss (%)" column.
 
-    graph_file = "graph.png"
-    fig = px.line(
-        df,
-        x='Date',
-        y=['Download Speed (Mbps)', 'Upload Speed (Mbps)'],
-        labels={'value': 'Speed (Mbps)', 'Date': 'Date'},
-        title='Download vs Upload Speed Over Time',
+    Min/max downsampling keeps every RTT spike.
+    """
+    latency = latency.assign(**{"Loss (%)": 100 * latency["Lost"] / latency["Sent"].clip(lower=1)})
+    max_points, _ = resolution(0, width)
+    return pd.concat(
+        downsample_frame(windows, 'Date', ['RTT (ms)'], max_points, method="min_max")
+        for _, windows in latency.groupby('Target', sort=True)
     )
-    fig.write_image(graph_file)
 
-    img = RLImage(graph_file, width=500, height=300)
-    elements.append(img)
+def latency_summary(df):
+    """Return one row per target with its probe counts, loss and RTT range."""
+    summary = df.groupby('Target').agg(
+        Sent=('Sent', 'sum'), Lost=('Lost', 'sum'),
+        **{"Mean RTT (ms)": ('RTT (ms)', 'mean'), "Max RTT (ms)": ('RTT (ms)', 'max')},
+    )
+    summary.insert(2, "Loss (%)", (100 * summary['Lost'] / summary['Sent'].clip(lower=1)).round(2))
+    return summary.reset_index()
+
+def plot_latency(df):
+    with metrics.CHART_SECONDS.labels("latency_history").time():
+        fig = px.line(
+            df, x='Date', y='RTT (ms)', color='Target', hover_data=['Loss (%)'],
+            title='Latency by Target',
+        )
+        fig.update_layout(
+            title=dict(font=dict(size=20, color='darkblue'), x=0.5),
+            xaxis_title="Date",
+            yaxis_title="RTT (ms)",
+            template='plotly_white',
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def latency_history(start=None):
+    """Show the latency windows the monitoring daemon stored since start."""
+    latency = shared_store().latency(start)
+    if latency.empty:
+        return
+    st.subheader("Latency History")
+    st.caption("Recorded by the monitoring daemon (daemon.py).")
+    st.dataframe(latency_summary(latency), hide_index=True)
+    plot_latency(latency_chart_data(latency))
 
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+def create_pdf_report(df):
+    return BytesIO(build_pdf(df))
 
 def history_tab():
-    csv_file = "speed_test_history.csv"
-    df = load_history(csv_file)
+    history = shared_history()
+    days = HISTORY_RANGES[st.selectbox("Range:", list(HISTORY_RANGES), index=1)]
+    start = datetime.datetime.now() - datetime.timedelta(days=days) if days else None
+
+    if len(history.frame):
+        tests = load_history(start)
 
-    if not df.empty:
         st.subheader("Speed Test History")
-        st.dataframe(df)
+        if len(tests) > MAX_TABLE_ROWS:
+            st.caption(f"Showing the newest {MAX_TABLE_ROWS} of {len(tests)} tests.")
+        st.dataframe(tests.iloc[-MAX_TABLE_ROWS:])
 
         st.subheader("Speed Test Graph")
-        plot_graphs(df)
-
+        zoom_start, zoom_end = start, None
+        if len(tests) > 1:
+            first = tests['Date'].iloc[0].to_pydatetime()
+            last = tests['Date'].iloc[-1].to_pydatetime()
+            if first < last:
+                zoom_start, zoom_end = st.slider("Zoom:", min_value=first, max_value=last, value=(first, last))
+                zoom_end += datetime.timedelta(seconds=1)
+        plot_graphs(load_chart_data(zoom_start, zoom_end))
+
+        report_key = (history.version, len(tests), tests['Date'].iloc[0] if len(tests) else None)
         if st.button("Generate PDF Report"):
-            pdf = create_pdf_report(df)
-            st.download_button(label="Download PDF Report", data=pdf, file_name="Speed_Test_Report.pdf", mime="application/pdf")
+            st.session_state.report_key = report_key
+        if st.session_state.get("report_key") == report_key:
+            report = shared_report_worker().submit(report_key, tests)
+            if report.done():
+                st.download_button(label="Download PDF Report", data=report.result(), file_name="Speed_Test_Report.pdf", mime="application/pdf")
+            else:
+                st.info("Generating PDF report...")
+                time.sleep(0.5)
+                st.rerun()
 
         if st.button("Export CSV"):
-            st.download_button(label="Download CSV", data=df.to_csv(index=False), file_name="Speed_Test_History.csv", mime="text/csv")
+            csv = tests.to_csv(index=False, date_format=DATE_FORMAT)
+            st.download_button(label="Download CSV", data=csv, file_name="Speed_Test_History.csv", mime="text/csv")
     else:
         st.warning("No speed test history available. Please run a speed test to populate the data.")
+
+    latency_history(start)
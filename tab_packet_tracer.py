@@ -1,24 +1,60 @@
+import math
+import pandas as pd
 import streamlit as st
-from worker_packet_tracer import PacketWorker
-from scapy.all import packet as scapy_packet
+from worker_packet_tracer import shared_packet_worker
+from capture_filter import build_bpf, link_layer_filter
 
-worker = PacketWorker()
+SEARCH_RESULT_LIMIT = 1000
 
 def packet_tracer_tab():
     st.title("Packet Tracer")
+    worker = shared_packet_worker()
 
     col1, col2 = st.columns([3, 1])
 
     with col1:
         interfaces = worker.load_interfaces()
-        selected_interface = st.selectbox("Select an Interface:", interfaces)
+        selected_interfaces = st.multiselect(
+            "Select Interfaces:", interfaces, default=interfaces[:1]
+        )
+        use_processes = st.checkbox(
+            "Capture each interface in its own process (for high packet rates)"
+        )
+
+        filter_cols = st.columns(4)
+        filter_protocol = filter_cols[0].text_input("Protocol (e.g. TCP, DNS):")
+        filter_source = filter_cols[1].text_input("Source IP/CIDR:")
+        filter_destination = filter_cols[2].text_input("Destination IP/CIDR:")
+        filter_expression = filter_cols[3].text_input("Raw BPF expression:")
+
+        with st.expander("Continuous recording to disk"):
+            record_dir = st.text_input("Write rotating PCAP files to (Enter Directory):")
+            record_cols = st.columns(4)
+            rotate_mb = record_cols[0].number_input("Rotate at (MB)", min_value=1, value=100)
+            rotate_minutes = record_cols[1].number_input("Rotate after (minutes)", min_value=1, value=60)
+            max_files = record_cols[2].number_input("Keep newest files (0 = all)", min_value=0, value=0)
+            keep_in_memory = record_cols[3].checkbox("Also keep in memory", value=True)
 
     with col2:
         if st.button("Start Capture"):
-            if selected_interface:
+            if selected_interfaces:
                 try:
-                    worker.start_capture([selected_interface])
-                    st.success(f"Started capturing on {selected_interface}")
+                    capture_filter = build_bpf(
+                        filter_protocol, filter_source, filter_destination, filter_expression
+                    )
+                    worker.start_capture(
+                        selected_interfaces,
+                        capture_filter=capture_filter,
+                        timeout=None if record_dir else 60,
+                        record_dir=record_dir or None,
+                        rotate_bytes=int(rotate_mb) * 1024 * 1024,
+                        rotate_seconds=int(rotate_minutes) * 60,
+                        max_files=int(max_files) or None,
+                        keep_in_memory=keep_in_memory,
+                        use_processes=use_processes,
+                        linktypes=link_layer_filter(filter_protocol),
+                    )
+                    st.success(f"Started capturing on {', '.join(selected_interfaces)}")
                 except Exception as e:
                     st.error(f"Error starting capture: {e}")
             else:
@@ -31,30 +67,194 @@ def packet_tracer_tab():
             except Exception as e:
                 st.error(f"Error stopping capture: {e}")
 
+    for interface, event in worker.drain_events():
+        if isinstance(event, str):
+            st.error(f"{interface}: {event}")
+    for interface, stats in worker.get_capture_statistics().items():
+        counts = [f"{stats['accepted']} accepted"]
+        if stats["kernel_filtered"] is not None:
+            counts.append(f"{stats['kernel_filtered']} filtered in kernel")
+        counts.append(f"{stats['kernel_dropped']} dropped in kernel")
+        if "queue_dropped" in stats:
+            counts += [
+                f"{stats['queue_dropped']} dropped at the process queue",
+                f"{stats['packets_per_second']:.0f} pkt/s, {stats['mbps']:.1f} Mbps",
+            ]
+        st.caption(
+            f"{interface}: {', '.join(counts)}"
+            + (f" (filter: {stats['filter']})" if stats["filter"] else "")
+            + ("" if stats["running"] else " - stopped")
+        )
+    for interface, stats in worker.get_recording_statistics().items():
+        current_file = stats["files"][-1] if stats["files"] else "--"
+        st.caption(
+            f"{interface}: {stats['packets']} packets / {stats['bytes'] / (1024 * 1024):.1f} MB "
+            f"written, current file {current_file}"
+        )
+
+    st.markdown("### Top Talkers")
+    talker_cols = st.columns([1, 1, 4])
+    top_by = talker_cols[0].selectbox("Rank by", ["bytes", "packets"])
+    top_count = talker_cols[1].number_input("Flows", min_value=1, max_value=100, value=10)
+    top_flows = worker.get_top_flows(int(top_count), top_by)
+    if top_flows:
+        st.dataframe(
+            [
+                {
+                    "Protocol": flow["protocol"],
+                    "Endpoint A": flow["endpoint_a"],
+                    "Endpoint B": flow["endpoint_b"],
+                    "Packets": flow["packets"],
+                    "Bytes": flow["bytes"],
+                    "Rate (Mbps)": round(flow["rate_mbps"], 3),
+                    "Rate (pkt/s)": round(flow["rate_pps"], 1),
+                    "Duration (s)": round(flow["last_seen"] - flow["first_seen"], 1),
+                }
+                for flow in top_flows
+            ],
+            use_container_width=True,
+        )
+    else:
+        st.info("No IP conversations seen yet.")
+
+    st.markdown("### Protocol Hierarchy")
+    hierarchy_cols = st.columns([1, 3])
+    protocol_window = hierarchy_cols[0].selectbox(
+        "Traffic", [None, 60, 300, 900, 3600],
+        format_func=lambda x: "All packets" if x is None else f"Last {x // 60} min",
+    )
+    protocol_totals = worker.get_protocol_statistics(protocol_window)
+    if protocol_totals:
+        all_packets = sum(packets for path, (packets, _) in protocol_totals.items() if len(path) == 1)
+        hierarchy_cols[1].dataframe(
+            [
+                {
+                    "Protocol": "    " * (len(path) - 1) + path[-1],
+                    "Packets": packets,
+                    "% Packets": round(100 * packets / all_packets, 1),
+                    "Bytes": size,
+                }
+                for path, (packets, size) in sorted(protocol_totals.items())
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+        times, series = worker.get_protocol_series(protocol_window or 300)
+        if series:
+            st.area_chart(pd.DataFrame(
+                {" / ".join(path[1:]) or path[0]: counts for path, counts in series.items()},
+                index=pd.to_datetime(times, unit="s"),
+            ))
+    else:
+        st.info("No packets counted yet.")
+
     col1, col2 = st.columns([1, 2])
 
     with col1:
         st.markdown("### Packet List")
-        captured_packets = worker.packets
+        store_stats = worker.get_store_statistics()
+        st.caption(
+            f"{store_stats['packets']} packets stored, "
+            f"{store_stats['resident_bytes'] / (1024 * 1024):.1f} MB resident, "
+            f"{store_stats['evicted_packets']} evicted"
+        )
 
-        if captured_packets:
-            packet_summaries = [
-                f"[{iface}] {packet.summary()}" for iface, packet in captured_packets
-            ]
-            selected_packet_index = st.selectbox(
+        total_packets = worker.packet_count()
+        selected_packet_id = None
+        if total_packets:
+            list_cols = st.columns(2)
+            page_size = list_cols[0].selectbox("Rows per page", [25, 50, 100, 250], index=1)
+            sort_order = list_cols[1].selectbox(
+                "Sort", ["oldest", "newest", "largest"],
+                format_func=lambda x: {"oldest": "Oldest first", "newest": "Newest first",
+                                       "largest": "Largest first"}[x],
+            )
+            page_count = max(1, math.ceil(total_packets / page_size))
+
+            jump_cols = st.columns([2, 1])
+            packet_ids = worker.packet_ids()
+            jump_to = jump_cols[0].number_input(
+                "Jump to packet #", min_value=packet_ids.start,
+                max_value=max(packet_ids.stop - 1, packet_ids.start), value=packet_ids.start,
+            )
+            if jump_cols[1].button("Go"):
+                position = worker.packet_position(int(jump_to), sort_order)
+                st.session_state.packet_page = position // page_size + 1
+                st.session_state.selected_packet = int(jump_to)
+            if st.session_state.get("packet_page", 1) > page_count:
+                st.session_state.packet_page = page_count
+            page = st.number_input("Page", min_value=1, max_value=page_count, key="packet_page")
+
+            page_ids = worker.packet_page((page - 1) * page_size, page_size, sort_order)
+            st.dataframe(
+                [worker.packet_row(packet_id) for packet_id in page_ids],
+                hide_index=True,
+                use_container_width=True,
+            )
+            st.caption(f"Page {page} of {page_count} ({total_packets} packets)")
+
+            selected = st.session_state.get("selected_packet")
+            selected_packet_id = st.selectbox(
                 "Select a Packet to View Details",
-                range(len(packet_summaries)),
-                format_func=lambda x: packet_summaries[x]
-                if x < len(packet_summaries)
-                else "No Packets",
+                page_ids,
+                index=page_ids.index(selected) if selected in page_ids else 0,
+                format_func=worker.packet_summary,
             )
         else:
             st.info("No packets captured yet.")
 
-        pcap_file = st.file_uploader("Upload a PCAP File:", type=["pcap"])
-        if pcap_file:
+        with st.expander("Payload Search"):
+            pattern_text = st.text_area(
+                "Patterns (one per line; hex:160301 for bytes):", key="payload_patterns"
+            )
+            ignore_case = st.checkbox("Ignore case", key="payload_ignore_case")
+            if st.button("Search Payloads"):
+                lines = [line.strip() for line in pattern_text.splitlines() if line.strip()]
+                if lines:
+                    from payload_search import parse_pattern
+
+                    results = st.empty()
+                    rows = []
+                    try:
+                        patterns = {parse_pattern(line): line for line in lines}
+                        for match in worker.search_payloads(list(patterns), ignore_case):
+                            rows.append({
+                                "No.": match.packet_id,
+                                "Offset": match.offset,
+                                "Pattern": patterns[match.pattern],
+                                "Summary": worker.packet_summary(match.packet_id),
+                            })
+                            if len(rows) % 100 == 0:
+                                results.dataframe(rows, hide_index=True, use_container_width=True)
+                            if len(rows) >= SEARCH_RESULT_LIMIT:
+                                break
+                        results.dataframe(rows, hide_index=True, use_container_width=True)
+                        more = " (first matches only)" if len(rows) >= SEARCH_RESULT_LIMIT else ""
+                        st.caption(f"{len(rows)} matches{more}")
+                    except ValueError as e:
+                        st.error(f"Invalid pattern: {e}")
+                else:
+                    st.warning("Please enter at least one pattern.")
+
+        pcap_file = st.file_uploader("Upload a PCAP File:", type=["pcap", "pcapng"])
+        pcap_path = st.text_input("Or open a PCAP File on this host (Enter Path):")
+        pcap_source = pcap_file or pcap_path or None
+        pcap_key = (pcap_file.name, pcap_file.size) if pcap_file else pcap_path
+        if pcap_source and st.session_state.get("loaded_pcap") != pcap_key:
+            progress_bar = st.progress(0)
+            progress_text = st.empty()
+
+            def show_progress(progress):
+                fraction = progress["bytes_read"] / max(progress["total_bytes"], 1)
+                progress_bar.progress(min(int(fraction * 100), 100))
+                top = ", ".join(
+                    f"{' / '.join(path)}: {packets}" for path, packets, _ in worker.protocol_stats.top(3, depth=3)
+                )
+                progress_text.caption(f"{progress['packets']} packets read ({top})")
+
             try:
-                worker.load_pcap(pcap_file)
+                worker.load_pcap(pcap_source, progress_callback=show_progress)
+                st.session_state.loaded_pcap = pcap_key
                 st.success("PCAP file loaded successfully.")
             except Exception as e:
                 st.error(f"Error loading PCAP: {e}")
@@ -72,9 +272,11 @@ def packet_tracer_tab():
 
     with col2:
         st.markdown("### Packet Details")
-        if captured_packets and selected_packet_index < len(captured_packets):
-            _, packet = captured_packets[selected_packet_index]
-            if isinstance(packet, scapy_packet.Packet):
+        if selected_packet_id is not None:
+            _, packet = worker.get_packet(selected_packet_id)
+            from scapy.packet import Packet
+
+            if isinstance(packet, Packet):
                 st.code(packet.show(dump=True), language="text")
             else:
                 st.warning("Unable to display packet details.")
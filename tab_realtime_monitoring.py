@@ -1,31 +1,50 @@
 import streamlit as st
-import psutil
 import time
-import socket
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
+import metrics
+from downsample import downsample_array, resolution
+from latency_prober import DEFAULT_TARGETS, shared_prober
+from rate_sampler import RECV_MBPS, SENT_MBPS, TIME, TOTAL, shared_sampler
+
+LATENCY_COLORS = ["green", "red", "purple", "brown", "gray"]
+CHART_WIDTH = 1000
 
 def show_realtime_monitoring():
-    if "upload_data" not in st.session_state:
-        st.session_state.upload_data = []
-    if "download_data" not in st.session_state:
-        st.session_state.download_data = []
-    if "latency_data" not in st.session_state:
-        st.session_state.latency_data = []
-    if "time_data" not in st.session_state:
-        st.session_state.time_data = []
-        st.session_state.counter = 0
     if "monitoring" not in st.session_state:
         st.session_state.monitoring = False
 
-    col1, col2, col3 = st.columns(3)
+    sampler = shared_sampler()
+    interface = st.selectbox("Interface:", sampler.interfaces())
+    targets = st.text_input(
+        "Latency targets (host:port or dns://host:port, comma separated):", ", ".join(DEFAULT_TARGETS)
+    )
+    try:
+        prober = shared_prober([t.strip() for t in targets.split(",") if t.strip()])
+    except ValueError as e:
+        st.error(f"Invalid latency target: {e}")
+        prober = shared_prober()
+
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        upload_placeholder = st.metric("Upload Traffic Since Last Boot", "-- Mbps")
+        upload_placeholder = st.empty()
+        upload_placeholder.metric("Upload Rate", "-- Mbps")
     with col2:
-        download_placeholder = st.metric("Download Traffic Since Last Boot", "-- Mbps")
+        download_placeholder = st.empty()
+        download_placeholder.metric("Download Rate", "-- Mbps")
     with col3:
-        latency_placeholder = st.metric("Latency", "-- ms")
+        latency_placeholder = st.empty()
+        latency_placeholder.metric("Latency", "-- ms")
+    with col4:
+        jitter_placeholder = st.empty()
+        jitter_placeholder.metric("Jitter / p99", "-- ms")
+
+    window = st.slider("Window (s):", min_value=30, max_value=600, value=60, step=30)
+    max_points, _ = resolution(window, CHART_WIDTH)
 
     plot_placeholder = st.empty()
+    targets_placeholder = st.empty()
 
     col1, col2 = st.columns([1, 1])
     with col1:
@@ -36,40 +55,35 @@ def show_realtime_monitoring():
             st.session_state.monitoring = False
 
     while st.session_state.monitoring:
-        io_counters = psutil.net_io_counters(pernic=False)
-        upload_speed = io_counters.bytes_sent / (1024 * 1024) 
-        download_speed = io_counters.bytes_recv / (1024 * 1024) 
-
-        try:
-            start_time = time.time()
-            socket.create_connection(("8.8.8.8", 53), timeout=1)
-            latency = (time.time() - start_time) * 1000  
-        except Exception:
-            latency = float('inf')
-
-        st.session_state.upload_data.append(upload_speed)
-        st.session_state.download_data.append(download_speed)
-        st.session_state.latency_data.append(latency)
-        st.session_state.time_data.append(st.session_state.counter)
-        st.session_state.counter += 1
-
-        if len(st.session_state.time_data) > 60:
-            st.session_state.upload_data.pop(0)
-            st.session_state.download_data.pop(0)
-            st.session_state.latency_data.pop(0)
-            st.session_state.time_data.pop(0)
-
-        upload_placeholder.metric("Upload Traffic Since Last Boot", f"{upload_speed:.2f} Mbps")
-        download_placeholder.metric("Download Traffic Since Last Boot", f"{download_speed:.2f} Mbps")
+        samples = sampler.snapshot(interface or TOTAL, seconds=window)
+
+        summary = prober.summary()
+        rtts = [stats["last_rtt"] for stats in summary.values() if stats["last_rtt"] is not None]
+        latency = sum(rtts) / len(rtts) if rtts else float('inf')
+
+        if len(samples):
+            upload_placeholder.metric("Upload Rate", f"{samples[-1, SENT_MBPS]:.2f} Mbps")
+            download_placeholder.metric("Download Rate", f"{samples[-1, RECV_MBPS]:.2f} Mbps")
         latency_placeholder.metric("Latency", f"{latency:.2f} ms")
+        jitters = [stats["jitter"] for stats in summary.values() if stats["jitter"] is not None]
+        tails = [stats["p99_rtt"] for stats in summary.values() if stats["p99_rtt"] is not None]
+        if jitters and tails:
+            jitter_placeholder.metric("Jitter / p99", f"{max(jitters):.2f} / {max(tails):.2f} ms")
+
+        now = time.time()
+        samples = downsample_array(samples, TIME, [SENT_MBPS, RECV_MBPS], max_points)
+        sample_age = samples[:, TIME] - now
 
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=st.session_state.time_data, y=st.session_state.upload_data,
-                                 mode="lines+markers", name="Upload (Mbps)", line=dict(color="blue")))
-        fig.add_trace(go.Scatter(x=st.session_state.time_data, y=st.session_state.download_data,
-                                 mode="lines+markers", name="Download (Mbps)", line=dict(color="orange")))
-        fig.add_trace(go.Scatter(x=st.session_state.time_data, y=st.session_state.latency_data,
-                                 mode="lines+markers", name="Latency (ms)", line=dict(color="green")))
+        fig.add_trace(go.Scatter(x=sample_age, y=samples[:, SENT_MBPS],
+                                 mode="lines", name="Upload (Mbps)", line=dict(color="blue")))
+        fig.add_trace(go.Scatter(x=sample_age, y=samples[:, RECV_MBPS],
+                                 mode="lines", name="Download (Mbps)", line=dict(color="orange")))
+        for name, color in zip(summary, LATENCY_COLORS):
+            probes = np.array(prober.samples(name, seconds=window), dtype=float).reshape(-1, 2)
+            probes = downsample_array(probes, 0, [1], max_points)
+            fig.add_trace(go.Scatter(x=probes[:, 0] - now, y=probes[:, 1],
+                                     mode="lines+markers", name=f"{name} (ms)", line=dict(color=color)))
 
         fig.update_layout(
             title="Real-Time Monitoring",
@@ -79,11 +93,16 @@ def show_realtime_monitoring():
             template="plotly_white",
             yaxis=dict(
                 title="Mbps / ms",
-                tickformat=".2f"  
+                tickformat=".2f"
             )
         )
 
-        plot_placeholder.plotly_chart(fig, use_container_width=True)
+        with metrics.CHART_SECONDS.labels("realtime").time():
+            plot_placeholder.plotly_chart(fig, use_container_width=True)
+        targets_placeholder.dataframe(
+            pd.DataFrame.from_dict(summary, orient="index").rename_axis("Target"),
+            use_container_width=True,
+        )
 
         time.sleep(1)
 
@@ -1,7 +1,10 @@
 import streamlit as st
 import plotly.graph_objects as go
-from worker_speed_test import SpeedTestWorker 
-import numpy as np
+import threading
+import metrics
+from server_catalog import shared_catalog
+from throughput_engine import DOWNLOAD, UPLOAD
+from worker_speed_test import SpeedTestWorker
 
 def speedtest():
     st.write("Test the network's performance and visualize real-time speed data.")
@@ -31,39 +34,83 @@ def speedtest():
     )
     plot_placeholder = st.empty()
 
+    catalog = shared_catalog()
+    servers = {server['id']: server for server in catalog.servers()}
+    if servers:
+        def server_label(server_id):
+            if server_id is None:
+                return "Automatic (lowest latency)"
+            server = servers[server_id]
+            latency = f", {server['latency']:.0f} ms" if server.get('latency') is not None else ""
+            return f"{server['sponsor']} - {server['name']} ({server['country']}{latency})"
+
+        options = [None] + list(servers)
+        pinned = catalog.state['pinned'] if catalog.state['pinned'] in servers else None
+        choice = st.selectbox("Server:", options, index=options.index(pinned), format_func=server_label)
+        if choice != pinned:
+            catalog.pin(choice)
+
     start_button = st.button("Start Speed Test", key="start_test")
 
     if start_button:
         worker = SpeedTestWorker()
+        errors = []
+
+        def run_test():
+            try:
+                worker.start_test()
+            except Exception as e:
+                metrics.THREAD_ERRORS.labels("speedtest").inc()
+                errors.append(e)
 
         status_placeholder.info("Testing... Please wait.")
         isp_placeholder.text("ISP: --, Server: --")
         progress_bar.progress(0)
 
-        worker.start_test()  
-
-        x_data = list(range(len(worker.download_speeds)))
-        download_data = worker.download_speeds
-        upload_data = worker.upload_speeds
+        test_thread = threading.Thread(target=run_test, daemon=True)
+        test_thread.start()
 
-        status_placeholder.success("Test Completed!")
-        isp_placeholder.text(f"ISP: {worker.isp}, Server: {worker.server_name} ({worker.server_country})")
-        download_placeholder.metric("Download Speed", f"{np.mean(download_data):.2f} Mbps")
-        upload_placeholder.metric("Upload Speed", f"{np.mean(upload_data):.2f} Mbps")
-        ping_placeholder.metric("Ping", f"{worker.ping_value:.2f} ms") 
-        jitter_placeholder.metric("Jitter", f"{worker.jitter:.2f} ms")  
+        drawn = 0
+        while test_thread.is_alive() or drawn < len(worker.live_samples):
+            test_thread.join(0.25)
+            samples = worker.live_samples[:]
+            if len(samples) == drawn:
+                continue
+            drawn = len(samples)
 
-        for i, (download_speed, upload_speed) in enumerate(zip(download_data, upload_data)):
-            progress_bar.progress(int((i + 1) / len(download_data) * 100))
+            for trace, direction in ((0, DOWNLOAD), (1, UPLOAD)):
+                points = [sample for phase, sample in samples if phase == direction]
+                fig.data[trace].x = [sample.elapsed for sample in points]
+                fig.data[trace].y = [sample.mbps for sample in points]
 
-            fig.data[0].x = x_data[: i + 1]
-            fig.data[0].y = download_data[: i + 1]
-            fig.data[1].x = x_data[: i + 1]
-            fig.data[1].y = upload_data[: i + 1]
-
-            max_y = max(max(download_data[: i + 1]), max(upload_data[: i + 1]), 5) + 5
+            max_y = max([sample.mbps for _, sample in samples] + [5]) + 5
             fig.update_yaxes(range=[0, max_y])
+            with metrics.CHART_SECONDS.labels("speedtest").time():
+                plot_placeholder.plotly_chart(fig, use_container_width=True)
+            progress_bar.progress(min(worker.get_progress(), 100))
+            if worker.server_name:
+                isp_placeholder.text(f"ISP: {worker.isp}, Server: {worker.server_name} ({worker.server_country})")
+
+        if errors:
+            status_placeholder.error(f"Speed test failed: {errors[0]}")
+            return
 
-            plot_placeholder.plotly_chart(fig, use_container_width=True)
+        status_placeholder.success("Test Completed!")
+        isp_placeholder.text(f"ISP: {worker.isp}, Server: {worker.server_name} ({worker.server_country})")
+        download_placeholder.metric("Download Speed", f"{worker.download_speed:.2f} Mbps")
+        upload_placeholder.metric("Upload Speed", f"{worker.upload_speed:.2f} Mbps")
+        latency = worker.get_latency_summary()
+        if worker.ping_value is None:
+            # Every probe was lost: there is no RTT or jitter to show.
+            ping_placeholder.metric("Ping", f"-- ({latency['loss_rate']:.0%} lost)")
+            jitter_placeholder.metric("Jitter", "--")
+        else:
+            ping_placeholder.metric("Ping", f"{worker.ping_value:.2f} ms")
+            jitter_placeholder.metric("Jitter", f"{worker.jitter:.2f} ms")
+        if latency["received"]:
+            st.caption(
+                f"Ping p50 {latency['p50_rtt']:.1f} ms, p95 {latency['p95_rtt']:.1f} ms, "
+                f"p99 {latency['p99_rtt']:.1f} ms, {latency['loss_rate']:.0%} lost"
+            )
 
         progress_bar.progress(100)
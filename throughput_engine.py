@@ -0,0 +1,170 @@
+import http.client
+import itertools
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+ThroughputSample = namedtuple("ThroughputSample", "elapsed mbps warmup")
+ThroughputResult = namedtuple("ThroughputResult", "mbps bytes seconds samples stopped_early")
+
+DOWNLOAD, UPLOAD = "download", "upload"
+CHUNK_SIZE = 64 * 1024
+UPLOAD_REQUEST_BYTES = 8 * 1024 * 1024
+
+
+def _connection(url, timeout):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return connection_class(parts.netloc, timeout=timeout), path
+
+
+class ThroughputTest:
+    """Measure download or upload throughput over several parallel HTTP streams.
+
+    Each stream keeps one connection open and repeats its request until the
+    test stops, adding transferred bytes to its own counter. A sampler turns
+    the counters into one throughput sample per interval and hands it to
+    on_sample. Samples inside the warm-up period (TCP slow start) are
+    reported but left out of the estimate. The test ends after duration
+    seconds, or earlier once the running estimate has moved less than
+    tolerance (relative) over stable_intervals consecutive samples.
+    """
+
+    def __init__(self, direction, urls, streams=4, interval=0.25, duration=10.0, warmup=1.0,
+                 tolerance=0.02, stable_intervals=8, on_sample=None, timeout=10,
+                 upload_bytes=UPLOAD_REQUEST_BYTES):
+        if direction not in (DOWNLOAD, UPLOAD):
+            raise ValueError(f"Unknown direction: {direction}")
+        self.direction = direction
+        self.urls = list(urls)
+        self.streams = streams
+        self.interval = interval
+        self.duration = duration
+        self.warmup = warmup
+        self.tolerance = tolerance
+        self.stable_intervals = stable_intervals
+        self.on_sample = on_sample
+        self.timeout = timeout
+        self.upload_bytes = upload_bytes
+        self.counters = [0] * streams
+        self.errors = []
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """Run the test and return a ThroughputResult; blocks until it finishes."""
+        target = self._download if self.direction == DOWNLOAD else self._upload
+        urls = itertools.cycle(self.urls)
+        threads = [
+            threading.Thread(target=self._stream, args=(target, index, next(urls)), daemon=True)
+            for index in range(self.streams)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            result = self._sample()
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(self.timeout)
+        if not result.bytes and self.errors:
+            raise self.errors[0]
+        return result
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _sample(self):
+        start = last_time = time.monotonic()
+        next_sample = start + self.interval
+        last_total = 0
+        warm_total, warm_time = 0, start
+        warmed_up = False
+        samples = []
+        estimates = []
+        while True:
+            self.stop_event.wait(max(next_sample - time.monotonic(), 0))
+            next_sample += self.interval
+            now = time.monotonic()
+            elapsed = now - start
+            total = sum(self.counters)
+            sample = ThroughputSample(
+                elapsed, (total - last_total) * 8 / max(now - last_time, 1e-9) / 1e6, elapsed <= self.warmup
+            )
+            samples.append(sample)
+            if self.on_sample:
+                self.on_sample(sample)
+            if not sample.warmup:
+                if not warmed_up:
+                    # The measured window starts where warm-up ended.
+                    warm_total, warm_time, warmed_up = last_total, last_time, True
+                estimates.append((total - warm_total) * 8 / (now - warm_time) / 1e6)
+            last_total, last_time = total, now
+            stable = self._stable(estimates)
+            if self.stop_event.is_set() or elapsed >= self.duration or stable:
+                break
+
+        seconds = now - warm_time
+        measured = total - warm_total
+        return ThroughputResult(measured * 8 / seconds / 1e6, measured, seconds, samples, stable)
+
+    def _stable(self, estimates):
+        if len(estimates) < self.stable_intervals:
+            return False
+        window = estimates[-self.stable_intervals:]
+        reference = window[-1]
+        return reference > 0 and (max(window) - min(window)) / reference <= self.tolerance
+
+    def _stream(self, target, index, url):
+        while not self.stop_event.is_set():
+            connection, path = _connection(url, self.timeout)
+            try:
+                target(connection, path, index)
+            except (OSError, http.client.HTTPException) as e:
+                self.errors.append(e)
+                # Back off briefly instead of spinning on a refused connection.
+                self.stop_event.wait(self.interval)
+            finally:
+                connection.close()
+
+    def _download(self, connection, path, index):
+        while not self.stop_event.is_set():
+            connection.request("GET", path, headers={"Cache-Control": "no-cache"})
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise http.client.HTTPException(f"HTTP {response.status} for {path}")
+            while not self.stop_event.is_set():
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.counters[index] += len(chunk)
+            if self.stop_event.is_set():
+                return
+            response.close()
+
+    def _upload(self, connection, path, index):
+        payload = b"0" * CHUNK_SIZE
+
+        def body():
+            sent = 0
+            while sent < self.upload_bytes and not self.stop_event.is_set():
+                chunk = payload[:self.upload_bytes - sent]
+                yield chunk
+                sent += len(chunk)
+                self.counters[index] += len(chunk)
+
+        while not self.stop_event.is_set():
+            connection.request(
+                "POST", path, body=body(),
+                headers={"Content-Length": str(self.upload_bytes), "Content-Type": "application/octet-stream"},
+            )
+            if self.stop_event.is_set():
+                return
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                raise http.client.HTTPException(f"HTTP {response.status} for {path}")
+
@@ -1,132 +1,709 @@
-import scapy.all as scapy
+import bisect
 import psutil
-from collections import Counter
 import threading
 import queue
+import time
+import itertools
+import os
+import re
+
+import metrics
+from capture_engine import ProcessCaptureEngine, RawSniffer
+from flow_table import FlowTable
+from packet_decode import LRUCache, PacketHeaders, parse_headers, summarize
+from packet_index import And, Cidr, Field, PacketIndex, Range
+from packet_store import PacketRecord, PacketStore
+from pcap_index import PcapIndex
+from pcap_io import LINKTYPE_ETHERNET, RotatingPcapWriter, open_pcap_buffer, scan_pcap, write_pcap
+from protocol_stats import ProtocolStats
+
+FRAMES_CAPTURED = metrics.counter("netmon_frames_captured_total", "Frames handed to the packet worker", ["interface"])
+BYTES_CAPTURED = metrics.counter("netmon_bytes_captured_total", "Wire bytes of captured frames", ["interface"])
+FRAMES_DROPPED = metrics.counter(
+    "netmon_frames_dropped_total", "Frames lost before reaching the packet worker", ["interface", "reason"]
+)
+EVENTS_DROPPED = metrics.counter("netmon_packet_events_dropped_total", "Oldest packet events discarded from a full queue")
+EVENT_QUEUE_DEPTH = metrics.gauge("netmon_packet_event_queue_depth", "Packet events waiting to be drained")
+DISSECTION_SECONDS = metrics.histogram("netmon_dissection_seconds", "Time to dissect one packet with scapy")
+FILTER_SECONDS = metrics.histogram("netmon_filter_seconds", "Time to run apply_filters, including dissection")
+
+
+# Largest-first sort keys pack (maximum length - wire length, packet id) into one int.
+LENGTH_KEY_ID_BITS = 40
+LENGTH_KEY_ID_MASK = (1 << LENGTH_KEY_ID_BITS) - 1
+
+
+def _length_key(wirelen, packet_id):
+    return ((0xFFFFFFFF - wirelen) << LENGTH_KEY_ID_BITS) | packet_id
 
 
 class PacketWorker:
-    def __init__(self):
-        self.packets = [] 
+    def __init__(self, max_packets=500000, max_bytes=256 * 1024 * 1024,
+                 eviction="oldest", spill_dir=None, dissection_cache_size=256, max_events=10000):
+        self.packets = PacketStore(
+            max_packets=max_packets, max_bytes=max_bytes, eviction=eviction, spill_dir=spill_dir
+        )
+        self.dissection_cache = LRUCache(dissection_cache_size)
+        self.row_cache = LRUCache(4096)
+        # (loaded file, store first id, next id covered, sort keys) for the largest-first list.
+        self.length_order = None
+        self.index = PacketIndex(self.packets)
+        self.flows = FlowTable()
+        self.pcap_index = None
+        # A reopened file whose records are counted into the index, flows and
+        # protocol statistics on first use (see _count_loaded_file).
+        self.uncounted_file = None
+        self.count_lock = threading.Lock()
+        self.recording = None
+        self.keep_in_memory = True
+        self.pcap_writers = {}
+        self.writers_lock = threading.Lock()
+        self.capture_engine = None
+        self.capture_baselines = {}
         self.selected_interfaces = []
         self.capture_threads = []
         self.stop_capture_event = threading.Event()
-        self.packet_queue = queue.Queue()
-        self.protocol_stats = Counter()
+        # (interface, packet id or error message) events for the UI; the oldest are
+        # dropped when nobody drains them.
+        self.packet_queue = queue.Queue(max_events)
+        self.protocol_stats = ProtocolStats()
+        self.capture_filter = None
+        self.capture_linktypes = None
+        # interface -> (frames, bytes) counters, labeled once rather than per frame.
+        self.capture_counters = {}
+        self.capture_stats = {}
+        self.load_progress = {}
 
     def load_interfaces(self):
         """Load available network interfaces."""
         return list(psutil.net_if_addrs().keys())
 
-    def load_pcap(self, file_path):
-        """Load packets from a PCAP file."""
-        try:
-            self.packets.clear()
-            self.protocol_stats.clear()
+    def load_pcap(self, file_path, progress_callback=None, progress_interval=0.25, preload=10000):
+        """Stream packets from a PCAP/PCAPNG file into the bounded packet store.
 
-            packets = scapy.rdpcap(file_path)
+        The file is memory-mapped and scanned record by record, so memory stays
+        bounded by the store budget whatever the file size. progress_callback,
+        if given, receives the load_progress dict every progress_interval seconds
+        while statistics and indexes are built on the fly.
 
-            self.packets = [
-                (None, packet) for packet in packets if isinstance(packet, scapy.packet.Packet)
-            ]
+        Files given by path get a sidecar offset index (see pcap_index). When a
+        valid one already exists, reopening only maps it and copies the last
+        `preload` frames into the store; every other frame is read from the file
+        when it is needed, and the query index, protocol statistics and flows
+        are built on the first filter or statistics request. Either way they
+        cover every record, including those the store has evicted.
+        """
+        try:
+            self._reset_packets()
 
-            if not self.packets:
-                raise Exception("No valid packets found in the PCAP file.")
+            if isinstance(file_path, (str, os.PathLike)):
+                pcap_index = PcapIndex.open(file_path)
+                if pcap_index is not None:
+                    self._load_indexed(pcap_index, progress_callback, progress_interval, preload)
+                else:
+                    pcap_index = PcapIndex(file_path)
+                    self.index.retain(pcap_index.timestamps)
+                    self._load_frames(file_path, pcap_index, progress_callback, progress_interval)
+                    pcap_index.save()
+                self.pcap_index = pcap_index
+            else:
+                self._load_frames(file_path, None, progress_callback, progress_interval)
 
-            self.update_protocol_statistics()
+            if not self.packet_count():
+                raise Exception("No valid packets found in the PCAP file.")
         except Exception as e:
             raise Exception(f"Failed to load PCAP: {e}")
 
+    def _reset_packets(self, start_id=0):
+        self.packets.clear(start_id)
+        self.protocol_stats.clear()
+        self.dissection_cache.clear()
+        self.row_cache.clear()
+        self.length_order = None
+        self.index.clear()
+        self.flows.clear()
+        self.uncounted_file = None
+        if self.pcap_index is not None:
+            self.pcap_index.close()
+            self.pcap_index = None
+
+    def _load_frames(self, source, pcap_index, progress_callback, progress_interval):
+        with open_pcap_buffer(source) as buffer:
+            self.load_progress = {
+                "bytes_read": 0, "total_bytes": len(buffer), "packets": 0, "done": False,
+            }
+            next_report = time.time() + progress_interval
+            for count, frame in enumerate(scan_pcap(buffer), 1):
+                self.store_frame(None, frame.data, frame.timestamp, frame.wirelen, frame.linktype)
+                if pcap_index is not None:
+                    pcap_index.add(frame)
+                if count % 1024 == 0:
+                    self.load_progress["bytes_read"] = frame.offset
+                    self.load_progress["packets"] = count
+                    if progress_callback and time.time() >= next_report:
+                        progress_callback(self.load_progress)
+                        next_report = time.time() + progress_interval
+                # Drop the slice so the memory map can be closed afterwards.
+                del frame
+            self.load_progress.update(
+                bytes_read=self.load_progress["total_bytes"], packets=self.packets.next_id, done=True
+            )
+            if progress_callback:
+                progress_callback(self.load_progress)
 
+    def _load_indexed(self, pcap_index, progress_callback, progress_interval, preload):
+        first = max(len(pcap_index) - min(preload, self.packets.max_packets), 0)
+        self.packets.clear(first)
+        self.index.clear()
+        self.index.retain(pcap_index.timestamps)
+        with open_pcap_buffer(pcap_index.pcap_path) as buffer:
+            view = memoryview(buffer)
+            data = None
+            for number in range(first, len(pcap_index)):
+                start = pcap_index.data_offsets[number]
+                data = view[start:start + pcap_index.caplens[number]]
+                linktype = pcap_index.linktypes[number]
+                self.packets.append(
+                    None, data, pcap_index.timestamps[number], wirelen=pcap_index.wirelens[number],
+                    linktype=linktype, headers=parse_headers(data, linktype),
+                )
+            del data
+            view.release()
+            self.load_progress = {
+                "bytes_read": len(buffer), "total_bytes": len(buffer), "packets": len(pcap_index),
+                "done": True,
+            }
+        self.uncounted_file = pcap_index
+        if progress_callback:
+            progress_callback(self.load_progress)
 
-    def save_pcap(self, file_path, interface=None):
-        """Save captured packets to a PCAP file."""
+    def _count_loaded_file(self):
+        """Count every record of a reopened file, before any packet that arrives after it."""
+        with self.count_lock:
+            pcap_index = self.uncounted_file
+            if pcap_index is None:
+                return
+            with open_pcap_buffer(pcap_index.pcap_path) as buffer:
+                view = memoryview(buffer)
+                for number in range(len(pcap_index)):
+                    start = pcap_index.data_offsets[number]
+                    linktype = pcap_index.linktypes[number]
+                    headers = parse_headers(view[start:start + pcap_index.caplens[number]], linktype)
+                    self._count_packet(number, None, linktype, pcap_index.timestamps[number],
+                                       pcap_index.wirelens[number], headers)
+                view.release()
+            self.uncounted_file = None
+
+    def store_frame(self, interface, data, timestamp, wirelen=None, linktype=LINKTYPE_ETHERNET,
+                    headers=None):
+        """Store a raw frame with its cheaply pre-parsed headers and return its id."""
+        if headers is None:
+            headers = parse_headers(data, linktype)
+        if self.uncounted_file is not None:
+            self._count_loaded_file()
+        packet_id = self.packets.append(
+            interface, data, timestamp, wirelen=wirelen, linktype=linktype, headers=headers
+        )
+        self._count_packet(packet_id, interface, linktype, timestamp, wirelen or len(data), headers)
+        return packet_id
+
+    def _count_packet(self, packet_id, interface, linktype, timestamp, wirelen, headers):
+        """Add a packet to the query index, flow table and protocol statistics."""
+        self.index.add(packet_id, interface, linktype, timestamp, headers)
+        self.flows.update(headers, wirelen, timestamp)
+        self.protocol_stats.add(headers, wirelen, timestamp, linktype)
+
+    def _get_record(self, packet_id, data=True):
+        """Return a PacketRecord from the store, or from the loaded file via its index."""
         try:
-            if interface:
-                valid_packets = [
-                    packet for iface, packet in self.packets 
-                    if iface == interface and isinstance(packet, scapy.packet.Packet)
-                ]
-            else:
-                valid_packets = [
-                    packet for _, packet in self.packets if isinstance(packet, scapy.packet.Packet)
-                ]
+            return self.packets.get(packet_id, data)
+        except IndexError:
+            if self.pcap_index is None or not 0 <= packet_id < len(self.pcap_index):
+                raise
+        timestamp, raw, wirelen, linktype = self.pcap_index.read(packet_id)
+        return PacketRecord(packet_id, None, linktype, timestamp, wirelen, parse_headers(raw, linktype), raw)
+
+    def _dissect(self, packet_id):
+        # scapy takes seconds to import; only pay for it once a packet is inspected.
+        import scapy.all as scapy
+
+        record = self._get_record(packet_id)
+        layer = scapy.conf.l2types.num2layer.get(record.linktype, scapy.conf.raw_layer)
+        with DISSECTION_SECONDS.time():
+            packet = layer(record.data)
+        packet.time = record.timestamp
+        return record.interface, packet
+
+    def get_packet(self, packet_id):
+        """Return (interface, scapy packet), dissecting on first use and caching the result."""
+        return self.dissection_cache.get(packet_id, self._dissect)
+
+    def _packet_row(self, packet_id):
+        record = self._get_record(packet_id, data=False)
+        return {
+            "No.": packet_id,
+            "Time": record.timestamp,
+            "Interface": record.interface,
+            "Length": record.wirelen,
+            "Summary": summarize(record.headers, record.linktype),
+        }
+
+    def packet_row(self, packet_id):
+        """Return the packet-list row of a packet, cached so reruns only build new rows."""
+        return self.row_cache.get(packet_id, self._packet_row)
+
+    def packet_summary(self, packet_id):
+        """Return a one-line summary built from pre-parsed headers, without dissecting."""
+        row = self.packet_row(packet_id)
+        return f"[{row['Interface']}] {row['Summary']}"
+
+    def packet_page(self, offset=0, limit=50, order="oldest"):
+        """Return the packet ids of one page of the packet list.
+
+        order is "oldest", "newest" or "largest". Only the largest-first order
+        needs a sort, which is kept between calls: new packets are merged in
+        and evicted ones dropped.
+        """
+        packet_ids = self.packet_ids()
+        if order == "newest":
+            end = len(packet_ids) - offset
+            return list(packet_ids[max(end - limit, 0):max(end, 0)])[::-1]
+        if order == "largest":
+            keys = self._length_keys()
+            return [key & LENGTH_KEY_ID_MASK for key in keys[offset:offset + limit]]
+        return list(packet_ids[offset:offset + limit])
+
+    def packet_position(self, packet_id, order="oldest"):
+        """Return the offset of a packet in the packet list in the given order."""
+        if order == "largest":
+            wirelen = self._get_record(packet_id, data=False).wirelen
+            return bisect.bisect_left(self._length_keys(), _length_key(wirelen, packet_id))
+        packet_ids = self.packet_ids()
+        position = packet_id - packet_ids.start
+        return len(packet_ids) - 1 - position if order == "newest" else position
 
-            if not valid_packets:
+    def _length_keys(self):
+        """Return sort keys of every packet, largest first, updating the cached order."""
+        source = id(self.pcap_index)
+        stop_id = self.packets.next_id
+        store_first = self.packets.first_id
+        file_count = len(self.pcap_index) if self.pcap_index is not None else 0
+        cached = self.length_order
+        if cached is None or cached[0] != source or cached[2] > stop_id:
+            cached = (source, 0, 0, [])
+        _, first_id, next_id, keys = cached
+
+        if store_first > first_id:
+            # Drop evicted packets; those of a loaded file stay readable from it.
+            keys = [
+                key for key in keys
+                if (key & LENGTH_KEY_ID_MASK) < file_count or (key & LENGTH_KEY_ID_MASK) >= store_first
+            ]
+        new_keys = [
+            _length_key(self.pcap_index.wirelens[packet_id], packet_id)
+            for packet_id in range(next_id, min(file_count, store_first))
+        ]
+        new_keys.extend(
+            _length_key(record.wirelen, record.id)
+            for record in self.packets.records(max(next_id, store_first), stop_id, data=False)
+        )
+        if new_keys:
+            new_keys.sort()
+            # Two sorted runs: the sort only merges them.
+            keys = keys + new_keys
+            keys.sort()
+        self.length_order = (source, store_first, max(next_id, stop_id), keys)
+        return keys
+
+    def packet_ids(self):
+        """Return the range of packet ids available, including file records outside the store."""
+        first_id = 0 if self.pcap_index is not None else self.packets.first_id
+        return range(first_id, self.packets.next_id)
+
+    def packet_count(self):
+        return len(self.packet_ids())
+
+    def time_slice(self, start_time=None, end_time=None):
+        """Return the ids of packets with start_time <= timestamp <= end_time, in id order.
+
+        Records of a loaded file are found by binary search in its sidecar index.
+        """
+        file_count = len(self.pcap_index) if self.pcap_index is not None else 0
+        file_ids = self.pcap_index.time_range(start_time, end_time) if file_count else []
+        if start_time is None and end_time is None:
+            store_ids = range(max(self.packets.first_id, file_count), self.packets.next_id)
+        else:
+            _, store_ids = self.query(Range("time", start_time, end_time))
+            store_ids = [packet_id for packet_id in store_ids if packet_id >= file_count]
+        return itertools.chain(file_ids, store_ids)
+
+    def get_store_statistics(self):
+        """Return packet counts and resident memory of the packet store."""
+        return self.packets.stats()
+
+    def save_pcap(self, file_path, interface=None, start_time=None, end_time=None):
+        """Save captured packets to a PCAP file, optionally only a time range."""
+        try:
+            records = (
+                self._get_record(packet_id) for packet_id in self.time_slice(start_time, end_time)
+            )
+            if interface:
+                records = (record for record in records if record.interface == interface)
+            first = next(records, None)
+            if first is None:
                 raise Exception("No valid packets to save.")
-            scapy.wrpcap(file_path, valid_packets)
+
+            with open(file_path, "wb") as f:
+                write_pcap(
+                    f,
+                    (
+                        (record.timestamp, record.data, record.wirelen)
+                        for record in itertools.chain([first], records)
+                        if record.linktype == first.linktype
+                    ),
+                    linktype=first.linktype,
+                )
         except Exception as e:
             raise Exception(f"Failed to save PCAP: {e}")
 
+    def start_capture(self, interfaces, capture_filter=None, timeout=60, record_dir=None,
+                      rotate_bytes=100 * 1024 * 1024, rotate_seconds=3600, max_files=None,
+                      keep_in_memory=True, use_processes=False, linktypes=None):
+        """Start capturing packets on selected interfaces.
 
-    def start_capture(self, interfaces):
-        """Start capturing packets on selected interfaces."""
+        capture_filter is a BPF expression (see capture_filter.build_bpf) that
+        the kernel applies before frames reach Python. linktypes, if given,
+        keeps only frames of those link types, which BPF cannot select on (see
+        capture_filter.link_layer_filter). With record_dir set, frames are also
+        written continuously to rotating PCAP files there (one series per
+        interface); keep_in_memory=False then skips the packet store entirely,
+        for unattended long-running captures.
+
+        With use_processes=True each interface is sniffed and header-decoded in
+        its own process (see capture_engine) instead of a thread, so capture
+        scales with cores instead of sharing the GIL.
+        """
         if not interfaces:
             raise ValueError("No interfaces selected.")
 
         self.selected_interfaces = interfaces
+        self.capture_filter = capture_filter
+        self.capture_linktypes = linktypes
+        if self.capture_engine is not None:
+            self.capture_engine.stop()
+        self.keep_in_memory = keep_in_memory or not record_dir
+        self.close_recordings()
+        self.recording = {
+            "directory": record_dir,
+            "max_bytes": rotate_bytes,
+            "max_seconds": rotate_seconds,
+            "max_files": max_files,
+        } if record_dir else None
         self.stop_capture_event.clear()
         self.capture_threads = []
 
+        if use_processes:
+            for interface in interfaces:
+                self.capture_stats[interface] = self._new_capture_stats(capture_filter)
+                self.capture_baselines[interface] = self._interface_packet_count(interface)
+            self.capture_engine = ProcessCaptureEngine(
+                interfaces,
+                self._ingest_batch,
+                capture_filter=capture_filter,
+                timeout=timeout,
+                on_error=self._report_error,
+            )
+            self.capture_engine.start()
+            return
+
+        self.capture_engine = None
         for interface in interfaces:
-            thread = threading.Thread(target=self.capture_packets, args=(interface,))
+            self.capture_stats[interface] = self._new_capture_stats(capture_filter)
+            thread = threading.Thread(
+                target=self.capture_packets, args=(interface, timeout, capture_filter)
+            )
             thread.daemon = True
             thread.start()
             self.capture_threads.append(thread)
 
-    def capture_packets(self, interface):
-        """Capture packets on a specific interface."""
+    def _pcap_writer(self, interface, linktype):
+        key = (interface, linktype)
+        writer = self.pcap_writers.get(key)
+        if writer is None:
+            with self.writers_lock:
+                writer = self.pcap_writers.get(key)
+                if writer is None:
+                    prefix = re.sub(r"[^\w.-]", "_", str(interface))
+                    if linktype != LINKTYPE_ETHERNET:
+                        prefix += f"-linktype{linktype}"
+                    writer = RotatingPcapWriter(
+                        self.recording["directory"],
+                        prefix=prefix,
+                        linktype=linktype,
+                        max_bytes=self.recording["max_bytes"],
+                        max_seconds=self.recording["max_seconds"],
+                        max_files=self.recording["max_files"],
+                    )
+                    self.pcap_writers[key] = writer
+        return writer
+
+    def _handle_frame(self, interface, data, timestamp, linktype, wirelen=None, headers=None):
+        """Record a captured frame to disk and/or the packet store."""
+        if self.capture_linktypes is not None and linktype not in self.capture_linktypes:
+            return
+        counters = self.capture_counters.get(interface)
+        if counters is None:
+            counters = self.capture_counters[interface] = (
+                FRAMES_CAPTURED.labels(interface), BYTES_CAPTURED.labels(interface)
+            )
+        counters[0].inc()
+        counters[1].inc(wirelen or len(data))
+        if self.recording is not None:
+            self._pcap_writer(interface, linktype).write(timestamp, data, wirelen)
+        if self.keep_in_memory:
+            packet_id = self.store_frame(interface, data, timestamp, wirelen, linktype, headers)
+            self._post_event(interface, packet_id)
+        else:
+            if headers is None:
+                headers = parse_headers(data, linktype)
+            if self.uncounted_file is not None:
+                self._count_loaded_file()
+            self.flows.update(headers, wirelen or len(data), timestamp)
+            self.protocol_stats.add(headers, wirelen or len(data), timestamp, linktype)
+
+    def _post_event(self, interface, event):
         try:
-            def process_packet(packet):
-                """Process a captured packet."""
-                self.packet_queue.put((interface, packet)) 
-                self.packets.append((interface, packet)) 
-                if hasattr(packet, "getlayer"):
-                    layer = packet.getlayer(0) 
-                    if layer and hasattr(layer, "name"):
-                        self.protocol_stats[layer.name] += 1
-
-            scapy.sniff(
-                iface=interface,
-                prn=process_packet,
-                store=False,
-                stop_filter=lambda _: self.stop_capture_event.is_set(),
-                timeout=60,
+            self.packet_queue.put_nowait((interface, event))
+        except queue.Full:
+            try:
+                self.packet_queue.get_nowait()
+            except queue.Empty:
+                pass
+            EVENTS_DROPPED.inc()
+            try:
+                self.packet_queue.put_nowait((interface, event))
+            except queue.Full:
+                pass
+        EVENT_QUEUE_DEPTH.set(self.packet_queue.qsize())
+
+    def _report_error(self, interface, message):
+        metrics.THREAD_ERRORS.labels(f"capture-{interface}").inc()
+        self._post_event(interface, message)
+
+    def drain_events(self, limit=None):
+        """Remove and return queued (interface, packet id or error message) events, oldest first."""
+        events = []
+        while limit is None or len(events) < limit:
+            try:
+                events.append(self.packet_queue.get_nowait())
+            except queue.Empty:
+                break
+        EVENT_QUEUE_DEPTH.set(self.packet_queue.qsize())
+        return events
+
+    def get_recording_statistics(self):
+        """Return files, packets and bytes written by each continuous PCAP writer."""
+        return {
+            interface: {
+                "files": list(writer.files),
+                "packets": writer.packets_written,
+                "bytes": writer.bytes_written,
+            }
+            for (interface, _), writer in list(self.pcap_writers.items())
+        }
+
+    def close_recordings(self):
+        """Flush and close the continuous PCAP writers."""
+        with self.writers_lock:
+            for writer in self.pcap_writers.values():
+                writer.close()
+            self.pcap_writers = {}
+
+    def _new_capture_stats(self, capture_filter):
+        return {
+            "filter": capture_filter,
+            "accepted": 0,
+            "kernel_dropped": 0,
+            "kernel_filtered": None,
+            "interface_packets": 0,
+            "running": False,
+        }
+
+    def _interface_packet_count(self, interface):
+        counters = psutil.net_io_counters(pernic=True).get(interface)
+        return counters.packets_recv + counters.packets_sent if counters else 0
+
+    def _update_capture_stats(self, interface, kernel, baseline):
+        stats = self.capture_stats[interface]
+        self.flows.expire(time.time())
+        if kernel:
+            stats["kernel_dropped"] += kernel[1]
+            FRAMES_DROPPED.labels(interface, "kernel").inc(kernel[1])
+        stats["interface_packets"] = self._interface_packet_count(interface) - baseline
+        # Interface traffic the socket never saw: only the kernel filter explains it, and
+        # only while the capture is alive to see the rest.
+        if stats["filter"] and stats["running"]:
+            stats["kernel_filtered"] = max(
+                stats["interface_packets"] - stats["accepted"] - stats["kernel_dropped"], 0
             )
+        else:
+            stats["kernel_filtered"] = None
+
+    def capture_packets(self, interface, timeout=60, capture_filter=None):
+        """Capture raw frames on a specific interface without dissecting them."""
+        try:
+            sniffer = RawSniffer(interface, capture_filter)
+            stats = self.capture_stats.setdefault(interface, self._new_capture_stats(capture_filter))
+            baseline = self._interface_packet_count(interface)
+            stats["running"] = True
+            try:
+                deadline = time.time() + timeout if timeout else None
+                next_stats_update = time.time() + 1
+                while not self.stop_capture_event.is_set():
+                    now = time.time()
+                    if deadline and now >= deadline:
+                        break
+                    if now >= next_stats_update:
+                        self._update_capture_stats(interface, sniffer.kernel_stats(), baseline)
+                        next_stats_update = now + 1
+                    frame = sniffer.next_frame(0.5)
+                    if frame is None:
+                        continue
+                    stats["accepted"] += 1
+                    data, timestamp, linktype = frame
+                    self._handle_frame(interface, data, timestamp, linktype)
+            finally:
+                stats["running"] = False
+                self._update_capture_stats(interface, sniffer.kernel_stats(), baseline)
+                sniffer.close()
         except Exception as e:
-            self.packet_queue.put((interface, f"Error: {e}"))
+            self._report_error(interface, f"Error: {e}")
+
+    def _ingest_batch(self, interface, batch):
+        """Store a batch of pre-decoded frames handed over by a capture process."""
+        for timestamp, data, wirelen, linktype, headers in batch:
+            self._handle_frame(interface, data, timestamp, linktype, wirelen, PacketHeaders(*headers))
+
+    def get_top_flows(self, k=10, by="bytes"):
+        """Return the k busiest conversations by "bytes" or "packets"."""
+        self._count_loaded_file()
+        return self.flows.top(k, by)
+
+    def get_capture_statistics(self):
+        """Return per-interface accepted, kernel-filtered and kernel-dropped packet counts.
+
+        kernel_filtered is None unless a capture filter is set and the capture
+        is running. In multi-process mode this also includes queue drops and
+        throughput.
+        """
+        if self.capture_engine is not None:
+            for interface, engine_stats in self.capture_engine.stats().items():
+                stats = self.capture_stats[interface]
+                for reason, key in (("kernel", "kernel_dropped"), ("process_queue", "queue_dropped")):
+                    FRAMES_DROPPED.labels(interface, reason).inc(engine_stats[key] - stats.get(key, 0))
+                stats.update(engine_stats)
+                stats["accepted"] = engine_stats["captured"]
+                self._update_capture_stats(interface, None, self.capture_baselines[interface])
+        return {interface: dict(stats) for interface, stats in self.capture_stats.items()}
 
     def stop_packet_capture(self):
         """Stop packet capture."""
         self.stop_capture_event.set()
         for thread in self.capture_threads:
             thread.join(timeout=1)
+        if self.capture_engine is not None:
+            self.capture_engine.stop()
+        for writer in list(self.pcap_writers.values()):
+            writer.flush()
+
+    def apply_filters(self, protocol=None, source_ip=None, destination_ip=None, offset=0, limit=None):
+        """Filter packets based on protocol, source IP, and destination IP.
+
+        IPs may be single addresses or CIDR networks. Returns (interface, packet)
+        tuples for the requested page of matches.
+        """
+        with FILTER_SECONDS.time():
+            return self._apply_filters(protocol, source_ip, destination_ip, offset, limit)
+
+    def _apply_filters(self, protocol, source_ip, destination_ip, offset, limit):
+        terms = []
+        if protocol:
+            terms.append(Field("protocol", protocol))
+        for name, address in (("src", source_ip), ("dst", destination_ip)):
+            if address:
+                terms.append(Cidr(name, address) if "/" in address else Field(name, address))
+        if terms:
+            _, packet_ids = self.query(And(*terms), offset=offset, limit=limit)
+        else:
+            end = None if limit is None else offset + limit
+            packet_ids = self.packet_ids()[offset:end]
+        return [self.get_packet(packet_id) for packet_id in packet_ids]
+
+    def query(self, term, offset=0, limit=None, reverse=False):
+        """Run an indexed query (see packet_index) and return (total, page of packet ids)."""
+        self._count_loaded_file()
+        return self.index.query(term, offset=offset, limit=limit, reverse=reverse)
+
+    def search_payloads(self, patterns, ignore_case=False, workers=None):
+        """Yield a payload_search.Match for every occurrence of any pattern, oldest packet first.
 
-    def apply_filters(self, protocol=None, source_ip=None, destination_ip=None):
-        """Filter packets based on protocol, source IP, and destination IP."""
-        filtered_packets = []
-        for interface, packet in self.packets:
-            if isinstance(packet, scapy.packet.Packet):  
-                match = True
-                if protocol and protocol.upper() not in packet.summary().upper():
-                    match = False
-                if source_ip and hasattr(packet, "src") and packet.src != source_ip:
-                    match = False
-                if destination_ip and hasattr(packet, "dst") and packet.dst != destination_ip:
-                    match = False
-                if match:
-                    filtered_packets.append((interface, packet))
-        return filtered_packets
+        Packets of the loaded file that are no longer in the store are
+        searched in the file itself, in parallel processes.
+        """
+        from payload_search import PayloadMatcher, search_pcap, search_store
+
+        matcher = PayloadMatcher(patterns, ignore_case)
+        pcap_index = self.pcap_index
+        if pcap_index is not None and self.packets.first_id > 0:
+            yield from search_pcap(pcap_index.pcap_path, matcher.patterns, ignore_case,
+                                   stop=self.packets.first_id, workers=workers, index=pcap_index)
+        yield from search_store(self.packets, matcher)
 
     def update_protocol_statistics(self):
-        """Update protocol statistics based on current packets."""
+        """Recount protocol statistics from the packets still available.
+
+        Statistics are kept up to date as packets arrive, so this is only
+        needed to forget evicted packets. Records of a loaded file count
+        even when the store has evicted them.
+        """
+        self._count_loaded_file()
         self.protocol_stats.clear()
-        for _, packet in self.packets:
-            if hasattr(packet, "getlayer"):
-                layer = packet.getlayer(0)  
-                if layer and hasattr(layer, "name"):
-                    self.protocol_stats[layer.name] += 1
-
-    def get_protocol_statistics(self):
-        """Return protocol statistics."""
-        return self.protocol_stats
+        pcap_index = self.pcap_index
+        if pcap_index is not None and self.packets.first_id > 0:
+            with open_pcap_buffer(pcap_index.pcap_path) as buffer:
+                view = memoryview(buffer)
+                for number in range(min(self.packets.first_id, len(pcap_index))):
+                    start = pcap_index.data_offsets[number]
+                    linktype = pcap_index.linktypes[number]
+                    headers = parse_headers(view[start:start + pcap_index.caplens[number]], linktype)
+                    self.protocol_stats.add(headers, pcap_index.wirelens[number],
+                                            pcap_index.timestamps[number], linktype)
+                view.release()
+        for record in self.packets.records(data=False):
+            self.protocol_stats.add(record.headers, record.wirelen, record.timestamp, record.linktype)
+
+    def get_protocol_statistics(self, seconds=None):
+        """Return {protocol path: (packets, bytes)} for every protocol-hierarchy node.
+
+        With seconds set, only packets from the last seconds of traffic count.
+        """
+        self._count_loaded_file()
+        return self.protocol_stats.totals(seconds)
+
+    def get_protocol_series(self, seconds=300, depth=3):
+        """Return (bucket start times, {protocol path: packets per bucket}) for charts."""
+        self._count_loaded_file()
+        return self.protocol_stats.series(seconds, depth)
+
+
+_shared_worker = None
+_shared_lock = threading.Lock()
+
+
+def shared_packet_worker():
+    """Return the process-wide packet worker, created on first use."""
+    global _shared_worker
+    with _shared_lock:
+        if _shared_worker is None:
+            _shared_worker = PacketWorker()
+        return _shared_worker
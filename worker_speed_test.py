@@ -1,14 +1,25 @@
-import time
-import speedtest_cli
-import socket
-import numpy as np
-import csv
+import http.client
+import posixpath
 import datetime
-import os
+import metrics
+from history_store import shared_store
+from latency_prober import ProbeTarget, measure
+from latency_stats import LatencyStats
+from server_catalog import shared_catalog
+from throughput_engine import DOWNLOAD, UPLOAD, ThroughputTest
+
+DOWNLOAD_SIZES = (2000, 3000, 4000)
+PING_COUNT = 10
+
+PHASE_SECONDS = metrics.histogram("netmon_speedtest_phase_seconds", "Duration of each speed test phase", ["phase"])
+SPEEDTEST_ERRORS = metrics.counter("netmon_speedtest_errors_total", "Speed test phases that failed", ["phase"])
+LAST_SPEED = metrics.gauge("netmon_speedtest_last_mbps", "Result of the most recent speed test", ["direction"])
 
 class SpeedTestWorker:
-    def __init__(self):
+    def __init__(self, streams=4, duration=10):
         super().__init__()
+        self.streams = streams
+        self.duration = duration
         self.progress_value = 0
         self.isp = None
         self.server = None
@@ -16,10 +27,13 @@ class SpeedTestWorker:
         self.upload_speed = 0
         self.ping_value = 0
         self.jitter = 0
+        self.latency = LatencyStats()
         self.download_speeds = []
         self.upload_speeds = []
         self.server_name = None
         self.server_country = None
+        # (direction, ThroughputSample) in arrival order, for live charts.
+        self.live_samples = []
 
     def get_progress(self):
         return self.progress_value
@@ -37,71 +51,65 @@ class SpeedTestWorker:
         return self.jitter
 
     def start_test(self):
-        st = speedtest_cli.Speedtest()
-
-        self.isp = st.config['client']['isp']
-        best_server = st.get_best_server()
+        catalog = shared_catalog()
+        with PHASE_SECONDS.labels("server").time():
+            best_server = catalog.best()
+        self.isp = catalog.isp
+        self.server = best_server
         self.server_name = best_server['name']
         self.server_country = best_server['country']
 
-        ping_times = self.ping_test()
-        self.ping_value = np.mean(ping_times) if ping_times else None
-
-        self.jitter = self.calculate_jitter(ping_times)
-
-        self.test_speeds(st)
+        with PHASE_SECONDS.labels("ping").time():
+            self.ping_test()
+        self.ping_value = self.latency.sketch.mean
+        self.jitter = self.latency.jitter or 0
+
+        self.test_speeds(best_server)
+
+        with PHASE_SECONDS.labels("save").time():
+            self.save_test_results()
+
+    def ping_test(self, host="8.8.8.8", port=53, timeout=1, count=PING_COUNT):
+        """Probe host count times into self.latency and return the RTTs of the replies."""
+        target = ProbeTarget(host, port, timeout=timeout)
+        ping_times = measure([target], count=count, spacing=0.05)[target.name]
+        self.latency = LatencyStats()
+        for ping_time in ping_times:
+            self.latency.add(ping_time)
+        return [ping_time for ping_time in ping_times if ping_time is not None]
+
+    def get_latency_summary(self):
+        """Return loss, jitter and p50/p95/p99 of the pings of the last test."""
+        return self.latency.summary()
+
+    def test_speeds(self, server):
+        base_url = posixpath.dirname(server['url'])
+        download_urls = [f"{base_url}/random{size}x{size}.jpg" for size in DOWNLOAD_SIZES]
+        self.download_speed = self.measure_throughput(DOWNLOAD, download_urls, self.download_speeds, 0)
+        self.upload_speed = self.measure_throughput(UPLOAD, [server['url']], self.upload_speeds, 50)
+
+    def measure_throughput(self, direction, urls, speeds, progress_base):
+        def record(sample):
+            self.live_samples.append((direction, sample))
+            if not sample.warmup:
+                speeds.append(sample.mbps)
+            self.progress_value = progress_base + int(min(sample.elapsed / self.duration, 1) * 50)
 
-        self.save_test_results()
-
-    def ping_test(self, host="8.8.8.8", port=53, timeout=1):
-        ping_times = []
-        for _ in range(2):  
-            ping_time = self.perform_ping(host, port, timeout)
-            if ping_time is not None:
-                ping_times.append(ping_time)
-            time.sleep(0.1) 
-        return ping_times
-
-    def perform_ping(self, host, port, timeout):
         try:
-            start_time = time.time()
-            socket.create_connection((host, port), timeout=timeout)
-            end_time = time.time()
-            return (end_time - start_time) * 1000 
-        except Exception:
-            return None
-
-    def calculate_jitter(self, ping_times):
-        if len(ping_times) < 2:
+            with PHASE_SECONDS.labels(direction).time():
+                result = ThroughputTest(
+                    direction, urls, streams=self.streams, duration=self.duration, on_sample=record
+                ).run()
+        except (OSError, http.client.HTTPException) as e:
+            SPEEDTEST_ERRORS.labels(direction).inc()
+            print(f"Error during {direction} speed test: {e}")
             return 0
-        differences = [abs(ping_times[i] - ping_times[i-1]) for i in range(1, len(ping_times))]
-        return np.mean(differences)
-
-    def test_speeds(self, st):
-        for i in range(2): 
-            try:
-                download_speed = st.download() / 1e6 
-                self.download_speeds.append(download_speed)
-            except Exception as e:
-                print(f"Error during download speed test: {e}")
-            time.sleep(0.1) 
-
-        for i in range(2): 
-            try:
-                upload_speed = st.upload() / 1e6  
-                self.upload_speeds.append(upload_speed)
-            except Exception as e:
-                print(f"Error during upload speed test: {e}")
-            time.sleep(0.1)  
+        self.progress_value = progress_base + 50
+        LAST_SPEED.labels(direction).set(result.mbps)
+        return result.mbps
 
     def save_test_results(self):
-        test_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        csv_file = "speed_test_history.csv"
-        file_exists = os.path.isfile(csv_file)
-
-        with open(csv_file, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(['Date', 'Download Speed (Mbps)', 'Upload Speed (Mbps)', 'Ping (ms)', 'Jitter (ms)', 'Server', 'ISP'])
-
-            writer.writerow([test_date, np.mean(self.download_speeds), np.mean(self.upload_speeds), self.ping_value, self.jitter, self.server_name, self.isp])
+        shared_store().add(
+            datetime.datetime.now(), self.download_speed, self.upload_speed,
+            self.ping_value, self.jitter, self.server_name, self.isp,
+        )